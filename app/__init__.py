@@ -1,12 +1,18 @@
 from flask_api import FlaskAPI
-from flask_sqlalchemy import SQLAlchemy
 from flasgger import Swagger
 
 # local import
 from instance.config import app_config
-
-# initialize sql-alchemy
-db = SQLAlchemy()
+from app.pool import PooledSQLAlchemy
+from app.replica import init_replica_routing
+from app.sharding import init_sharding
+from app.metrics import init_metrics
+from app.query_inspector import init_query_inspector
+from app.traffic import init_traffic_capture
+
+# initialize sql-alchemy, with the connection pool configured by the app
+# objects are not expired on commit, so that reading a just saved object doesn't query it again
+db = PooledSQLAlchemy(session_options={'expire_on_commit': False})
 swagger = Swagger()
 
 
@@ -24,6 +30,12 @@ def create_app(config_name):
     # for removing trailing slashes enforcement
     app.url_map.strict_slashes = False
     db.init_app(app)
+    # measured first, so that the time and queries of the other hooks are counted
+    init_metrics(app)
+    init_query_inspector(app)
+    init_replica_routing(app, db)
+    init_sharding(app, db)
+    init_traffic_capture(app)
 
     swagger.init_app(app)
 
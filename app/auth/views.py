@@ -4,6 +4,7 @@ from . import auth_blueprint
 from flask.views import MethodView
 from flask import make_response, request, jsonify
 from app.models import User
+from app.sharding import copy_user_to_shard
 
 
 class RegistrationView(MethodView):
@@ -123,6 +124,7 @@ class RegistrationView(MethodView):
                             password = post_data['password']
                             user = User(email=email, password=password)
                             user.save()
+                            copy_user_to_shard(user)
 
                             response = {
                                 'message': 'You registered successfully. Please log in.'
@@ -1,7 +1,22 @@
+import csv
+import gzip
+import io
+import json
+import re
+import time
+import zlib
 from . import bucketlists_blueprint
 from sqlalchemy import and_
-from flask import request, jsonify, abort, make_response, url_for
-from app.models import Bucketlist, User, BucketlistItem
+from dateutil import parser as date_parser
+from dateutil.tz import tzutc
+from six.moves.urllib.parse import urlencode
+from sqlalchemy.exc import IntegrityError
+from flask import request, jsonify, abort, make_response, url_for, Response, stream_with_context, current_app
+from flask import json as flask_json
+from app import db
+from app.models import Bucketlist, User, BucketlistItem, changes_since, format_position, parse_position
+from app.change_events import change_listener
+from app.bulk_import import import_ndjson, ImportDataError, MAXIMUM_NAME_LENGTH
 from instance.config import Config
 
 
@@ -70,13 +85,24 @@ def bucketlists():
                                     else:
                                         bucketlist = Bucketlist(
                                             name=name, created_by=user_id)
-                                        bucketlist.save()
+                                        try:
+                                            bucketlist.save()
+                                        except IntegrityError:
+                                            # another request of the user created it since it was looked for
+                                            db.session.rollback()
+                                            response = {
+                                                'message': 'Bucketlist with this name already exists. '
+                                                           'Edit it or choose another name.'
+                                            }
+                                            return make_response(jsonify(response)), 409
                                         response = jsonify({
                                             'id': bucketlist.id,
                                             'name': bucketlist.name,
                                             'date_created': bucketlist.date_created,
                                             'date_modified': bucketlist.date_modified,
-                                            'created_by': user_id
+                                            'created_by': user_id,
+                                            'item_count': bucketlist.item_count,
+                                            'done_count': bucketlist.done_count
                                         })
 
                                         return make_response(response), 201
@@ -116,14 +142,19 @@ def bucketlists():
                             # get the query string for q - this is searching based on name
                             search_string = request.args.get('q')
 
+                            # the items of the whole page are loaded in one more statement instead of one for
+                            # each bucketlist, which needs the page to come in a stable order
+                            query = Bucketlist.query.options(db.subqueryload(Bucketlist.bucketlist_items)).order_by(
+                                Bucketlist.id)
+
                             # check if a search parameter was provided
                             if search_string:
                                 # get bucketlists whose name contains the search string
-                                bucketlists = Bucketlist.query.filter_by(created_by=user_id).filter(
+                                bucketlists = query.filter_by(created_by=user_id).filter(
                                     Bucketlist.name.like('%' + search_string + '%')).paginate(page, limit)
                             else:
                                 # GET all the bucketlists created by this user
-                                bucketlists = Bucketlist.query.filter_by(
+                                bucketlists = query.filter_by(
                                     created_by=user_id).paginate(page, limit)
 
                             results = []
@@ -152,7 +183,9 @@ def bucketlists():
                                                }
                                               for item in bucketlist.bucketlist_items
                                               ],
-                                    'created_by': bucketlist.created_by
+                                    'created_by': bucketlist.created_by,
+                                    'item_count': bucketlist.item_count,
+                                    'done_count': bucketlist.done_count
                                 }
                                 results.append(obj)
 
@@ -177,7 +210,7 @@ def bucketlists():
                     return make_response(jsonify(response)), 401
 
 
-@bucketlists_blueprint.route('/bucketlists/<int:id>', methods=['GET', 'PUT', 'DELETE'])
+@bucketlists_blueprint.route('/bucketlists/<int:id>', methods=['GET', 'PUT', 'PATCH', 'DELETE'])
 def bucketlist_manipulation(id):
     """
     Method to retrieve a bucketlist of a given id and then manipulate it accordingly
@@ -218,8 +251,59 @@ def bucketlist_manipulation(id):
                     user_id = User.decode_token(access_token)
 
                     if not isinstance(user_id, str):
-                            # If the id is not a string(error), we have a user id
-                            # Get the bucketlist with the id specified from the URL (<int:id>)
+                        # If the id is not a string(error), we have a user id
+                        if request.method == 'PATCH':
+                            # Edit the bucketlist in a single statement, the unique index on the name
+                            # takes the place of looking for another bucketlist with the same name
+                            if 'name' not in request.data:
+                                # Return a message to the user telling them that they need to submit a name
+                                response = {
+                                    'message': 'Parameter name missing.'
+                                }
+                                return make_response(jsonify(response)), 400
+
+                            name = str(request.data.get('name', ''))
+                            if not name:
+                                # Return a message to the user telling them that they need to submit a name
+                                response = {
+                                    'message': 'Bucketlist name should not be empty.'
+                                }
+                                return make_response(jsonify(response)), 400
+
+                            try:
+                                bucketlist = Bucketlist.update_owned(id, user_id, name=name)
+                            except IntegrityError:
+                                db.session.rollback()
+                                response = {
+                                    'message': 'Bucketlist with this name already exists. Choose another name.'
+                                }
+                                return make_response(jsonify(response)), 409
+
+                            if not bucketlist:
+                                # There is no bucketlist with this ID for this User
+                                abort(404)
+
+                            response = {
+                                'id': bucketlist.id,
+                                'name': bucketlist.name,
+                                'date_created': bucketlist.date_created,
+                                'date_modified': bucketlist.date_modified,
+                                'created_by': bucketlist.created_by,
+                                'item_count': bucketlist.item_count,
+                                'done_count': bucketlist.done_count
+                            }
+                            return make_response(jsonify(response)), 200
+
+                        elif request.method == "DELETE":
+                            # delete the bucketlist in a single statement, the database deletes its items
+                            if not Bucketlist.delete_owned(id, user_id):
+                                # There is no bucketlist with this ID for this User
+                                abort(404)
+                            return {
+                                "message": "bucketlist {} deleted".format(id)
+                            }, 200
+
+                        # Get the bucketlist with the id specified from the URL (<int:id>)
                         bucketlist = Bucketlist.query.filter_by(
                             id=id, created_by=user_id).first()
                         if not bucketlist:
@@ -227,14 +311,7 @@ def bucketlist_manipulation(id):
                                 # Raise an HTTPException with a 404 not found status code
                             abort(404)
 
-                        if request.method == "DELETE":
-                            # delete the bucketlist using our delete method
-                            bucketlist.delete()
-                            return {
-                                "message": "bucketlist {} deleted".format(bucketlist.id)
-                            }, 200
-
-                        elif request.method == 'PUT':
+                        if request.method == 'PUT':
                             # Obtain the new name of the bucketlist from the request data
                             if 'name' not in request.data:
                                     # Return a message to the user telling them that they need to submit a name
@@ -263,7 +340,9 @@ def bucketlist_manipulation(id):
                                             'name': bucketlist.name,
                                             'date_created': bucketlist.date_created,
                                             'date_modified': bucketlist.date_modified,
-                                            'created_by': bucketlist.created_by
+                                            'created_by': bucketlist.created_by,
+                                            'item_count': bucketlist.item_count,
+                                            'done_count': bucketlist.done_count
                                         }
                                         return make_response(jsonify(response)), 200
                                 else:
@@ -280,7 +359,9 @@ def bucketlist_manipulation(id):
                                 'name': bucketlist.name,
                                 'date_created': bucketlist.date_created,
                                 'date_modified': bucketlist.date_modified,
-                                'created_by': bucketlist.created_by
+                                'created_by': bucketlist.created_by,
+                                'item_count': bucketlist.item_count,
+                                'done_count': bucketlist.done_count
                             }
                             return make_response(jsonify(response)), 200
                     else:
@@ -375,7 +456,16 @@ def bucketlist_items(id):
                                         # specified from the URL (<int:id>)
                                         bucketlist_item = BucketlistItem(
                                             name=name, belongs_to=id)
-                                        bucketlist_item.save()
+                                        try:
+                                            bucketlist_item.save()
+                                        except IntegrityError:
+                                            # another request created it since it was looked for
+                                            db.session.rollback()
+                                            response = {
+                                                'message': 'Bucketlist item with this name already exists in this'
+                                                           ' bucketlist. Choose another name.'
+                                            }
+                                            return make_response(jsonify(response)), 409
                                         response = jsonify({
                                             'id': bucketlist_item.id,
                                             'name': bucketlist_item.name,
@@ -395,11 +485,11 @@ def bucketlist_items(id):
                         else:
                             # GET all the bucketlist items created by this user and belonging to this bucketlist
                             bucketlist_items = BucketlistItem.query.filter_by(
-                                belongs_to=id)
+                                belongs_to=id).order_by(BucketlistItem.id)
 
                             results = []
 
-                            for bucketlist_item in bucketlist_items.items:
+                            for bucketlist_item in bucketlist_items:
                                 obj = {
                                     'id': bucketlist_item.id,
                                     'name': bucketlist_item.name,
@@ -425,7 +515,7 @@ def bucketlist_items(id):
                     return make_response(jsonify(response)), 401
 
 
-@bucketlists_blueprint.route('/bucketlists/<int:id>/items/<int:item_id>', methods=['GET', 'PUT', 'DELETE'])
+@bucketlists_blueprint.route('/bucketlists/<int:id>/items/<int:item_id>', methods=['GET', 'PUT', 'PATCH', 'DELETE'])
 def bucketlist_items_manipulation(id, item_id):
     """
     Method to retrieve an item with <id>:item_id from a bucketlist with <id>:id and manipulate it according to the request passed
@@ -468,30 +558,82 @@ def bucketlist_items_manipulation(id, item_id):
                     if not isinstance(user_id, str):
                         # Go ahead and handle the request, the user is authenticated
 
-                        # Get the bucketlist with the id specified from the URL (<int:id>)
-                        bucketlist = Bucketlist.query.filter_by(
-                            id=id, created_by=user_id).first()
-                        if not bucketlist:
-                            # There is no bucketlist with this ID for this User, so
-                            # Raise an HTTPException with a 404 not found status code
-                            abort(404)
+                        if request.method == 'PATCH':
+                            # Edit the item in a single statement that also checks the owner of the bucketlist,
+                            # the unique index on the name takes the place of looking for another item with it
+                            values = {}
+                            if 'name' in request.data:
+                                name = str(request.data.get('name', ''))
+                                if not name:
+                                    # Return a message to the user telling them that they need to submit a name
+                                    response = {
+                                        'message': 'Bucketlist item name should not be empty.'
+                                    }
+                                    return make_response(jsonify(response)), 400
+                                values['name'] = name
+
+                            if 'done' in request.data:
+                                done = request.data.get('done')
+                                # form data sends the value as a string
+                                if isinstance(done, str) and done.lower() in ('true', 'false'):
+                                    done = done.lower() == 'true'
+                                if not isinstance(done, bool):
+                                    response = {
+                                        'message': 'Parameter done should be true or false.'
+                                    }
+                                    return make_response(jsonify(response)), 400
+                                values['done'] = done
+
+                            if not values:
+                                # Return a message to the user telling them that they need to submit something to edit
+                                response = {
+                                    'message': 'Parameter name or done missing.'
+                                }
+                                return make_response(jsonify(response)), 400
+
+                            try:
+                                bucketlist_item = BucketlistItem.update_owned(item_id, id, user_id, **values)
+                            except IntegrityError:
+                                db.session.rollback()
+                                response = {
+                                    'message': 'Bucketlist item with this name already exists in this '
+                                               'bucketlist. Choose another name.'
+                                }
+                                return make_response(jsonify(response)), 409
+
+                            if not bucketlist_item:
+                                # There is no such bucketlist item for this User
+                                abort(404)
+
+                            response = {
+                                'id': bucketlist_item.id,
+                                'name': bucketlist_item.name,
+                                'date_created': bucketlist_item.date_created,
+                                'date_modified': bucketlist_item.date_modified,
+                                'done': bucketlist_item.done,
+                                'belongs_to': bucketlist_item.belongs_to
+                            }
+                            return make_response(jsonify(response)), 200
+
+                        elif request.method == "DELETE":
+                            # delete the item in a single statement that also checks the owner of the bucketlist
+                            if not BucketlistItem.delete_owned(item_id, id, user_id):
+                                # There is no such bucketlist item for this User
+                                abort(404)
+                            return {
+                                "message": "bucketlist item {} deleted".format(item_id)
+                            }, 200
 
-                        # Get the bucketlist item with the id specified from the URL (<int:item_id>)
-                        bucketlist_item = BucketlistItem.query.filter_by(
-                            id=item_id, belongs_to=id).first()
+                        # Get the bucketlist item with the id specified from the URL (<int:item_id>) in the
+                        # bucketlist with the id specified from the URL (<int:id>), checking in the same query
+                        # that the bucketlist belongs to the logged in user
+                        bucketlist_item = BucketlistItem.get_owned(item_id, id, user_id)
                         if not bucketlist_item:
                             # There is no bucketlist item with this ID for this User, so
                             # Raise an HTTPException with a 404 not found status code
                             abort(404)
 
-                        if request.method == "DELETE":
-                            # delete the bucketlist using our delete method
-                            bucketlist_item.delete()
-                            return {
-                                "message": "bucketlist item {} deleted".format(bucketlist_item.id)
-                            }, 200
-
-                        elif request.method == 'PUT':
+                        if request.method == 'PUT':
                             if 'name' not in request.data:
                                 # Return a message to the user telling them that they need to submit a name
                                 response = {
@@ -556,3 +698,1015 @@ def bucketlist_items_manipulation(id, item_id):
                         'message': 'Empty token string'
                     }
                     return make_response(jsonify(response)), 401
+
+
+@bucketlists_blueprint.route('/items', methods=['GET'])
+def items_search():
+    """
+    Method to search the items in all the bucketlists of the logged in user
+    The results are paged using the id of the last item returned (after) instead of a page number
+    :return: response
+    """
+    # check if the header with key is present
+    if 'Authorization' not in request.headers:
+        # Return a message to the user telling them that they need to submit an authorization header with token
+        response = {
+            'message': 'Header with key Authorization missing.'
+        }
+        return make_response(jsonify(response)), 401
+    else:
+        # Get the access token from the header
+        auth_header = request.headers.get('Authorization')
+
+        # check for when authorization was not provided in header
+        if not auth_header:
+            # Return a message to the user telling them that they need to submit an authorization header with token
+            response = {
+                'message': 'Token not provided in the header with key Authorization.'
+            }
+            return make_response(jsonify(response)), 401
+        else:
+
+            auth_strings = auth_header.split(" ")
+            if len(auth_strings) != 2:
+                response = {
+                    'message': 'Invalid token format.'
+                }
+                return make_response(jsonify(response)), 401
+            else:
+                access_token = auth_header.split(" ")[1]
+
+                if access_token:
+                    # Attempt to decode the token and get the User ID
+                    user_id = User.decode_token(access_token)
+                    if not isinstance(user_id, str):
+                        # Go ahead and handle the request, the user is authenticated
+
+                        # get the query string for limit if it exists
+                        # if the query parameter for limit doesn't exist, 20 is used by default
+                        limit = request.args.get('limit', 'default ' + str(Config.DEFAULT_PAGINATION_LIMIT))
+                        try:
+                            limit = int(limit)
+                        except ValueError:
+                            # if limit value is gibberish, default to 20
+                            limit = Config.DEFAULT_PAGINATION_LIMIT
+
+                        # if limit supplied is greater than 100, display only 100
+                        if limit > Config.MAXIMUM_PAGINATION_LIMIT:
+                            limit = Config.MAXIMUM_PAGINATION_LIMIT
+
+                        if limit < 1:
+                            return abort(404, 'Limit must be greater than 1')
+
+                        # get the id of the last item of the previous page if it exists
+                        after = request.args.get('after')
+                        if after is not None:
+                            try:
+                                after = int(after)
+                            except ValueError:
+                                response = {
+                                    'message': 'Parameter after should be an item id.'
+                                }
+                                return make_response(jsonify(response)), 400
+
+                        # get the query string for done if it exists - filters on whether items are done
+                        done = request.args.get('done')
+                        if done is not None:
+                            if done.lower() in ('true', '1'):
+                                done = True
+                            elif done.lower() in ('false', '0'):
+                                done = False
+                            else:
+                                response = {
+                                    'message': 'Parameter done should be true or false.'
+                                }
+                                return make_response(jsonify(response)), 400
+
+                        # get the query string for since if it exists - filters on the date of modification
+                        since = request.args.get('since')
+                        if since is not None:
+                            try:
+                                since = date_parser.parse(since)
+                            except (ValueError, OverflowError):
+                                response = {
+                                    'message': 'Parameter since should be a date.'
+                                }
+                                return make_response(jsonify(response)), 400
+                            if since.tzinfo is not None:
+                                # the dates are stored without a timezone, in UTC
+                                since = since.astimezone(tzutc()).replace(tzinfo=None)
+
+                        # get the query string for q - this is searching based on name
+                        search_string = request.args.get('q')
+                        if search_string and not re.search(r'\w', search_string):
+                            # only the words are searched, without any the search would match every item
+                            response = {
+                                'message': 'Parameter q should contain at least one word.'
+                            }
+                            return make_response(jsonify(response)), 400
+
+                        # fetch one extra item to know whether there is a next page
+                        bucketlist_items = BucketlistItem.search(
+                            user_id, search_string=search_string, done=done, since=since,
+                            after=after).limit(limit + 1).all()
+
+                        next_page = None
+                        if len(bucketlist_items) > limit:
+                            bucketlist_items = bucketlist_items[:limit]
+                            query_string = {'limit': limit, 'after': bucketlist_items[-1].id}
+                            for key in ('q', 'done', 'since'):
+                                if key in request.args:
+                                    query_string[key] = request.args[key]
+                            next_page = url_for('.items_search') + '?' + urlencode(sorted(query_string.items()))
+
+                        results = []
+
+                        for bucketlist_item in bucketlist_items:
+                            obj = {
+                                'id': bucketlist_item.id,
+                                'name': bucketlist_item.name,
+                                'date_created': bucketlist_item.date_created,
+                                'date_modified': bucketlist_item.date_modified,
+                                'done': bucketlist_item.done,
+                                'belongs_to': bucketlist_item.belongs_to
+                            }
+                            results.append(obj)
+
+                        return make_response(jsonify({'items_per_page': limit,
+                                                      'next_page': next_page,
+                                                      'items': results})), 200
+                    else:
+                        # user is not legit, so the payload is an error message
+                        message = user_id
+                        response = {
+                            'message': message
+                        }
+                        return make_response(jsonify(response)), 401
+                else:
+                    response = {
+                        'message': 'Empty token string'
+                    }
+                    return make_response(jsonify(response)), 401
+
+
+# the list of the response of the feed of changes each kind of change goes into
+CHANGE_KEYS = {'bucketlist': 'bucketlists', 'item': 'items', 'deleted': 'deleted'}
+
+
+def change_json(position, kind, record):
+    """
+    Build the json of a change in the feed of changes
+    :param position: change_txid and change_seq of the change
+    :param kind: bucketlist, item or deleted
+    :param record: the bucketlist, item or tombstone
+    :return: dict
+    """
+    if kind == 'bucketlist':
+        return {
+            'id': record.id,
+            'name': record.name,
+            'date_created': record.date_created,
+            'date_modified': record.date_modified,
+            'created_by': record.created_by,
+            'item_count': record.item_count,
+            'done_count': record.done_count,
+            'position': format_position(position)
+        }
+    elif kind == 'item':
+        return {
+            'id': record.id,
+            'name': record.name,
+            'date_created': record.date_created,
+            'date_modified': record.date_modified,
+            'done': record.done,
+            'belongs_to': record.belongs_to,
+            'position': format_position(position)
+        }
+    return {
+        'type': record.record_type,
+        'id': record.record_id,
+        'bucketlist_id': record.bucketlist_id,
+        'date_deleted': record.date_deleted,
+        'position': format_position(position)
+    }
+
+
+@bucketlists_blueprint.route('/bucketlists/changes', methods=['GET'])
+def bucketlist_changes():
+    """
+    Method to get what changed in the bucketlists and items of the logged in user since a position in the feed
+    Every insert, update and delete is recorded with its transaction and a number from one sequence, the client
+    keeps the next_since of the last response and sends it back as since to get only the changes made after it
+    :return: response
+    """
+    # check if the header with key is present
+    if 'Authorization' not in request.headers:
+        # Return a message to the user telling them that they need to submit an authorization header with token
+        response = {
+            'message': 'Header with key Authorization missing.'
+        }
+        return make_response(jsonify(response)), 401
+    else:
+        # Get the access token from the header
+        auth_header = request.headers.get('Authorization')
+
+        # check for when authorization was not provided in header
+        if not auth_header:
+            # Return a message to the user telling them that they need to submit an authorization header with token
+            response = {
+                'message': 'Token not provided in the header with key Authorization.'
+            }
+            return make_response(jsonify(response)), 401
+        else:
+
+            auth_strings = auth_header.split(" ")
+            if len(auth_strings) != 2:
+                response = {
+                    'message': 'Invalid token format.'
+                }
+                return make_response(jsonify(response)), 401
+            else:
+                access_token = auth_header.split(" ")[1]
+
+                if access_token:
+                    # Attempt to decode the token and get the User ID
+                    user_id = User.decode_token(access_token)
+                    if not isinstance(user_id, str):
+                        # Go ahead and handle the request, the user is authenticated
+
+                        # get the position in the feed of the last change the client has, 0 for everything
+                        since = parse_position(request.args.get('since', '0'))
+                        if since is None:
+                            response = {
+                                'message': 'Parameter since should be a position in the feed of changes.'
+                            }
+                            return make_response(jsonify(response)), 400
+
+                        # get the query string for limit if it exists
+                        limit = request.args.get('limit', 'default ' + str(Config.MAXIMUM_PAGINATION_LIMIT))
+                        try:
+                            limit = int(limit)
+                        except ValueError:
+                            limit = Config.MAXIMUM_PAGINATION_LIMIT
+
+                        # if limit supplied is greater than 100, display only 100
+                        if limit > Config.MAXIMUM_PAGINATION_LIMIT:
+                            limit = Config.MAXIMUM_PAGINATION_LIMIT
+
+                        if limit < 1:
+                            return abort(404, 'Limit must be greater than 1')
+
+                        # the changes of transactions committed behind an older one still running come on a later call
+                        changes, has_more, held_back = changes_since(user_id, since, limit)
+
+                        results = {'bucketlists': [], 'items': [], 'deleted': []}
+                        for position, kind, record in changes:
+                            results[CHANGE_KEYS[kind]].append(change_json(position, kind, record))
+
+                        results['next_since'] = format_position(changes[-1][0] if changes else since)
+                        results['has_more'] = has_more
+                        return make_response(jsonify(results)), 200
+                    else:
+                        # user is not legit, so the payload is an error message
+                        message = user_id
+                        response = {
+                            'message': message
+                        }
+                        return make_response(jsonify(response)), 401
+                else:
+                    response = {
+                        'message': 'Empty token string'
+                    }
+                    return make_response(jsonify(response)), 401
+
+
+def change_events(user_id, since):
+    """
+    Generate the server-sent events of the changes to the bucketlists and items of a user after a position in the
+    feed of changes, then of every change as it is committed, with a heartbeat while nothing changes
+    The id of each event is its position in the feed, so a client reconnecting with Last-Event-ID resumes after it.
+    The position only moves past the changes of finished transactions, see changes_since, so a change committed
+    behind an older transaction is still sent, and still sent after a reconnection
+    :param user_id:
+    :param since: change_txid and change_seq of the last change the client has
+    :return: generator of events
+    """
+    subscription = change_listener.subscribe(user_id)
+    try:
+        last_event = time.time()
+        while True:
+            # cleared before reading the feed, so that a change committed while reading wakes up the next wait
+            subscription.clear()
+            changes, has_more, held_back = changes_since(user_id, since, Config.MAXIMUM_PAGINATION_LIMIT)
+            # the connection goes back to the pool while the stream waits
+            db.session.remove()
+
+            for position, kind, record in changes:
+                yield 'id: {}\nevent: {}\ndata: {}\n\n'.format(
+                    format_position(position), kind, flask_json.dumps(change_json(position, kind, record)))
+                since = position
+                last_event = time.time()
+            if has_more:
+                continue
+
+            # without notifications from the database the feed is checked again after a while
+            timeout = Config.CHANGE_EVENTS_HEARTBEAT
+            if not change_listener.listening:
+                timeout = min(timeout, Config.CHANGE_EVENTS_POLL_INTERVAL)
+            if held_back:
+                # no other notification may come once the older transaction is over
+                timeout = min(timeout, Config.CHANGE_EVENTS_HELD_BACK_INTERVAL)
+            if not subscription.wait(timeout) and time.time() - last_event >= Config.CHANGE_EVENTS_HEARTBEAT:
+                # a comment line keeps proxies from closing the idle connection
+                yield ': heartbeat\n\n'
+                last_event = time.time()
+    finally:
+        change_listener.unsubscribe(user_id, subscription)
+
+
+@bucketlists_blueprint.route('/bucketlists/events', methods=['GET'])
+def bucketlist_events():
+    """
+    Method to push the changes to the bucketlists and items of the logged in user as server-sent events
+    This replaces polling the bucketlists, each change is sent once, when it is committed
+    :return: response
+    """
+    # check if the header with key is present
+    if 'Authorization' not in request.headers:
+        # Return a message to the user telling them that they need to submit an authorization header with token
+        response = {
+            'message': 'Header with key Authorization missing.'
+        }
+        return make_response(jsonify(response)), 401
+    else:
+        # Get the access token from the header
+        auth_header = request.headers.get('Authorization')
+
+        # check for when authorization was not provided in header
+        if not auth_header:
+            # Return a message to the user telling them that they need to submit an authorization header with token
+            response = {
+                'message': 'Token not provided in the header with key Authorization.'
+            }
+            return make_response(jsonify(response)), 401
+        else:
+
+            auth_strings = auth_header.split(" ")
+            if len(auth_strings) != 2:
+                response = {
+                    'message': 'Invalid token format.'
+                }
+                return make_response(jsonify(response)), 401
+            else:
+                access_token = auth_header.split(" ")[1]
+
+                if access_token:
+                    # Attempt to decode the token and get the User ID
+                    user_id = User.decode_token(access_token)
+                    if not isinstance(user_id, str):
+                        # Go ahead and handle the request, the user is authenticated
+
+                        # a reconnecting client resumes after the last event it got, otherwise it starts from since,
+                        # which is the next_since of the feed of changes
+                        since = parse_position(request.headers.get('Last-Event-ID', request.args.get('since', '0')))
+                        if since is None:
+                            response = {
+                                'message': 'Parameter since should be a position in the feed of changes.'
+                            }
+                            return make_response(jsonify(response)), 400
+
+                        if current_app.config.get('CHANGE_EVENTS_LISTEN', True):
+                            change_listener.start_all(current_app._get_current_object())
+                        headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+                        return Response(stream_with_context(change_events(user_id, since)),
+                                        mimetype='text/event-stream', headers=headers)
+                    else:
+                        # user is not legit, so the payload is an error message
+                        message = user_id
+                        response = {
+                            'message': message
+                        }
+                        return make_response(jsonify(response)), 401
+                else:
+                    response = {
+                        'message': 'Empty token string'
+                    }
+                    return make_response(jsonify(response)), 401
+
+
+def valid_batch_id(value):
+    """
+    Check whether a value sent in the ids of a batch is an id
+    Booleans are ints in python, true would match the id 1
+    :param value:
+    :return: bool
+    """
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+@bucketlists_blueprint.route('/bucketlists/batch', methods=['POST', 'DELETE'])
+def bucketlists_batch():
+    """
+    Method to add many bucketlists or delete many bucketlists in one request and one transaction
+    The outcome for each bucketlist is reported with the status it would have had in its own request
+    :return: response
+    """
+    # check if the header with key is present
+    if 'Authorization' not in request.headers:
+        # Return a message to the user telling them that they need to submit an authorization header with token
+        response = {
+            'message': 'Header with key Authorization missing.'
+        }
+        return make_response(jsonify(response)), 401
+    else:
+        # Get the access token from the header
+        auth_header = request.headers.get('Authorization')
+
+        # check for when authorization was not provided in header
+        if not auth_header:
+            # Return a message to the user telling them that they need to submit an authorization header with token
+            response = {
+                'message': 'Token not provided in the header with key Authorization.'
+            }
+            return make_response(jsonify(response)), 401
+        else:
+
+            auth_strings = auth_header.split(" ")
+            if len(auth_strings) != 2:
+                response = {
+                    'message': 'Invalid token format.'
+                }
+                return make_response(jsonify(response)), 401
+            else:
+                access_token = auth_header.split(" ")[1]
+
+                if access_token:
+                    # Attempt to decode the token and get the User ID
+                    user_id = User.decode_token(access_token)
+                    if not isinstance(user_id, str):
+                        # Go ahead and handle the request, the user is authenticated
+                        if request.method == "POST":
+                            names = request.data.get('names') if isinstance(request.data, dict) else None
+                            if not isinstance(names, list):
+                                # Return a message to the user telling them that they need to submit a list of names
+                                response = {
+                                    'message': 'Parameter names should be a list.'
+                                }
+                                return make_response(jsonify(response)), 400
+                            elif len(names) > Config.MAXIMUM_BATCH_SIZE:
+                                response = {
+                                    'message': 'At most {} bucketlists can be sent at once.'.format(
+                                        Config.MAXIMUM_BATCH_SIZE)
+                                }
+                                return make_response(jsonify(response)), 400
+
+                            names = [str(name) if name is not None else '' for name in names]
+
+                            # query in one go which of the names already exist for this user
+                            existing_names = Bucketlist.existing_names(
+                                [name for name in names if 0 < len(name) <= MAXIMUM_NAME_LENGTH], user_id)
+
+                            results = []
+                            names_to_create = []
+                            for name in names:
+                                if not name:
+                                    results.append({
+                                        'name': name,
+                                        'status': 400,
+                                        'message': 'Bucketlist name should not be empty.'
+                                    })
+                                elif len(name) > MAXIMUM_NAME_LENGTH:
+                                    results.append({
+                                        'name': name,
+                                        'status': 400,
+                                        'message': 'Bucketlist name should be at most {} characters long.'.format(
+                                            MAXIMUM_NAME_LENGTH)
+                                    })
+                                elif name in existing_names:
+                                    results.append({
+                                        'name': name,
+                                        'status': 409,
+                                        'message': 'Bucketlist with this name already exists. '
+                                                   'Edit it or choose another name.'
+                                    })
+                                else:
+                                    # later occurrences of the same name in the list are duplicates too
+                                    existing_names.add(name)
+                                    names_to_create.append(name)
+                                    results.append({'name': name})
+
+                            created = dict((bucketlist.name, bucketlist)
+                                           for bucketlist in Bucketlist.create_many(names_to_create, user_id))
+                            for result in results:
+                                if 'status' not in result and result['name'] not in created:
+                                    # created by another request of the user since the names were looked for
+                                    result.update({
+                                        'status': 409,
+                                        'message': 'Bucketlist with this name already exists. '
+                                                   'Edit it or choose another name.'
+                                    })
+                                elif 'status' not in result:
+                                    bucketlist = created[result['name']]
+                                    result.update({
+                                        'status': 201,
+                                        'id': bucketlist.id,
+                                        'date_created': bucketlist.date_created,
+                                        'date_modified': bucketlist.date_modified,
+                                        'created_by': bucketlist.created_by,
+                                        'item_count': bucketlist.item_count,
+                                        'done_count': bucketlist.done_count
+                                    })
+
+                            return make_response(jsonify({'items': results})), 200
+
+                        else:
+                            ids = request.data.get('ids') if isinstance(request.data, dict) else None
+                            if not isinstance(ids, list):
+                                # Return a message to the user telling them that they need to submit a list of ids
+                                response = {
+                                    'message': 'Parameter ids should be a list.'
+                                }
+                                return make_response(jsonify(response)), 400
+                            elif len(ids) > Config.MAXIMUM_BATCH_SIZE:
+                                response = {
+                                    'message': 'At most {} bucketlists can be sent at once.'.format(
+                                        Config.MAXIMUM_BATCH_SIZE)
+                                }
+                                return make_response(jsonify(response)), 400
+
+                            valid_ids = [bucketlist_id for bucketlist_id in ids if valid_batch_id(bucketlist_id)]
+                            deleted_ids = Bucketlist.delete_many(valid_ids, user_id)
+
+                            results = []
+                            for bucketlist_id in ids:
+                                # true equals 1 and would be found among the deleted ids without the type check
+                                if valid_batch_id(bucketlist_id) and bucketlist_id in deleted_ids:
+                                    results.append({
+                                        'id': bucketlist_id,
+                                        'status': 200,
+                                        'message': 'bucketlist {} deleted'.format(bucketlist_id)
+                                    })
+                                else:
+                                    results.append({
+                                        'id': bucketlist_id,
+                                        'status': 404,
+                                        'message': 'bucketlist {} not found'.format(bucketlist_id)
+                                    })
+
+                            return make_response(jsonify({'items': results})), 200
+                    else:
+                        # user is not legit, so the payload is an error message
+                        message = user_id
+                        response = {
+                            'message': message
+                        }
+                        return make_response(jsonify(response)), 401
+                else:
+                    response = {
+                        'message': 'Empty token string'
+                    }
+                    return make_response(jsonify(response)), 401
+
+
+@bucketlists_blueprint.route('/bucketlists/<int:id>/items/batch', methods=['POST', 'PUT', 'DELETE'])
+def bucketlist_items_batch(id):
+    """
+    Method to add, mark as done or delete many items of the bucketlist with <id>:id in one request
+    The outcome for each item is reported with the status it would have had in its own request
+    :param id:
+    :return: response
+    """
+    # check if the header with key is present
+    if 'Authorization' not in request.headers:
+        # Return a message to the user telling them that they need to submit an authorization header with token
+        response = {
+            'message': 'Header with key Authorization missing.'
+        }
+        return make_response(jsonify(response)), 401
+    else:
+        # Get the access token from the header
+        auth_header = request.headers.get('Authorization')
+
+        # check for when authorization was not provided in header
+        if not auth_header:
+            # Return a message to the user telling them that they need to submit an authorization header with token
+            response = {
+                'message': 'Token not provided in the header with key Authorization.'
+            }
+            return make_response(jsonify(response)), 401
+        else:
+
+            auth_strings = auth_header.split(" ")
+            if len(auth_strings) != 2:
+                response = {
+                    'message': 'Invalid token format.'
+                }
+                return make_response(jsonify(response)), 401
+            else:
+                access_token = auth_header.split(" ")[1]
+
+                if access_token:
+                    # Attempt to decode the token and get the User ID
+                    user_id = User.decode_token(access_token)
+                    if not isinstance(user_id, str):
+                        # Go ahead and handle the request, the user is authenticated
+
+                        # Get the bucketlist with the id specified from the URL (<int:id>) for the logged in user
+                        bucketlist = Bucketlist.query.filter_by(
+                            id=id, created_by=user_id).first()
+                        if not bucketlist:
+                            # There is no bucketlist with this ID for this User, so
+                            # Raise an HTTPException with a 404 not found status code
+                            abort(404)
+
+                        data = request.data if isinstance(request.data, dict) else {}
+
+                        # adding new items to the bucketlist
+                        if request.method == "POST":
+                            names = data.get('names')
+                            if not isinstance(names, list):
+                                # Return a message to the user telling them that they need to submit a list of names
+                                response = {
+                                    'message': 'Parameter names should be a list.'
+                                }
+                                return make_response(jsonify(response)), 400
+                            elif len(names) > Config.MAXIMUM_BATCH_SIZE:
+                                response = {
+                                    'message': 'At most {} bucketlist items can be sent at once.'.format(
+                                        Config.MAXIMUM_BATCH_SIZE)
+                                }
+                                return make_response(jsonify(response)), 400
+
+                            names = [str(name) if name is not None else '' for name in names]
+
+                            # query in one go which of the names already exist in this bucketlist
+                            existing_names = BucketlistItem.existing_names(
+                                [name for name in names if 0 < len(name) <= MAXIMUM_NAME_LENGTH], id)
+
+                            results = []
+                            names_to_create = []
+                            for name in names:
+                                if not name:
+                                    results.append({
+                                        'name': name,
+                                        'status': 400,
+                                        'message': 'Bucketlist item name should not be empty.'
+                                    })
+                                elif len(name) > MAXIMUM_NAME_LENGTH:
+                                    results.append({
+                                        'name': name,
+                                        'status': 400,
+                                        'message': 'Bucketlist item name should be at most {} characters '
+                                                   'long.'.format(MAXIMUM_NAME_LENGTH)
+                                    })
+                                elif name in existing_names:
+                                    results.append({
+                                        'name': name,
+                                        'status': 409,
+                                        'message': 'Bucketlist item with this name already exists in this'
+                                                   ' bucketlist. Choose another name.'
+                                    })
+                                else:
+                                    # later occurrences of the same name in the list are duplicates too
+                                    existing_names.add(name)
+                                    names_to_create.append(name)
+                                    results.append({'name': name})
+
+                            created = dict((bucketlist_item.name, bucketlist_item)
+                                           for bucketlist_item in BucketlistItem.create_many(names_to_create, id))
+                            for result in results:
+                                if 'status' not in result and result['name'] not in created:
+                                    # created by another request since the names were looked for
+                                    result.update({
+                                        'status': 409,
+                                        'message': 'Bucketlist item with this name already exists in this'
+                                                   ' bucketlist. Choose another name.'
+                                    })
+                                elif 'status' not in result:
+                                    bucketlist_item = created[result['name']]
+                                    result.update({
+                                        'status': 201,
+                                        'id': bucketlist_item.id,
+                                        'date_created': bucketlist_item.date_created,
+                                        'date_modified': bucketlist_item.date_modified,
+                                        'done': bucketlist_item.done,
+                                        'belongs_to': bucketlist_item.belongs_to
+                                    })
+
+                            return make_response(jsonify({'items': results})), 200
+
+                        # the items to mark as done or delete
+                        ids = data.get('ids')
+                        if request.method == "PUT" and data.get('all') is True and ids is None:
+                            # all the items of the bucketlist are marked
+                            ids = None
+                        elif not isinstance(ids, list):
+                            # Return a message to the user telling them that they need to submit a list of ids
+                            response = {
+                                'message': 'Parameter ids should be a list.'
+                            }
+                            return make_response(jsonify(response)), 400
+                        elif len(ids) > Config.MAXIMUM_BATCH_SIZE:
+                            response = {
+                                'message': 'At most {} bucketlist items can be sent at once.'.format(
+                                    Config.MAXIMUM_BATCH_SIZE)
+                            }
+                            return make_response(jsonify(response)), 400
+
+                        valid_ids = None
+                        if ids is not None:
+                            valid_ids = [item_id for item_id in ids if valid_batch_id(item_id)]
+
+                        if request.method == "PUT":
+                            done = data.get('done')
+                            if not isinstance(done, bool):
+                                response = {
+                                    'message': 'Parameter done should be true or false.'
+                                }
+                                return make_response(jsonify(response)), 400
+
+                            updated_ids = BucketlistItem.set_done_many(done, id, valid_ids)
+                            if ids is None:
+                                ids = sorted(updated_ids)
+
+                            results = []
+                            for item_id in ids:
+                                if valid_ids is None or valid_batch_id(item_id) and item_id in updated_ids:
+                                    results.append({
+                                        'id': item_id,
+                                        'status': 200,
+                                        'done': done
+                                    })
+                                else:
+                                    results.append({
+                                        'id': item_id,
+                                        'status': 404,
+                                        'message': 'bucketlist item {} not found'.format(item_id)
+                                    })
+
+                            return make_response(jsonify({'items': results})), 200
+
+                        else:
+                            deleted_ids = BucketlistItem.delete_many(valid_ids, id)
+
+                            results = []
+                            for item_id in ids:
+                                if valid_batch_id(item_id) and item_id in deleted_ids:
+                                    results.append({
+                                        'id': item_id,
+                                        'status': 200,
+                                        'message': 'bucketlist item {} deleted'.format(item_id)
+                                    })
+                                else:
+                                    results.append({
+                                        'id': item_id,
+                                        'status': 404,
+                                        'message': 'bucketlist item {} not found'.format(item_id)
+                                    })
+
+                            return make_response(jsonify({'items': results})), 200
+                    else:
+                        # user is not legit, so the payload is an error message
+                        message = user_id
+                        response = {
+                            'message': message
+                        }
+                        return make_response(jsonify(response)), 401
+                else:
+                    response = {
+                        'message': 'Empty token string'
+                    }
+                    return make_response(jsonify(response)), 401
+
+
+# number of export lines sent to the client at a time
+EXPORT_CHUNK_LINES = 500
+
+EXPORT_CSV_COLUMNS = ['bucketlist_id', 'bucketlist_name', 'bucketlist_date_created', 'bucketlist_date_modified',
+                      'item_id', 'item_name', 'item_date_created', 'item_date_modified', 'item_done']
+
+
+def export_ndjson(rows):
+    """
+    Generate the export as newline delimited json, a line for each bucketlist followed by a line for each of its items
+    :param rows: rows of Bucketlist.export_rows
+    :return: generator of chunks of lines
+    """
+    lines = []
+    bucketlist_id = None
+    for row in rows:
+        if row.bucketlist_id != bucketlist_id:
+            bucketlist_id = row.bucketlist_id
+            lines.append(json.dumps({
+                'type': 'bucketlist',
+                'id': row.bucketlist_id,
+                'name': row.bucketlist_name,
+                'date_created': row.bucketlist_date_created.isoformat(),
+                'date_modified': row.bucketlist_date_modified.isoformat()
+            }))
+        if row.item_id is not None:
+            lines.append(json.dumps({
+                'type': 'item',
+                'id': row.item_id,
+                'name': row.item_name,
+                'date_created': row.item_date_created.isoformat(),
+                'date_modified': row.item_date_modified.isoformat(),
+                'done': row.item_done,
+                'belongs_to': row.bucketlist_id
+            }))
+        if len(lines) >= EXPORT_CHUNK_LINES:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def export_csv(rows):
+    """
+    Generate the export as csv, a line for each item with the columns of its bucketlist
+    :param rows: rows of Bucketlist.export_rows
+    :return: generator of chunks of lines
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow([value.isoformat() if hasattr(value, 'isoformat') else value
+                         for value in (getattr(row, column) for column in EXPORT_CSV_COLUMNS)])
+        count += 1
+        if count % EXPORT_CHUNK_LINES == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def gzip_chunks(chunks):
+    """
+    Compress a stream of text chunks with gzip as they are generated
+    :param chunks:
+    :return: generator of compressed bytes
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@bucketlists_blueprint.route('/export', methods=['GET'])
+def export():
+    """
+    Method to download all the bucketlists and items of the logged in user as ndjson or csv
+    The export is streamed from the database, it is compressed with gzip when the client accepts it
+    :return: response
+    """
+    # check if the header with key is present
+    if 'Authorization' not in request.headers:
+        # Return a message to the user telling them that they need to submit an authorization header with token
+        response = {
+            'message': 'Header with key Authorization missing.'
+        }
+        return make_response(jsonify(response)), 401
+    else:
+        # Get the access token from the header
+        auth_header = request.headers.get('Authorization')
+
+        # check for when authorization was not provided in header
+        if not auth_header:
+            # Return a message to the user telling them that they need to submit an authorization header with token
+            response = {
+                'message': 'Token not provided in the header with key Authorization.'
+            }
+            return make_response(jsonify(response)), 401
+        else:
+
+            auth_strings = auth_header.split(" ")
+            if len(auth_strings) != 2:
+                response = {
+                    'message': 'Invalid token format.'
+                }
+                return make_response(jsonify(response)), 401
+            else:
+                access_token = auth_header.split(" ")[1]
+
+                if access_token:
+                    # Attempt to decode the token and get the User ID
+                    user_id = User.decode_token(access_token)
+                    if not isinstance(user_id, str):
+                        # Go ahead and handle the request, the user is authenticated
+                        export_format = request.args.get('format', 'ndjson')
+                        if export_format == 'ndjson':
+                            chunks = export_ndjson(Bucketlist.export_rows(user_id))
+                            mimetype = 'application/x-ndjson'
+                        elif export_format == 'csv':
+                            chunks = export_csv(Bucketlist.export_rows(user_id))
+                            mimetype = 'text/csv'
+                        else:
+                            response = {
+                                'message': 'Parameter format should be ndjson or csv.'
+                            }
+                            return make_response(jsonify(response)), 400
+
+                        headers = {
+                            'Content-Disposition': 'attachment; filename=bucketlists.{}'.format(export_format),
+                            # the body depends on Accept-Encoding, caches must not serve gzip to other clients
+                            'Vary': 'Accept-Encoding'
+                        }
+                        # gzip;q=0 means the client refuses gzip
+                        if request.accept_encodings['gzip'] > 0:
+                            chunks = gzip_chunks(chunks)
+                            headers['Content-Encoding'] = 'gzip'
+
+                        # keep the request context, and so the database session, while the export is streamed
+                        return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+                    else:
+                        # user is not legit, so the payload is an error message
+                        message = user_id
+                        response = {
+                            'message': message
+                        }
+                        return make_response(jsonify(response)), 401
+                else:
+                    response = {
+                        'message': 'Empty token string'
+                    }
+                    return make_response(jsonify(response)), 401
+
+
+@bucketlists_blueprint.route('/import', methods=['POST'])
+def import_data():
+    """
+    Method to import bucketlists and items for the logged in user from newline delimited json
+    The request body is in the format of the ndjson export, it may be compressed with gzip
+    (Content-Encoding: gzip). It is read as a stream, so it can be much bigger than the memory
+    :return: response
+    """
+    # check if the header with key is present
+    if 'Authorization' not in request.headers:
+        # Return a message to the user telling them that they need to submit an authorization header with token
+        response = {
+            'message': 'Header with key Authorization missing.'
+        }
+        return make_response(jsonify(response)), 401
+    else:
+        # Get the access token from the header
+        auth_header = request.headers.get('Authorization')
+
+        # check for when authorization was not provided in header
+        if not auth_header:
+            # Return a message to the user telling them that they need to submit an authorization header with token
+            response = {
+                'message': 'Token not provided in the header with key Authorization.'
+            }
+            return make_response(jsonify(response)), 401
+        else:
+
+            auth_strings = auth_header.split(" ")
+            if len(auth_strings) != 2:
+                response = {
+                    'message': 'Invalid token format.'
+                }
+                return make_response(jsonify(response)), 401
+            else:
+                access_token = auth_header.split(" ")[1]
+
+                if access_token:
+                    # Attempt to decode the token and get the User ID
+                    user_id = User.decode_token(access_token)
+                    if not isinstance(user_id, str):
+                        # Go ahead and handle the request, the user is authenticated
+
+                        # read the body line by line instead of parsing it all at once
+                        lines = request.stream
+                        if request.headers.get('Content-Encoding') == 'gzip':
+                            lines = gzip.GzipFile(fileobj=request.stream)
+
+                        try:
+                            report = import_ndjson(lines, user_id)
+                        except ImportDataError as e:
+                            response = {
+                                'message': str(e)
+                            }
+                            return make_response(jsonify(response)), 400
+                        except (IOError, EOFError, zlib.error):
+                            response = {
+                                'message': 'Request body is not valid gzip.'
+                            }
+                            return make_response(jsonify(response)), 400
+
+                        return make_response(jsonify(report)), 200
+                    else:
+                        # user is not legit, so the payload is an error message
+                        message = user_id
+                        response = {
+                            'message': message
+                        }
+                        return make_response(jsonify(response)), 401
+                else:
+                    response = {
+                        'message': 'Empty token string'
+                    }
+                    return make_response(jsonify(response)), 401
@@ -0,0 +1,159 @@
+import csv
+import io
+import json
+import time
+from sqlalchemy.exc import DBAPIError
+from app import db
+
+# number of parsed lines sent to the database in each COPY
+IMPORT_COPY_BATCH_SIZE = 5000
+
+# the name columns of the bucketlists and items are varchar(255)
+MAXIMUM_NAME_LENGTH = 255
+
+# the id columns of the staging tables are integer
+MAXIMUM_ID = 2 ** 31 - 1
+
+
+class ImportDataError(Exception):
+    """Raised when the data to import can't be read, nothing is imported then."""
+
+
+def import_ndjson(lines, user_id, batch_size=IMPORT_COPY_BATCH_SIZE):
+    """
+    Import bucketlists and items for a user from newline delimited json, in the format of the export
+    The lines are parsed as they are read and loaded with COPY into temporary staging tables, batch_size
+    lines at a time, then merged into the bucketlists and items of the user with two INSERT ... SELECT.
+    Bucketlists whose name the user already has are merged with the existing ones, items whose name
+    already exists in their bucketlist are skipped. Everything is imported in one transaction.
+    :param lines: iterable of lines, as bytes or str
+    :param user_id:
+    :param batch_size:
+    :return: report of the import
+    """
+    started = time.time()
+    report = {
+        'lines': 0,
+        'bucketlists': {'read': 0, 'created': 0},
+        'items': {'read': 0, 'created': 0},
+        'skipped': 0
+    }
+    try:
+        connection = db.session.connection()
+        connection.execute(
+            "CREATE TEMPORARY TABLE import_bucketlists (source_id integer, name varchar(255)) ON COMMIT DROP")
+        connection.execute(
+            "CREATE TEMPORARY TABLE import_items (source_belongs_to integer, name varchar(255), done boolean) "
+            "ON COMMIT DROP")
+        cursor = connection.connection.cursor()
+
+        bucketlists = csv_buffer()
+        items = csv_buffer()
+        try:
+            for number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                report['lines'] += 1
+                try:
+                    if isinstance(line, bytes):
+                        line = line.decode('utf-8')
+                    row = json.loads(line)
+                except ValueError:
+                    raise ImportDataError('Invalid json on line {}.'.format(number))
+
+                if not isinstance(row, dict) or not valid_name(row.get('name')) or not valid_id(row.get('id')):
+                    report['skipped'] += 1
+                elif row.get('type') == 'bucketlist':
+                    report['bucketlists']['read'] += 1
+                    bucketlists[1].writerow([row['id'], row['name']])
+                elif row.get('type') == 'item' and valid_id(row.get('belongs_to')):
+                    report['items']['read'] += 1
+                    items[1].writerow([row['belongs_to'], row['name'], row.get('done') is True])
+                else:
+                    report['skipped'] += 1
+
+                if report['lines'] % batch_size == 0:
+                    copy_buffer(cursor, 'import_bucketlists', bucketlists[0])
+                    copy_buffer(cursor, 'import_items', items[0])
+            copy_buffer(cursor, 'import_bucketlists', bucketlists[0])
+            copy_buffer(cursor, 'import_items', items[0])
+        finally:
+            cursor.close()
+
+        # bucketlists the user already has are kept and their items added to them
+        report['bucketlists']['created'] = connection.execute(db.text(
+            "INSERT INTO bucketlists (name, created_by, date_created, date_modified) "
+            "SELECT DISTINCT name, :user_id, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP FROM import_bucketlists "
+            "ON CONFLICT ON CONSTRAINT uq_bucketlists_created_by_name DO NOTHING"), user_id=user_id).rowcount
+
+        report['items']['created'] = connection.execute(db.text(
+            "INSERT INTO bucketlist_items (name, belongs_to, done, date_created, date_modified) "
+            "SELECT DISTINCT ON (bucketlists.id, import_items.name) "
+            "import_items.name, bucketlists.id, import_items.done, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP "
+            "FROM import_items "
+            "JOIN import_bucketlists ON import_bucketlists.source_id = import_items.source_belongs_to "
+            "JOIN bucketlists ON bucketlists.created_by = :user_id AND bucketlists.name = import_bucketlists.name "
+            "ORDER BY bucketlists.id, import_items.name, import_items.done DESC "
+            "ON CONFLICT ON CONSTRAINT uq_bucketlist_items_belongs_to_name DO NOTHING"), user_id=user_id).rowcount
+
+        db.session.commit()
+    except (DBAPIError, db.engine.dialect.dbapi.Error) as e:
+        # the lines are checked before the COPY, a value the database still refuses is an error of the data
+        db.session.rollback()
+        raise ImportDataError('The data could not be imported: {}'.format(
+            str(getattr(e, 'orig', e)).strip().splitlines()[0]))
+    except Exception:
+        # nothing is imported when a line can't be read or the database refuses the data
+        db.session.rollback()
+        raise
+
+    seconds = time.time() - started
+    report['seconds'] = round(seconds, 3)
+    # the rate of the rows written, blank, skipped and already existing lines cost next to nothing
+    rows = report['bucketlists']['created'] + report['items']['created']
+    report['rows_per_second'] = int(rows / seconds) if seconds > 0 else rows
+    return report
+
+
+def csv_buffer():
+    """
+    Create an in memory csv file to collect the rows of a COPY
+    :return: the buffer and a csv writer on it
+    """
+    buffer = io.StringIO()
+    return buffer, csv.writer(buffer)
+
+
+def copy_buffer(cursor, table, buffer, columns=None):
+    """
+    Load the rows collected in a buffer into a table with COPY, then empty the buffer
+    :param cursor: psycopg2 cursor
+    :param table:
+    :param buffer:
+    :param columns: columns of the rows, all the columns of the table in order by default
+    :return:
+    """
+    if not buffer.tell():
+        return
+    buffer.seek(0)
+    if columns:
+        table = '{} ({})'.format(table, ', '.join(columns))
+    cursor.copy_expert("COPY {} FROM STDIN WITH (FORMAT csv)".format(table), buffer)
+    buffer.seek(0)
+    buffer.truncate()
+
+
+def valid_name(name):
+    """Check that a name can be imported, postgres text can't hold NUL characters nor lone surrogates."""
+    if not isinstance(name, str) or not 0 < len(name) <= MAXIMUM_NAME_LENGTH or '\x00' in name:
+        return False
+    try:
+        name.encode('utf-8')
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def valid_id(value):
+    """Check that an id from the imported data is a positive integer that fits the id columns."""
+    return isinstance(value, int) and not isinstance(value, bool) and 0 < value <= MAXIMUM_ID
@@ -0,0 +1,161 @@
+import logging
+import os
+import select
+import threading
+import time
+from app.replica import recent_writes
+
+# channel notified by the triggers on the bucketlists and items with the id of the user whose data changed
+CHANGES_CHANNEL = 'bucketlist_changes'
+
+# seconds to wait before listening again after losing the connection to the database
+RECONNECT_DELAY = 1
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeListener(object):
+    """
+    Wakes up the event streams of a user when their bucketlists or items change
+    Each worker process keeps one connection listening on the channel notified by the database triggers, so the
+    changes made by any worker reach the streams of every worker. When the database can't notify, nothing wakes
+    the streams up and they find the changes when they check the feed again after waiting.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        # one thread and connection for each database listened to, which are the shards
+        self.threads = {}
+        self.connected = set()
+        self.pid = None
+
+    @property
+    def listening(self):
+        """Whether every database the streams depend on can wake them up."""
+        with self.lock:
+            return bool(self.threads) and self.pid == os.getpid() and len(self.connected) == len(self.threads)
+
+    def start(self, engine):
+        """
+        Start listening to a database in a background thread of this process, if it isn't already
+        :param engine: engine of the database to listen to
+        :return:
+        """
+        if engine.dialect.name != 'postgresql':
+            return
+        key = str(engine.url)
+        with self.lock:
+            # a forked worker doesn't inherit the threads of its parent
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.threads = {}
+                self.connected = set()
+            thread = self.threads.get(key)
+            if thread is not None and thread.is_alive():
+                return
+            thread = threading.Thread(target=self.listen, args=(engine,), name='change-listener')
+            thread.daemon = True
+            self.threads[key] = thread
+            thread.start()
+
+    def start_all(self, app):
+        """
+        Start listening to every shard of an app
+        :param app:
+        :return:
+        """
+        from app.sharding import shard_names, shard_engine
+
+        for name in shard_names(app):
+            self.start(shard_engine(name, app))
+
+    def listen(self, engine):
+        """
+        Listen to the channel and wake up the streams of the users notified, reconnecting when the connection drops
+        :param engine:
+        :return:
+        """
+        key = str(engine.url)
+        while True:
+            connection = None
+            try:
+                # the connection is taken out of the pool as it is kept for the life of the process
+                connection = engine.raw_connection()
+                connection.detach()
+                connection.connection.set_isolation_level(0)
+                cursor = connection.connection.cursor()
+                cursor.execute('LISTEN {}'.format(CHANGES_CHANNEL))
+                with self.lock:
+                    self.connected.add(key)
+                # notifications may have been missed while not listening
+                self.wake_all()
+                while True:
+                    if select.select([connection.connection], [], [], 60) == ([], [], []):
+                        continue
+                    connection.connection.poll()
+                    user_ids = set()
+                    while connection.connection.notifies:
+                        notify = connection.connection.notifies.pop()
+                        try:
+                            user_ids.add(int(notify.payload))
+                        except ValueError:
+                            continue
+                    for user_id in user_ids:
+                        # the reads of the user go to the primary for a while, in every worker
+                        recent_writes.record(user_id)
+                        self.wake(user_id)
+            except Exception:
+                logger.exception('Listening to %s failed, listening again', CHANGES_CHANNEL)
+            finally:
+                with self.lock:
+                    self.connected.discard(key)
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            time.sleep(RECONNECT_DELAY)
+
+    def subscribe(self, user_id):
+        """
+        Register an event stream of a user
+        :param user_id:
+        :return: event set whenever the data of the user changes
+        """
+        event = threading.Event()
+        with self.lock:
+            self.subscribers.setdefault(user_id, set()).add(event)
+        return event
+
+    def unsubscribe(self, user_id, event):
+        """
+        Remove an event stream of a user, once the client is gone
+        :param user_id:
+        :param event: event returned by subscribe
+        :return:
+        """
+        with self.lock:
+            events = self.subscribers.get(user_id)
+            if events is not None:
+                events.discard(event)
+                if not events:
+                    del self.subscribers[user_id]
+
+    def wake(self, user_id):
+        """Wake up the event streams of a user."""
+        with self.lock:
+            events = list(self.subscribers.get(user_id, ()))
+        for event in events:
+            event.set()
+
+    def wake_all(self):
+        """Wake up every event stream of this process."""
+        with self.lock:
+            events = [event for events in self.subscribers.values() for event in events]
+        for event in events:
+            event.set()
+
+
+# the listener of this process
+change_listener = ChangeListener()
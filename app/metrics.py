@@ -0,0 +1,127 @@
+import hmac
+import os
+import time
+from flask import Response, g, has_request_context, jsonify, make_response, request
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# upper bounds of the buckets of the latency histograms, in seconds
+LATENCY_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1, 2.5, 5, 10)
+
+# upper bounds of the buckets of the number of SQL statements run by a request
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+REQUESTS = Counter(
+    'http_requests_total', 'Requests served, by route and status', ['method', 'endpoint', 'status'])
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time to serve a request, by route', ['method', 'endpoint'],
+    buckets=LATENCY_BUCKETS)
+REQUEST_SQL_STATEMENTS = Histogram(
+    'http_request_sql_statements', 'SQL statements run by a request, by route', ['method', 'endpoint'],
+    buckets=STATEMENT_BUCKETS)
+REQUEST_SQL_LATENCY = Histogram(
+    'http_request_sql_duration_seconds', 'Time spent running SQL statements in a request, by route',
+    ['method', 'endpoint'], buckets=LATENCY_BUCKETS)
+
+# the connection pools, recorded by app.pool, labelled by bind: default, replica or shard_<n>.
+# The gauges of the workers are added up, those of dead workers are dropped by gunicorn_config.py
+POOL_CHECKOUTS = Counter(
+    'db_pool_checkouts_total', 'Connections taken from the pool, by bind', ['bind'])
+POOL_TIMEOUTS = Counter(
+    'db_pool_timeouts_total', 'Requests which gave up waiting for a connection of the pool, by bind', ['bind'])
+POOL_WAIT = Histogram(
+    'db_pool_wait_seconds', 'Time waited for a connection of the pool, by bind', ['bind'],
+    buckets=LATENCY_BUCKETS)
+POOL_CHECKED_OUT = Gauge(
+    'db_pool_checked_out_connections', 'Connections of the pool in use, by bind', ['bind'],
+    multiprocess_mode='livesum')
+POOL_OVERFLOW = Gauge(
+    'db_pool_overflow_connections', 'Connections opened beyond the size of the pool, by bind', ['bind'],
+    multiprocess_mode='livesum')
+
+# addresses of the machine itself, allowed to read /metrics when there is no METRICS_TOKEN
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+
+def registry():
+    """
+    Get the registry to export
+    Under gunicorn each worker writes its metrics to prometheus_multiproc_dir, which is set by gunicorn_config.py,
+    and the worker answering the scrape adds up the metrics of all of them
+    :return: registry
+    """
+    if 'prometheus_multiproc_dir' not in os.environ:
+        return REGISTRY
+    collected = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collected)
+    return collected
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement(conn, cursor, statement, parameters, context, executemany):
+    """Remember when a statement started, on every engine."""
+    conn.info['statement_started'] = time.time()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def end_statement(conn, cursor, statement, parameters, context, executemany):
+    """Add a statement to the counts of the request running it."""
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_statements += 1
+        g.sql_seconds += time.time() - conn.info.get('statement_started', time.time())
+
+
+def init_metrics(app):
+    """
+    Measure every request of an app and export the measures on /metrics
+    :param app:
+    :return:
+    """
+
+    @app.before_request
+    def start_request():
+        g.request_started = time.time()
+        g.sql_statements = 0
+        g.sql_seconds = 0.0
+
+    @app.after_request
+    def remember_status(response):
+        g.response_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def measure_request(exc):
+        # the teardown runs for the requests which raised too, which the after request functions don't see, and
+        # only once the body of a response streamed with stream_with_context has been sent
+        if 'request_started' in g:
+            # the endpoint is the name of the view, so that urls with ids are counted together
+            endpoint = request.endpoint or 'unmatched'
+            status = 500 if exc is not None else g.get('response_status', 500)
+            REQUESTS.labels(request.method, endpoint, str(status)).inc()
+            REQUEST_LATENCY.labels(request.method, endpoint).observe(time.time() - g.request_started)
+            REQUEST_SQL_STATEMENTS.labels(request.method, endpoint).observe(g.sql_statements)
+            REQUEST_SQL_LATENCY.labels(request.method, endpoint).observe(g.sql_seconds)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """
+        Method to export the metrics of the requests in the Prometheus text format
+        The scraper sends METRICS_TOKEN as a bearer token, or runs on the same machine when there is no token
+        :return: response
+        """
+        token = app.config.get('METRICS_TOKEN')
+        if token:
+            header = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(header.encode('utf-8'), 'Bearer {}'.format(token).encode('utf-8')):
+                response = {
+                    'message': 'Send the metrics token as a bearer token to read the metrics.'
+                }
+                return make_response(jsonify(response)), 401
+        elif request.remote_addr not in LOOPBACK_ADDRESSES:
+            response = {
+                'message': 'The metrics can only be read from this machine, or with a metrics token.'
+            }
+            return make_response(jsonify(response)), 403
+        return Response(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
@@ -1,8 +1,91 @@
+import re
 from app import db
+from app.sharding import new_user_shard, current_shard, shard_index, DEFAULT_SHARD
 from flask_bcrypt import Bcrypt
 import jwt
+from sqlalchemy import and_, event, inspect, DDL
+from sqlalchemy.dialects.postgresql import insert
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
+# sequence numbering every change to the bucketlists and items, used as the cursor of the feed of changes
+CHANGE_SEQUENCE = db.Sequence('change_seq', metadata=db.Model.metadata)
+
+# a position in the feed of changes is the shard of the user, the transaction of the last change and its change_seq
+FEED_POSITION = re.compile(r'^(\d+)-(\d+)-(\d+)$')
+
+# position of the feed before any change, as (change_txid, change_seq)
+FEED_START = (0, 0)
+
+# number of pending objects after which a unit of work flushes them to the database
+UNIT_OF_WORK_FLUSH_SIZE = 500
+
+
+@contextmanager
+def unit_of_work(flush_size=UNIT_OF_WORK_FLUSH_SIZE):
+    """
+    Run many model writes in one transaction that is committed once, at the end of the block
+    The save and delete methods of the models don't commit inside the block, pending objects are
+    flushed every flush_size objects, and the transaction is rolled back if the block raises.
+    A unit of work started inside another one joins it.
+    Usage:
+        with unit_of_work():
+            for name in names:
+                Bucketlist(name=name, created_by=user_id).save()
+    :param flush_size:
+    :return: the session
+    """
+    session = db.session()
+    if 'unit_of_work' in session.info:
+        # join the unit of work that is already running
+        yield session
+        return
+
+    session.info['unit_of_work'] = {'flush_size': flush_size}
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        del session.info['unit_of_work']
+
+
+def commit_or_defer(commit=True, instance=None):
+    """
+    Commit the session after a model write
+    Inside a unit of work the commit is left to the end of the unit of work, and the pending objects
+    are only flushed once there are enough of them. A new object gets its id from its sequence right away,
+    so that it can be used, for instance as the bucketlist of items created in bulk, before it is flushed.
+    :param commit: False to leave the commit to the caller
+    :param instance: the object that was saved
+    :return:
+    """
+    session = db.session()
+    unit = session.info.get('unit_of_work')
+    if unit is not None:
+        if instance is not None and instance in session.new and instance.id is None:
+            mapper = inspect(instance).mapper
+            instance.id = session.execute(db.select([db.func.nextval(db.func.pg_get_serial_sequence(
+                mapper.mapped_table.name, 'id'))]), mapper=mapper).scalar()
+        if len(session.new) + len(session.dirty) + len(session.deleted) >= unit['flush_size']:
+            session.flush()
+    elif commit:
+        session.commit()
+
+
+def execute_bulk(statement):
+    """
+    Run a statement written without the ORM, for the writes in bulk
+    The objects saved before and not flushed yet by a unit of work are flushed first, so that the statement
+    sees them, like the bucketlist of items created in bulk
+    :param statement:
+    :return: the result
+    """
+    db.session.flush()
+    return db.session.execute(statement)
+
 
 class User(db.Model):
     """
@@ -15,13 +98,17 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(256), nullable=False, unique=True)
     password = db.Column(db.String(256), nullable=False)
+    # the shard keeping the bucketlists of the user, none for the default database, see app.sharding
+    shard = db.Column(db.String(50))
+    # the rows of a deleted user are removed by the database through ON DELETE CASCADE
     bucketlists = db.relationship(
-        'Bucketlist', order_by='Bucketlist.id', cascade="all, delete-orphan")
+        'Bucketlist', order_by='Bucketlist.id', cascade="all, delete-orphan", passive_deletes=True)
 
     def __init__(self, email, password):
         """Initialize the user with an email and a password."""
         self.email = email
         self.password = Bcrypt().generate_password_hash(password).decode()
+        self.shard = new_user_shard(email)
 
     def password_is_valid(self, password):
         """
@@ -29,12 +116,12 @@ class User(db.Model):
         """
         return Bcrypt().check_password_hash(self.password, password)
 
-    def save(self):
+    def save(self, commit=True):
         """Save a user to the database.
         This includes creating a new user and editing one.
         """
         db.session.add(self)
-        db.session.commit()
+        commit_or_defer(commit, self)
 
     def generate_token(self, user_id):
         """ Generates the access token"""
@@ -85,17 +172,30 @@ class Bucketlist(db.Model):
     """
 
     __tablename__ = 'bucketlists'
+    # the names of the bucketlists of a user are unique, this index also serves lookups by created_by
+    __table_args__ = (db.UniqueConstraint('created_by', 'name', name='uq_bucketlists_created_by_name'),)
+    # fetch the dates generated by the database when saving, instead of with another query when they are read
+    __mapper_args__ = {'eager_defaults': True}
 
     # columns of the table
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255))
-    date_created = db.Column(db.DateTime, default=db.func.current_timestamp())
+    # the dates are set by the database, FetchedValue makes them part of the RETURNING clause when saving
+    date_created = db.Column(db.DateTime, default=db.func.current_timestamp(), server_default=db.FetchedValue())
     date_modified = db.Column(
-        db.DateTime, default=db.func.current_timestamp(),
-        onupdate=db.func.current_timestamp())
-    created_by = db.Column(db.Integer, db.ForeignKey(User.id))
+        db.DateTime, default=db.func.current_timestamp(), server_default=db.FetchedValue(),
+        onupdate=db.func.current_timestamp(), server_onupdate=db.FetchedValue())
+    created_by = db.Column(db.Integer, db.ForeignKey(User.id, ondelete='CASCADE'))
+    # position in the feed of changes, the transaction and the sequence number set by a trigger on every insert
+    # and update
+    change_txid = db.Column(db.BigInteger, server_default=db.FetchedValue(), server_onupdate=db.FetchedValue())
+    change_seq = db.Column(db.BigInteger, server_default=db.FetchedValue(), server_onupdate=db.FetchedValue())
+    # number of items and of done items, kept up to date by the triggers on bucketlist_items below
+    item_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    done_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # the items of a deleted bucketlist are removed by the database through ON DELETE CASCADE
     bucketlist_items = db.relationship(
-        'BucketlistItem', order_by='BucketlistItem.id', cascade="all, delete-orphan")
+        'BucketlistItem', order_by='BucketlistItem.id', cascade="all, delete-orphan", passive_deletes=True)
 
     def __init__(self, name, created_by):
         """
@@ -105,13 +205,14 @@ class Bucketlist(db.Model):
         self.name = name
         self.created_by = created_by
 
-    def save(self):
+    def save(self, commit=True):
         """
         To save a new or edit a bucketlist to the database
+        :param commit: False to leave the commit to the caller
         :return:
         """
         db.session.add(self)
-        db.session.commit()
+        commit_or_defer(commit, self)
 
     @staticmethod
     def get_all(user_id):
@@ -122,13 +223,148 @@ class Bucketlist(db.Model):
         """
         return Bucketlist.query.filter_by(created_by=user_id)
 
-    def delete(self):
+    def delete(self, commit=True):
         """
         To delete an existing bucketlist from the database
+        :param commit: False to leave the commit to the caller
         :return:
         """
         db.session.delete(self)
-        db.session.commit()
+        commit_or_defer(commit)
+
+    @staticmethod
+    def create_many(names, user_id, commit=True):
+        """
+        To save many new bucketlists for a user in one insert statement
+        A name created meanwhile by another request of the user is skipped instead of failing the insert
+        :param names: names of the bucketlists, which should not already exist for the user
+        :param user_id:
+        :param commit: False to leave the commit to the caller
+        :return: the created rows, in the order of the names
+        """
+        if not names:
+            return []
+        table = Bucketlist.__table__
+        rows = execute_bulk(
+            insert(table).values([{'name': name, 'created_by': user_id} for name in names]).on_conflict_do_nothing(
+                index_elements=[table.c.created_by, table.c.name]).returning(
+                table.c.id, table.c.name, table.c.date_created, table.c.date_modified, table.c.created_by,
+                table.c.item_count, table.c.done_count)).fetchall()
+        commit_or_defer(commit)
+        return sorted(rows, key=lambda row: row.id)
+
+    @staticmethod
+    def update_owned(id, user_id, commit=True, **values):
+        """
+        To edit a bucketlist of a user in one update statement, without loading it first
+        A name that is already used by another bucketlist of the user raises an IntegrityError
+        :param id:
+        :param user_id:
+        :param values: the columns to set
+        :param commit: False to leave the commit to the caller
+        :return: the updated row, or None if the user has no bucketlist with this id
+        """
+        table = Bucketlist.__table__
+        row = execute_bulk(table.update().where(and_(
+            table.c.id == id, table.c.created_by == user_id)).values(**values).returning(
+            table.c.id, table.c.name, table.c.date_created, table.c.date_modified, table.c.created_by,
+            table.c.item_count, table.c.done_count)).first()
+        commit_or_defer(commit)
+        return row
+
+    @staticmethod
+    def existing_names(names, user_id):
+        """
+        To get which of the given names a user has already used for their bucketlists
+        :param names:
+        :param user_id:
+        :return: set of names
+        """
+        if not names:
+            return set()
+        return set(name for name, in db.session.query(Bucketlist.name).filter(
+            Bucketlist.created_by == user_id, Bucketlist.name.in_(names)))
+
+    @staticmethod
+    def delete_owned(id, user_id, commit=True):
+        """
+        To delete a bucketlist of a user in one delete statement, without loading it or its items
+        :param id:
+        :param user_id:
+        :param commit: False to leave the commit to the caller
+        :return: True if the bucketlist was deleted, False if the user has no bucketlist with this id
+        """
+        return id in Bucketlist.delete_many([id], user_id, commit=commit)
+
+    @staticmethod
+    def delete_many(ids, user_id, commit=True):
+        """
+        To delete many bucketlists of a user, together with their items, in one delete statement
+        :param ids:
+        :param user_id:
+        :param commit: False to leave the commit to the caller
+        :return: set of the ids that were deleted
+        """
+        if not ids:
+            return set()
+        table = Bucketlist.__table__
+        rows = execute_bulk(table.delete().where(and_(
+            table.c.created_by == user_id, table.c.id.in_(ids))).returning(table.c.id)).fetchall()
+        commit_or_defer(commit)
+        return set(row.id for row in rows)
+
+    @staticmethod
+    def changed_since(user_id, since, limit):
+        """
+        To get the bucketlists of a user created or edited after a position in the feed of changes
+        :param user_id:
+        :param since: change_txid and change_seq of the last change the client has
+        :param limit:
+        :return: list of bucketlists in the order of the feed
+        """
+        return Bucketlist.query.filter(
+            Bucketlist.created_by == user_id,
+            db.tuple_(Bucketlist.change_txid, Bucketlist.change_seq) > db.tuple_(*since)).order_by(
+            Bucketlist.change_txid, Bucketlist.change_seq).limit(limit).all()
+
+    @staticmethod
+    def export_rows(user_id, batch_size=1000):
+        """
+        To read all the bucketlists of a user together with their items, one row per item
+        Bucketlists without items come with empty item columns. The rows are read through a server side
+        cursor batch_size at a time, so that a whole export is never held in memory
+        :param user_id:
+        :param batch_size:
+        :return: query ordered by bucketlist and item
+        """
+        return db.session.query(
+            Bucketlist.id.label('bucketlist_id'), Bucketlist.name.label('bucketlist_name'),
+            Bucketlist.date_created.label('bucketlist_date_created'),
+            Bucketlist.date_modified.label('bucketlist_date_modified'),
+            BucketlistItem.id.label('item_id'), BucketlistItem.name.label('item_name'),
+            BucketlistItem.date_created.label('item_date_created'),
+            BucketlistItem.date_modified.label('item_date_modified'), BucketlistItem.done.label('item_done')).outerjoin(
+            BucketlistItem, BucketlistItem.belongs_to == Bucketlist.id).filter(
+            Bucketlist.created_by == user_id).order_by(Bucketlist.id, BucketlistItem.id).yield_per(batch_size)
+
+    @staticmethod
+    def repair_counts(commit=True):
+        """
+        To recount the items and the done items of every bucketlist in one update statement
+        The counts are otherwise maintained by the database, this fills them in for existing rows
+        and fixes them after the triggers were missing
+        :param commit: False to leave the commit to the caller
+        :return: the number of bucketlists updated
+        """
+        items = BucketlistItem.__table__
+        table = Bucketlist.__table__
+        item_count = db.select([db.func.count(items.c.id)]).where(items.c.belongs_to == table.c.id)
+        done_count = item_count.where(items.c.done == db.true())
+        result = execute_bulk(table.update().values(
+            item_count=item_count.as_scalar(), done_count=done_count.as_scalar(),
+            date_modified=table.c.date_modified))
+        commit_or_defer(commit)
+        return result.rowcount
 
     def __repr__(self):
         """
@@ -142,40 +378,600 @@ class BucketlistItem(db.Model):
     """This class defines the bucketlist_items table"""
 
     __tablename__ = "bucketlist_items"
+    # the names of the items in a bucketlist are unique, this index also serves lookups by belongs_to
+    __table_args__ = (db.UniqueConstraint('belongs_to', 'name', name='uq_bucketlist_items_belongs_to_name'),)
+    # fetch the dates generated by the database when saving, instead of with another query when they are read
+    __mapper_args__ = {'eager_defaults': True}
 
     # define the columns of the table, starting with its primary key
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255))
-    date_created = db.Column(db.DateTime, default=db.func.current_timestamp())
+    # the dates are set by the database, FetchedValue makes them part of the RETURNING clause when saving
+    date_created = db.Column(db.DateTime, default=db.func.current_timestamp(), server_default=db.FetchedValue())
     date_modified = db.Column(
-        db.DateTime, default=db.func.current_timestamp(),
-        onupdate=db.func.current_timestamp())
+        db.DateTime, default=db.func.current_timestamp(), server_default=db.FetchedValue(),
+        onupdate=db.func.current_timestamp(), server_onupdate=db.FetchedValue())
     done = db.Column(db.Boolean, default=False)
-    belongs_to = db.Column(db.Integer, db.ForeignKey(Bucketlist.id))
+    belongs_to = db.Column(db.Integer, db.ForeignKey(Bucketlist.id, ondelete='CASCADE'))
+    # position in the feed of changes, the transaction and the sequence number set by a trigger on every insert
+    # and update
+    change_txid = db.Column(db.BigInteger, server_default=db.FetchedValue(), server_onupdate=db.FetchedValue())
+    change_seq = db.Column(db.BigInteger, server_default=db.FetchedValue(), server_onupdate=db.FetchedValue())
 
     def __init__(self, name, belongs_to):
         """Initialize the bucketlist item with a name and the bucketlist it belongs to."""
         self.name = name
         self.belongs_to = belongs_to
 
-    def save(self):
+    def save(self, commit=True):
         """Save a bucketlist item
         This applies for both creating a new bucketlist item
         and updating an existing one onupdate
         """
         db.session.add(self)
-        db.session.commit()
+        commit_or_defer(commit, self)
 
     @staticmethod
     def get_bucketlist_items(bucketlist_id):
         """This method gets all the items in a given bucketlist."""
         return BucketlistItem.query.filter_by(belongs_to=bucketlist_id)
 
-    def delete(self):
+    @staticmethod
+    def search(user_id, search_string=None, done=None, since=None, after=None):
+        """
+        Search the items in all the bucketlists of a given user.
+        The name match goes through the full text index on bucketlist_items.name and
+        the results are ordered by id so that they can be paged with the last id seen
+        :param user_id:
+        :param search_string: words that the item name should contain, the last one may be a prefix
+        :param done:
+        :param since: only return items modified at or after this datetime
+        :param after: only return items whose id is greater than this one
+        :return: query
+        """
+        query = BucketlistItem.query.join(
+            Bucketlist, BucketlistItem.belongs_to == Bucketlist.id).filter(
+            Bucketlist.created_by == user_id)
+
+        if search_string:
+            # build a prefix tsquery out of the words only, so that user input can't break the query syntax
+            words = re.findall(r'\w+', search_string)
+            if words:
+                ts_query = ' & '.join(word + ':*' for word in words)
+                query = query.filter(
+                    BucketlistItem.name_tsvector().op('@@')(db.func.to_tsquery('simple', ts_query)))
+            else:
+                # nothing to search for matches nothing, rather than every item
+                query = query.filter(db.false())
+
+        if done is not None:
+            query = query.filter(BucketlistItem.done == done)
+
+        if since is not None:
+            query = query.filter(BucketlistItem.date_modified >= since)
+
+        if after is not None:
+            query = query.filter(BucketlistItem.id > after)
+
+        return query.order_by(BucketlistItem.id)
+
+    @staticmethod
+    def changed_since(user_id, since, limit):
+        """
+        Get the items in the bucketlists of a user created or edited after a position in the feed of changes
+        :param user_id:
+        :param since: change_txid and change_seq of the last change the client has
+        :param limit:
+        :return: list of items in the order of the feed
+        """
+        return BucketlistItem.query.join(
+            Bucketlist, BucketlistItem.belongs_to == Bucketlist.id).filter(
+            Bucketlist.created_by == user_id,
+            db.tuple_(BucketlistItem.change_txid, BucketlistItem.change_seq) > db.tuple_(*since)).order_by(
+            BucketlistItem.change_txid, BucketlistItem.change_seq).limit(limit).all()
+
+    @staticmethod
+    def name_tsvector():
+        """
+        The text search vector of the item name.
+        It must match the expression of the index below for the index to be used
+        """
+        return db.func.to_tsvector('simple', BucketlistItem.name)
+
+    def delete(self, commit=True):
         """Deletes a given bucketlist item."""
         db.session.delete(self)
-        db.session.commit()
+        commit_or_defer(commit)
+
+    @staticmethod
+    def create_many(names, bucketlist_id, commit=True):
+        """
+        Save many new items in a bucketlist in one insert statement
+        A name created meanwhile by another request is skipped instead of failing the insert
+        :param names: names of the items, which should not already exist in the bucketlist
+        :param bucketlist_id:
+        :param commit: False to leave the commit to the caller
+        :return: the created rows, in the order of the names
+        """
+        if not names:
+            return []
+        table = BucketlistItem.__table__
+        rows = execute_bulk(
+            insert(table).values([{'name': name, 'belongs_to': bucketlist_id} for name in names]).
+            on_conflict_do_nothing(index_elements=[table.c.belongs_to, table.c.name]).returning(
+                table.c.id, table.c.name, table.c.date_created, table.c.date_modified, table.c.done,
+                table.c.belongs_to)).fetchall()
+        commit_or_defer(commit)
+        return sorted(rows, key=lambda row: row.id)
+
+    @staticmethod
+    def owned_condition(id, bucketlist_id, user_id):
+        """
+        The condition matching an item of a bucketlist only when the bucketlist belongs to the user
+        It lets the item and its owner be checked by the same statement that reads, edits or deletes the item
+        :param id:
+        :param bucketlist_id:
+        :param user_id:
+        :return: the where clause
+        """
+        owned = db.select([Bucketlist.id]).where(and_(
+            Bucketlist.id == bucketlist_id, Bucketlist.created_by == user_id))
+        return and_(BucketlistItem.id == id, BucketlistItem.belongs_to == bucketlist_id,
+                    BucketlistItem.belongs_to.in_(owned))
+
+    @staticmethod
+    def get_owned(id, bucketlist_id, user_id):
+        """
+        Get an item of a bucketlist in one query that also checks that the bucketlist belongs to the user
+        :param id:
+        :param bucketlist_id:
+        :param user_id:
+        :return: the item, or None if the user has no such item
+        """
+        return BucketlistItem.query.filter(BucketlistItem.owned_condition(id, bucketlist_id, user_id)).first()
+
+    @staticmethod
+    def update_owned(id, bucketlist_id, user_id, commit=True, **values):
+        """
+        Edit an item in one update statement that also checks that its bucketlist belongs to the user
+        A name that is already used by another item of the bucketlist raises an IntegrityError
+        :param id:
+        :param bucketlist_id:
+        :param user_id:
+        :param values: the columns to set
+        :param commit: False to leave the commit to the caller
+        :return: the updated row, or None if the user has no such item
+        """
+        table = BucketlistItem.__table__
+        row = execute_bulk(table.update().where(
+            BucketlistItem.owned_condition(id, bucketlist_id, user_id)).values(**values).returning(
+            table.c.id, table.c.name, table.c.date_created, table.c.date_modified, table.c.done,
+            table.c.belongs_to)).first()
+        commit_or_defer(commit)
+        return row
+
+    @staticmethod
+    def existing_names(names, bucketlist_id):
+        """Get which of the given names are already used by items in a bucketlist."""
+        if not names:
+            return set()
+        return set(name for name, in db.session.query(BucketlistItem.name).filter(
+            BucketlistItem.belongs_to == bucketlist_id, BucketlistItem.name.in_(names)))
+
+    @staticmethod
+    def set_done_many(done, bucketlist_id, ids=None, commit=True):
+        """
+        Mark many items of a bucketlist as done or not done in one update statement
+        :param done:
+        :param bucketlist_id:
+        :param ids: the items to update, all the items of the bucketlist are updated if it is None
+        :param commit: False to leave the commit to the caller
+        :return: set of the ids that were updated
+        """
+        if ids is not None and not ids:
+            return set()
+        table = BucketlistItem.__table__
+        condition = table.c.belongs_to == bucketlist_id
+        if ids is not None:
+            condition = and_(condition, table.c.id.in_(ids))
+        rows = execute_bulk(
+            table.update().where(condition).values(done=done).returning(table.c.id)).fetchall()
+        commit_or_defer(commit)
+        return set(row.id for row in rows)
+
+    @staticmethod
+    def delete_owned(id, bucketlist_id, user_id, commit=True):
+        """
+        Delete an item in one delete statement that also checks that its bucketlist belongs to the user
+        :param id:
+        :param bucketlist_id:
+        :param user_id:
+        :param commit: False to leave the commit to the caller
+        :return: True if the item was deleted, False if the user has no such item
+        """
+        table = BucketlistItem.__table__
+        row = execute_bulk(table.delete().where(
+            BucketlistItem.owned_condition(id, bucketlist_id, user_id)).returning(table.c.id)).first()
+        commit_or_defer(commit)
+        return row is not None
+
+    @staticmethod
+    def delete_many(ids, bucketlist_id, commit=True):
+        """
+        Delete many items of a bucketlist in one delete statement
+        :param ids:
+        :param bucketlist_id:
+        :param commit: False to leave the commit to the caller
+        :return: set of the ids that were deleted
+        """
+        if not ids:
+            return set()
+        table = BucketlistItem.__table__
+        rows = execute_bulk(table.delete().where(and_(
+            table.c.belongs_to == bucketlist_id, table.c.id.in_(ids))).returning(table.c.id)).fetchall()
+        commit_or_defer(commit)
+        return set(row.id for row in rows)
 
     def __repr__(self):
         """Return a representation of a bucketlist instance."""
         return "<Bucketlist Item: {}>".format(self.name)
+
+
+# full text index used when searching items across all the bucketlists of a user
+db.Index('ix_bucketlist_items_name_tsvector', BucketlistItem.name_tsvector(), postgresql_using='gin')
+
+# indexes used to read the feed of changes of a user
+db.Index('ix_bucketlists_created_by_change_txid', Bucketlist.created_by, Bucketlist.change_txid, Bucketlist.change_seq)
+db.Index('ix_bucketlist_items_belongs_to_change_txid', BucketlistItem.belongs_to, BucketlistItem.change_txid,
+         BucketlistItem.change_seq)
+
+
+class Tombstone(db.Model):
+    """
+    This is the table recording the bucketlists and items that were deleted, for the feed of changes
+    The rows are written by the triggers on the bucketlists and bucketlist_items tables below
+    """
+
+    __tablename__ = 'tombstones'
+    __table_args__ = (db.Index('ix_tombstones_user_id_change_txid', 'user_id', 'change_txid', 'change_seq'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    # the owner of the deleted bucketlist or item, there is no foreign key as the tombstone outlives them
+    user_id = db.Column(db.Integer, nullable=False)
+    # either bucketlist or item
+    record_type = db.Column(db.String(20), nullable=False)
+    record_id = db.Column(db.Integer, nullable=False)
+    bucketlist_id = db.Column(db.Integer)
+    change_txid = db.Column(db.BigInteger, nullable=False)
+    change_seq = db.Column(db.BigInteger, nullable=False)
+    date_deleted = db.Column(db.DateTime, nullable=False)
+
+    @staticmethod
+    def changed_since(user_id, since, limit):
+        """
+        Get the bucketlists and items of a user deleted after a position in the feed of changes
+        :param user_id:
+        :param since: change_txid and change_seq of the last change the client has
+        :param limit:
+        :return: list of tombstones in the order of the feed
+        """
+        return Tombstone.query.filter(
+            Tombstone.user_id == user_id,
+            db.tuple_(Tombstone.change_txid, Tombstone.change_seq) > db.tuple_(*since)).order_by(
+            Tombstone.change_txid, Tombstone.change_seq).limit(limit).all()
+
+    def __repr__(self):
+        """Return a representation of a tombstone."""
+        return "<Tombstone: {} {}>".format(self.record_type, self.record_id)
+
+
+def changes_since(user_id, since, limit):
+    """
+    Get the changes to the bucketlists and items of a user after a position in the feed of changes
+    The feed is in the order of the transactions, then of the change_seq within each. The changes of a transaction
+    are only returned once every older transaction is over, committed or rolled back, so that a change committed
+    later can't land behind a position a client already has. Each source is read up to limit + 1 changes, then
+    they are merged in the order of the feed and cut at limit so that no change is skipped between two pages
+    :param user_id:
+    :param since: change_txid and change_seq of the last change the client has
+    :param limit:
+    :return: list of ((change_txid, change_seq), kind, record) where kind is bucketlist, item or deleted, whether
+    there are more, and whether there are changes held back until older transactions are over
+    """
+    # the transactions older than the oldest one still running are all over, and visible to the reads below
+    oldest_running = db.session.execute(
+        db.select([db.func.txid_snapshot_xmin(db.func.txid_current_snapshot())])).scalar()
+    changes = [((bucketlist.change_txid, bucketlist.change_seq), 'bucketlist', bucketlist)
+               for bucketlist in Bucketlist.changed_since(user_id, since, limit + 1)]
+    changes += [((item.change_txid, item.change_seq), 'item', item)
+                for item in BucketlistItem.changed_since(user_id, since, limit + 1)]
+    changes += [((tombstone.change_txid, tombstone.change_seq), 'deleted', tombstone)
+                for tombstone in Tombstone.changed_since(user_id, since, limit + 1)]
+    changes.sort(key=lambda change: change[0])
+    ready = [change for change in changes if change[0][0] < oldest_running]
+    return ready[:limit], len(ready) > limit, len(ready) < len(changes)
+
+
+def format_position(position):
+    """
+    Write a position in the feed of changes for a client
+    :param position: change_txid and change_seq
+    :return: string
+    """
+    return '{}-{}-{}'.format(shard_index(current_shard() or DEFAULT_SHARD), position[0], position[1])
+
+
+def parse_position(value):
+    """
+    Read a position in the feed of changes sent back by a client
+    0, the plain change_seq of the positions from before the transactions were part of them, and the positions on
+    another shard, which the user has since moved from, are the start of the feed: the client gets everything again
+    :param value:
+    :return: change_txid and change_seq, None when the value isn't a position
+    """
+    value = value.strip()
+    if value.isdigit():
+        return FEED_START
+    match = FEED_POSITION.match(value)
+    if not match:
+        return None
+    shard, change_txid, change_seq = (int(group) for group in match.groups())
+    if shard != shard_index(current_shard() or DEFAULT_SHARD):
+        return FEED_START
+    return change_txid, change_seq
+
+
+# the item_count and done_count of the bucketlists are maintained by statement level triggers, so that
+# every way of writing items (one at a time, in bulk or by cascade) keeps them right in the same transaction
+BUCKETLIST_COUNTS_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION bucketlist_items_counts() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            UPDATE bucketlists SET item_count = item_count + changes.items, done_count = done_count + changes.done
+            FROM (SELECT belongs_to, count(*) AS items, count(*) FILTER (WHERE done) AS done
+                  FROM new_items GROUP BY belongs_to) changes
+            WHERE bucketlists.id = changes.belongs_to;
+        ELSIF TG_OP = 'DELETE' THEN
+            UPDATE bucketlists SET item_count = item_count - changes.items, done_count = done_count - changes.done
+            FROM (SELECT belongs_to, count(*) AS items, count(*) FILTER (WHERE done) AS done
+                  FROM old_items GROUP BY belongs_to) changes
+            WHERE bucketlists.id = changes.belongs_to;
+        ELSE
+            UPDATE bucketlists SET item_count = item_count + changes.items, done_count = done_count + changes.done
+            FROM (SELECT belongs_to, sum(items) AS items, sum(done) AS done FROM (
+                      SELECT belongs_to, 1 AS items, CASE WHEN done THEN 1 ELSE 0 END AS done FROM new_items
+                      UNION ALL
+                      SELECT belongs_to, -1, CASE WHEN done THEN -1 ELSE 0 END FROM old_items) item_changes
+                  GROUP BY belongs_to) changes
+            WHERE bucketlists.id = changes.belongs_to AND (changes.items <> 0 OR changes.done <> 0);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS bucketlist_items_counts_insert ON bucketlist_items",
+    "DROP TRIGGER IF EXISTS bucketlist_items_counts_update ON bucketlist_items",
+    "DROP TRIGGER IF EXISTS bucketlist_items_counts_delete ON bucketlist_items",
+    """
+    CREATE TRIGGER bucketlist_items_counts_insert AFTER INSERT ON bucketlist_items
+    REFERENCING NEW TABLE AS new_items
+    FOR EACH STATEMENT EXECUTE PROCEDURE bucketlist_items_counts()
+    """,
+    """
+    CREATE TRIGGER bucketlist_items_counts_update AFTER UPDATE ON bucketlist_items
+    REFERENCING OLD TABLE AS old_items NEW TABLE AS new_items
+    FOR EACH STATEMENT EXECUTE PROCEDURE bucketlist_items_counts()
+    """,
+    """
+    CREATE TRIGGER bucketlist_items_counts_delete AFTER DELETE ON bucketlist_items
+    REFERENCING OLD TABLE AS old_items
+    FOR EACH STATEMENT EXECUTE PROCEDURE bucketlist_items_counts()
+    """,
+]
+
+# every insert and update of a bucketlist or item records its transaction and takes the next change_seq, and every
+# delete leaves a tombstone, so that the feed of changes sees all of them whichever way they are written. Every
+# statement also notifies the bucketlist_changes channel with the ids of the users whose data changed, once they are
+# committed
+BUCKETLISTS_CHANGES_DDL = [
+    "CREATE SEQUENCE IF NOT EXISTS change_seq",
+    """
+    CREATE OR REPLACE FUNCTION set_change_seq() RETURNS trigger AS $$
+    BEGIN
+        NEW.change_txid := txid_current();
+        NEW.change_seq := nextval('change_seq');
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION bucketlists_tombstones() RETURNS trigger AS $$
+    BEGIN
+        -- the bucketlists of a deleted user need no tombstone, there is nobody left to sync them
+        INSERT INTO tombstones (user_id, record_type, record_id, bucketlist_id, change_txid, change_seq, date_deleted)
+        SELECT old_bucketlists.created_by, 'bucketlist', old_bucketlists.id, old_bucketlists.id,
+               txid_current(), nextval('change_seq'), CURRENT_TIMESTAMP
+        FROM old_bucketlists JOIN users ON users.id = old_bucketlists.created_by;
+        PERFORM pg_notify('bucketlist_changes', users.created_by::text)
+        FROM (SELECT DISTINCT old_bucketlists.created_by FROM old_bucketlists
+              JOIN users ON users.id = old_bucketlists.created_by) AS users;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION bucketlist_items_tombstones() RETURNS trigger AS $$
+    BEGIN
+        -- the items of a deleted bucketlist need no tombstone, the tombstone of the bucketlist covers them
+        INSERT INTO tombstones (user_id, record_type, record_id, bucketlist_id, change_txid, change_seq, date_deleted)
+        SELECT bucketlists.created_by, 'item', old_items.id, old_items.belongs_to,
+               txid_current(), nextval('change_seq'), CURRENT_TIMESTAMP
+        FROM old_items JOIN bucketlists ON bucketlists.id = old_items.belongs_to;
+        PERFORM pg_notify('bucketlist_changes', users.created_by::text)
+        FROM (SELECT DISTINCT bucketlists.created_by FROM old_items
+              JOIN bucketlists ON bucketlists.id = old_items.belongs_to) AS users;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION bucketlists_notify() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('bucketlist_changes', users.created_by::text)
+        FROM (SELECT DISTINCT created_by FROM new_bucketlists) AS users;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION bucketlist_items_notify() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('bucketlist_changes', users.created_by::text)
+        FROM (SELECT DISTINCT bucketlists.created_by FROM new_items
+              JOIN bucketlists ON bucketlists.id = new_items.belongs_to) AS users;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS bucketlists_change_seq ON bucketlists",
+    "DROP TRIGGER IF EXISTS bucketlists_tombstones ON bucketlists",
+    "DROP TRIGGER IF EXISTS bucketlists_notify_insert ON bucketlists",
+    "DROP TRIGGER IF EXISTS bucketlists_notify_update ON bucketlists",
+    """
+    CREATE TRIGGER bucketlists_change_seq BEFORE INSERT OR UPDATE ON bucketlists
+    FOR EACH ROW EXECUTE PROCEDURE set_change_seq()
+    """,
+    """
+    CREATE TRIGGER bucketlists_tombstones AFTER DELETE ON bucketlists
+    REFERENCING OLD TABLE AS old_bucketlists
+    FOR EACH STATEMENT EXECUTE PROCEDURE bucketlists_tombstones()
+    """,
+    """
+    CREATE TRIGGER bucketlists_notify_insert AFTER INSERT ON bucketlists
+    REFERENCING NEW TABLE AS new_bucketlists
+    FOR EACH STATEMENT EXECUTE PROCEDURE bucketlists_notify()
+    """,
+    """
+    CREATE TRIGGER bucketlists_notify_update AFTER UPDATE ON bucketlists
+    REFERENCING NEW TABLE AS new_bucketlists
+    FOR EACH STATEMENT EXECUTE PROCEDURE bucketlists_notify()
+    """,
+]
+
+BUCKETLIST_ITEMS_CHANGES_DDL = [
+    "DROP TRIGGER IF EXISTS bucketlist_items_change_seq ON bucketlist_items",
+    "DROP TRIGGER IF EXISTS bucketlist_items_tombstones ON bucketlist_items",
+    "DROP TRIGGER IF EXISTS bucketlist_items_notify_insert ON bucketlist_items",
+    "DROP TRIGGER IF EXISTS bucketlist_items_notify_update ON bucketlist_items",
+    """
+    CREATE TRIGGER bucketlist_items_change_seq BEFORE INSERT OR UPDATE ON bucketlist_items
+    FOR EACH ROW EXECUTE PROCEDURE set_change_seq()
+    """,
+    """
+    CREATE TRIGGER bucketlist_items_tombstones AFTER DELETE ON bucketlist_items
+    REFERENCING OLD TABLE AS old_items
+    FOR EACH STATEMENT EXECUTE PROCEDURE bucketlist_items_tombstones()
+    """,
+    """
+    CREATE TRIGGER bucketlist_items_notify_insert AFTER INSERT ON bucketlist_items
+    REFERENCING NEW TABLE AS new_items
+    FOR EACH STATEMENT EXECUTE PROCEDURE bucketlist_items_notify()
+    """,
+    """
+    CREATE TRIGGER bucketlist_items_notify_update AFTER UPDATE ON bucketlist_items
+    REFERENCING NEW TABLE AS new_items
+    FOR EACH STATEMENT EXECUTE PROCEDURE bucketlist_items_notify()
+    """,
+]
+
+# the statements run after creating each table, in the order in which the tables are created
+TRIGGERS_DDL = [
+    (Bucketlist.__table__, BUCKETLISTS_CHANGES_DDL),
+    (BucketlistItem.__table__, BUCKETLIST_COUNTS_DDL + BUCKETLIST_ITEMS_CHANGES_DDL),
+]
+
+for table, statements in TRIGGERS_DDL:
+    for statement in statements:
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+
+# makes the foreign key of a column cascade the deletes, which the relationships with passive_deletes rely on,
+# replacing the foreign key the tables were first created with
+CASCADE_FOREIGN_KEY_DDL = """
+DO $$
+DECLARE
+    column_number smallint := (SELECT attnum FROM pg_attribute
+                               WHERE attrelid = '{table}'::regclass AND attname = '{column}');
+    foreign_key name;
+BEGIN
+    FOR foreign_key IN SELECT conname FROM pg_constraint
+                       WHERE conrelid = '{table}'::regclass AND contype = 'f' AND conkey = ARRAY[column_number]
+                       AND confdeltype <> 'c' LOOP
+        EXECUTE format('ALTER TABLE {table} DROP CONSTRAINT %I', foreign_key);
+    END LOOP;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint
+                   WHERE conrelid = '{table}'::regclass AND contype = 'f' AND conkey = ARRAY[column_number]) THEN
+        ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fkey FOREIGN KEY ({column})
+            REFERENCES {referenced} (id) ON DELETE CASCADE;
+    END IF;
+END
+$$
+"""
+
+# adds a unique constraint, which the inserts skipping the names already used rely on
+UNIQUE_CONSTRAINT_DDL = """
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = '{table}'::regclass AND conname = '{name}') THEN
+        ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE ({columns});
+    END IF;
+END
+$$
+"""
+
+# brings the tables of a database created before the counts, the feed of changes and the cascading deletes up to
+# date, before the triggers using them are installed. The old rows take a change_seq each, in the order of their ids,
+# and a change_txid of 0, so that they come first in the feed of changes
+UPGRADE_SCHEMA_DDL = [
+    "CREATE SEQUENCE IF NOT EXISTS change_seq",
+    """
+    ALTER TABLE bucketlists
+        ADD COLUMN IF NOT EXISTS item_count integer NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS done_count integer NOT NULL DEFAULT 0
+    """,
+] + [
+    statement.format(table)
+    for table in ('bucketlists', 'bucketlist_items')
+    for statement in (
+        "ALTER TABLE {} ADD COLUMN IF NOT EXISTS change_seq bigint DEFAULT nextval('change_seq')",
+        "ALTER TABLE {} ALTER COLUMN change_seq DROP DEFAULT",
+    )
+] + [
+    "ALTER TABLE {} ADD COLUMN IF NOT EXISTS change_txid bigint NOT NULL DEFAULT 0".format(table)
+    for table in ('bucketlists', 'bucketlist_items', 'tombstones')
+] + [
+    CASCADE_FOREIGN_KEY_DDL.format(table='bucketlists', column='created_by', referenced='users'),
+    CASCADE_FOREIGN_KEY_DDL.format(table='bucketlist_items', column='belongs_to', referenced='bucketlists'),
+    UNIQUE_CONSTRAINT_DDL.format(table='bucketlists', name='uq_bucketlists_created_by_name',
+                                 columns='created_by, name'),
+    UNIQUE_CONSTRAINT_DDL.format(table='bucketlist_items', name='uq_bucketlist_items_belongs_to_name',
+                                 columns='belongs_to, name'),
+]
+
+
+def install_triggers():
+    """
+    Create or replace the triggers maintaining the item counts of the bucketlists and the feed of changes
+    Tables created with create_all already have them, this is for databases created before them: the tombstones
+    table, the columns the triggers write and the constraints the deletes and the bulk inserts rely on are added
+    first if they are missing. It can be run again.
+    :return:
+    """
+    if db.engine.dialect.name == 'postgresql':
+        Tombstone.__table__.create(bind=db.session.connection(mapper=inspect(Tombstone).mapper), checkfirst=True)
+        for statement in UPGRADE_SCHEMA_DDL:
+            db.session.execute(statement)
+        for table, statements in TRIGGERS_DDL:
+            for statement in statements:
+                db.session.execute(statement)
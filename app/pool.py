@@ -0,0 +1,195 @@
+import logging
+import threading
+import time
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import exc, orm
+from sqlalchemy.pool import NullPool, QueuePool
+from app.metrics import POOL_CHECKED_OUT, POOL_CHECKOUTS, POOL_OVERFLOW, POOL_TIMEOUTS, POOL_WAIT
+from app.replica import RoutingSession
+
+# seconds waited for a connection of the pool after which the checkout is logged as slow
+POOL_SLOW_CHECKOUT_SECONDS = 1
+
+logger = logging.getLogger(__name__)
+
+
+class PoolMetrics(object):
+    """
+    Counts what the connection pools of this process do, to see whether requests wait for connections
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Set every count back to zero."""
+        with self.lock:
+            self.checkouts = 0
+            self.connects = 0
+            self.invalidations = 0
+            self.timeouts = 0
+            self.slow_checkouts = 0
+            self.wait_seconds = 0.0
+            self.max_wait_seconds = 0.0
+
+    def record_checkout(self, waited):
+        """
+        Count a connection taken from a pool
+        :param waited: seconds waited for it
+        :return:
+        """
+        with self.lock:
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            if waited >= POOL_SLOW_CHECKOUT_SECONDS:
+                self.slow_checkouts += 1
+        if waited >= POOL_SLOW_CHECKOUT_SECONDS:
+            logger.warning('Waited %.3f seconds for a database connection', waited)
+
+    def record_timeout(self, waited):
+        """
+        Count a request that gave up waiting for a connection
+        :param waited: seconds waited
+        :return:
+        """
+        with self.lock:
+            self.timeouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        logger.error('No database connection available after %.3f seconds', waited)
+
+    def record_connect(self, dbapi_connection, connection_record):
+        """Count a new connection to the database, listens to the connect event of the pools."""
+        with self.lock:
+            self.connects += 1
+
+    def record_invalidate(self, dbapi_connection, connection_record, exception):
+        """Count a connection found broken, listens to the invalidate event of the pools."""
+        with self.lock:
+            self.invalidations += 1
+
+    def snapshot(self, engine=None):
+        """
+        Get the counts, with the state of the pool of an engine
+        :param engine:
+        :return: dict
+        """
+        with self.lock:
+            metrics = {
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'timeouts': self.timeouts,
+                'slow_checkouts': self.slow_checkouts,
+                'wait_seconds': round(self.wait_seconds, 6),
+                'max_wait_seconds': round(self.max_wait_seconds, 6)
+            }
+        if engine is not None and isinstance(engine.pool, QueuePool):
+            metrics['size'] = engine.pool.size()
+            metrics['checked_out'] = engine.pool.checkedout()
+            metrics['overflow'] = engine.pool.overflow()
+        return metrics
+
+
+# the metrics of the pools of this process
+pool_metrics = PoolMetrics()
+
+
+class MeteredQueuePool(QueuePool):
+    """
+    Queue pool recording how long each checkout waited for a connection, and exporting its state on /metrics
+    Its metrics are labelled with the bind of its engine, default, replica or shard_<n>, set by PooledSQLAlchemy
+    """
+
+    bind_key = 'default'
+
+    def _do_get(self):
+        started = time.time()
+        try:
+            connection = super(MeteredQueuePool, self)._do_get()
+        except exc.TimeoutError:
+            waited = time.time() - started
+            pool_metrics.record_timeout(waited)
+            POOL_TIMEOUTS.labels(self.bind_key).inc()
+            POOL_WAIT.labels(self.bind_key).observe(waited)
+            raise
+        waited = time.time() - started
+        pool_metrics.record_checkout(waited)
+        POOL_CHECKOUTS.labels(self.bind_key).inc()
+        POOL_WAIT.labels(self.bind_key).observe(waited)
+        self.export_state()
+        return connection
+
+    def _do_return_conn(self, conn):
+        super(MeteredQueuePool, self)._do_return_conn(conn)
+        self.export_state()
+
+    def recreate(self):
+        pool = super(MeteredQueuePool, self).recreate()
+        pool.bind_key = self.bind_key
+        return pool
+
+    def export_state(self):
+        """Set the gauges of the connections in use and of the overflow to the current state of the pool."""
+        POOL_CHECKED_OUT.labels(self.bind_key).set(self.checkedout())
+        POOL_OVERFLOW.labels(self.bind_key).set(max(self.overflow(), 0))
+
+
+def ping_connection(dbapi_connection, connection_record, connection_proxy):
+    """
+    Check that a connection taken from the pool still works, listens to the checkout event of the pools
+    A connection closed by the database, for instance after its idle timeout, is replaced by a new one by the pool
+    instead of failing the request
+    :param dbapi_connection:
+    :param connection_record:
+    :param connection_proxy:
+    :return:
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute('SELECT 1')
+    except Exception:
+        raise exc.DisconnectionError()
+    finally:
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+
+class PooledSQLAlchemy(SQLAlchemy):
+    """
+    SQLAlchemy extension taking the settings of the connection pool from the config of the app
+    SQLALCHEMY_POOL_SIZE, SQLALCHEMY_MAX_OVERFLOW, SQLALCHEMY_POOL_TIMEOUT and SQLALCHEMY_POOL_RECYCLE are read by
+    Flask-SQLAlchemy itself, SQLALCHEMY_POOL_CLASS chooses between a queue pool and no pool at all, for when a
+    pooler like PgBouncer sits in front of the database, and SQLALCHEMY_POOL_PRE_PING checks connections on checkout
+    Its sessions can read from a replica, see app.replica
+    """
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def get_engine(self, app=None, bind=None):
+        engine = super(PooledSQLAlchemy, self).get_engine(app, bind)
+        # the primary, the replica and the shards usually have the same database name, their bind tells them apart
+        if isinstance(engine.pool, MeteredQueuePool):
+            engine.pool.bind_key = bind or 'default'
+        return engine
+
+    def apply_driver_hacks(self, app, info, options):
+        super(PooledSQLAlchemy, self).apply_driver_hacks(app, info, options)
+
+        if app.config.get('SQLALCHEMY_POOL_CLASS', 'queue') == 'null':
+            options['poolclass'] = NullPool
+            # these only make sense for a pool keeping connections
+            for key in ('pool_size', 'max_overflow', 'pool_timeout'):
+                options.pop(key, None)
+        else:
+            options.setdefault('poolclass', MeteredQueuePool)
+
+        events = [(pool_metrics.record_connect, 'connect'), (pool_metrics.record_invalidate, 'invalidate')]
+        if app.config.get('SQLALCHEMY_POOL_PRE_PING'):
+            events.append((ping_connection, 'checkout'))
+        options['pool_events'] = events
@@ -0,0 +1,157 @@
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# defaults of SLOW_QUERY_SECONDS and N_PLUS_ONE_THRESHOLD, for the statements run outside of an app
+SLOW_QUERY_SECONDS = 0.5
+N_PLUS_ONE_THRESHOLD = 5
+
+# files whose frames are skipped when looking for the code which ran a statement
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SKIPPED_FILES = (os.path.abspath(__file__), os.path.join(ROOT_DIR, 'app', 'metrics.py'))
+
+# literals which differ between two runs of the same statement
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+# placeholders of the values bound by psycopg2, as %(name)s or %s
+PYFORMAT_PLACEHOLDER = re.compile(r'%\(\w+\)s|%s')
+PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+WHITESPACE = re.compile(r'\s+')
+
+logger = logging.getLogger(__name__)
+
+# lists of statements of the assert_max_queries blocks running in each thread
+counting = threading.local()
+
+
+def statement_shape(statement):
+    """
+    Get the shape of a statement, which is the same for every run of it whatever the values it is run with
+    The literals and the placeholders of the bound values are replaced with ?, and lists of them with a single one,
+    so that IN lists of any length have the same shape. The values themselves are not compared.
+    :param statement:
+    :return: string
+    """
+    shape = STRING_LITERAL.sub('?', statement)
+    shape = PYFORMAT_PLACEHOLDER.sub('?', shape)
+    shape = NUMBER_LITERAL.sub('?', shape)
+    shape = PLACEHOLDER_LIST.sub('(?)', shape)
+    return WHITESPACE.sub(' ', shape).strip()
+
+
+def call_site():
+    """
+    Find the code of this project which ran the current statement, skipping the frames of the libraries
+    :return: string as path:line in function, or None
+    """
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame[0])
+        if filename.startswith(ROOT_DIR + os.sep) and filename not in SKIPPED_FILES \
+                and 'site-packages' not in filename:
+            return '{}:{} in {}'.format(os.path.relpath(filename, ROOT_DIR), frame[1], frame[2])
+    return None
+
+
+def setting(name, default):
+    """
+    Read a setting of the current app, or its default outside of an app
+    :param name:
+    :param default:
+    :return:
+    """
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def inspect_statement(conn, cursor, statement, parameters, context, executemany):
+    """Log the slow statements, and count the statements of the request and the assert_max_queries blocks."""
+    for statements in getattr(counting, 'blocks', ()):
+        statements.append(statement)
+
+    started = conn.info.get('statement_started')
+    duration = time.time() - started if started is not None else 0
+    if duration >= setting('SLOW_QUERY_SECONDS', SLOW_QUERY_SECONDS):
+        logger.warning('Slow query (%.3f seconds) at %s: %s', duration, call_site(), WHITESPACE.sub(' ', statement))
+
+    if has_request_context() and 'query_shapes' in g:
+        shape = statement_shape(statement)
+        if shape in g.query_shapes:
+            g.query_shapes[shape][0] += 1
+        else:
+            g.query_shapes[shape] = [1, call_site()]
+
+
+def report_repeated_queries(endpoint, query_shapes, threshold):
+    """
+    Log the statements a request ran over and over, which usually come from loading a relationship in a loop
+    :param endpoint: name of the view serving the request
+    :param query_shapes: dict of statement shape to its count and the call site of its first run
+    :param threshold: number of runs from which a statement is reported
+    :return: list of the reported shapes
+    """
+    repeated = [shape for shape, (count, site) in query_shapes.items() if count >= threshold]
+    for shape in repeated:
+        count, site = query_shapes[shape]
+        logger.warning('Possible N+1 queries in %s: the same statement ran %s times, first at %s: %s',
+                       endpoint, count, site, shape)
+    return repeated
+
+
+def init_query_inspector(app):
+    """
+    Log the statements of an app slower than SLOW_QUERY_SECONDS, and those run N_PLUS_ONE_THRESHOLD times or more
+    by the same request
+    :param app:
+    :return:
+    """
+    @app.before_request
+    def start_inspecting():
+        g.query_shapes = {}
+
+    @app.after_request
+    def report_queries(response):
+        if 'query_shapes' in g:
+            report_repeated_queries(
+                request.endpoint or 'unmatched', g.query_shapes,
+                app.config.get('N_PLUS_ONE_THRESHOLD', N_PLUS_ONE_THRESHOLD))
+        return response
+
+
+@contextmanager
+def count_queries():
+    """
+    Collect the statements run in the current thread by the block, on any database
+    :return: list of the statements run, growing as the block runs
+    """
+    statements = []
+    if not hasattr(counting, 'blocks'):
+        counting.blocks = []
+    counting.blocks.append(statements)
+    try:
+        yield statements
+    finally:
+        counting.blocks.remove(statements)
+
+
+@contextmanager
+def assert_max_queries(n):
+    """
+    Fail if the block runs more than n statements, on any database, including those of the requests made through
+    the test client in the block
+    :param n: maximum number of statements
+    :return: list of the statements run, growing as the block runs
+    """
+    with count_queries() as statements:
+        yield statements
+    if len(statements) > n:
+        raise AssertionError('{} statements were run, expected at most {}:\n{}'.format(
+            len(statements), n, '\n'.join(WHITESPACE.sub(' ', statement) for statement in statements)))
@@ -0,0 +1,109 @@
+import threading
+import time
+from flask import g, request
+from flask_sqlalchemy import SignallingSession, get_state
+from sqlalchemy.sql.expression import UpdateBase
+from app.sharding import current_shard, shard_engine, touches_only_users
+
+# key of the read replica in SQLALCHEMY_BINDS
+REPLICA_BIND = 'replica'
+
+# methods of the requests that only read, and can be served by the replica
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RecentWrites(object):
+    """
+    Remembers when each user last wrote, so that their reads go to the primary until the replica has their writes
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.written_at = {}
+
+    def record(self, user_id):
+        """
+        Record that a user just wrote
+        :param user_id:
+        :return:
+        """
+        now = time.time()
+        with self.lock:
+            self.written_at[user_id] = now
+            # forget the users who didn't write in a while, now and then
+            if len(self.written_at) > 10000:
+                self.written_at = {user: at for user, at in self.written_at.items() if now - at < 60}
+
+    def wrote_within(self, user_id, seconds):
+        """
+        Check if a user wrote in the last seconds
+        :param user_id:
+        :param seconds:
+        :return: boolean
+        """
+        with self.lock:
+            written_at = self.written_at.get(user_id)
+        return written_at is not None and time.time() - written_at < seconds
+
+
+# the writes of the users seen by this process, either served by it or notified by the database
+recent_writes = RecentWrites()
+
+
+class RoutingSession(SignallingSession):
+    """
+    Session sending the queries on the bucketlists and items to the shard of the user of the request, and reading
+    from the replica when the request was routed to it, everything else goes to the default database
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        shard = current_shard()
+        if shard is not None and not touches_only_users(mapper, clause):
+            return shard_engine(shard, self.app)
+        if self.info.get('read_replica') and not self._flushing and not isinstance(clause, UpdateBase):
+            return get_state(self.app).db.get_engine(self.app, bind=REPLICA_BIND)
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+def request_user_id():
+    """
+    Get the id of the user of the request from its token, if it has a valid one
+    :return: the user id or None
+    """
+    from app.models import User
+
+    if 'user_id' not in g:
+        auth_strings = request.headers.get('Authorization', '').split(" ")
+        user_id = User.decode_token(auth_strings[1]) if len(auth_strings) == 2 and auth_strings[1] else None
+        g.user_id = None if isinstance(user_id, str) else user_id
+    return g.user_id
+
+
+def init_replica_routing(app, db):
+    """
+    Send the reads of an app to the replica in SQLALCHEMY_BINDS, if there is one
+    A user who wrote in the last READ_YOUR_WRITES_SECONDS reads from the primary, so that they see what they wrote.
+    The other workers learn about the writes from the notifications of the database to the event streams.
+    :param app:
+    :param db:
+    :return:
+    """
+    if not (app.config.get('SQLALCHEMY_BINDS') or {}).get(REPLICA_BIND):
+        return
+
+    @app.before_request
+    def route_reads():
+        from app.change_events import change_listener
+
+        if app.config.get('CHANGE_EVENTS_LISTEN', True):
+            change_listener.start_all(app)
+        user_id = request_user_id()
+        if request.method in READ_METHODS and not (
+                user_id is not None and recent_writes.wrote_within(user_id, app.config['READ_YOUR_WRITES_SECONDS'])):
+            db.session.info['read_replica'] = True
+
+    @app.after_request
+    def record_writes(response):
+        if request.method not in READ_METHODS and g.get('user_id') is not None:
+            recent_writes.record(g.user_id)
+        return response
@@ -0,0 +1,382 @@
+import re
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy import get_state
+from sqlalchemy import and_, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+# the default database keeps every user, and the bucketlists of the users who are not on another shard
+DEFAULT_SHARD = 'default'
+
+# shards are the binds named shard_<n>, n being the position of the shard among the shards, which never changes
+SHARD_NAME = re.compile(r'^shard_(\d+)$')
+
+# the ids of the bucketlists, items and tombstones of a shard are the ones equal to its position modulo the stride,
+# so that they are unique across the shards and the rows of a user keep their ids when moved to another shard
+SHARD_ID_STRIDE = 64
+
+# tables whose rows live on the shard of their user
+SHARDED_TABLES = ('bucketlists', 'bucketlist_items', 'tombstones')
+
+# seconds the shard of a user is remembered by a worker before it is read again from the default database
+SHARD_CACHE_SECONDS = 30
+
+
+def shard_names(app=None):
+    """
+    Get the names of the shards of an app
+    :param app:
+    :return: list of names, the default shard first
+    """
+    app = app or current_app
+    binds = app.config.get('SQLALCHEMY_BINDS') or {}
+    return [DEFAULT_SHARD] + sorted((name for name in binds if SHARD_NAME.match(name)), key=shard_index)
+
+
+def shard_index(name):
+    """
+    Get the position of a shard, 0 for the default shard
+    :param name:
+    :return: int
+    """
+    if name == DEFAULT_SHARD:
+        return 0
+    match = SHARD_NAME.match(name)
+    if not match or not 0 < int(match.group(1)) < SHARD_ID_STRIDE:
+        raise ValueError('Shards are named shard_1 to shard_{}, not {}.'.format(SHARD_ID_STRIDE - 1, name))
+    return int(match.group(1))
+
+
+def shard_engine(name, app=None):
+    """
+    Get the engine of a shard
+    :param name:
+    :param app:
+    :return: engine
+    """
+    app = app or current_app._get_current_object()
+    db = get_state(app).db
+    return db.get_engine(app, bind=None if name == DEFAULT_SHARD else name)
+
+
+def is_sharded(app=None):
+    """Check if the bucketlists of an app are spread over more than the default database."""
+    return len(shard_names(app)) > 1
+
+
+def new_user_shard(email):
+    """
+    Choose the shard of a user who registers
+    :param email:
+    :return: name of the shard, None for the default shard
+    """
+    if not has_app_context() or not is_sharded():
+        return None
+    names = shard_names()
+    name = names[zlib.crc32(email.lower().encode('utf-8')) % len(names)]
+    return None if name == DEFAULT_SHARD else name
+
+
+def current_shard():
+    """
+    Get the shard the queries of the current request go to
+    :return: name of the shard, None for the default shard
+    """
+    if not has_app_context():
+        return None
+    shard = g.get('shard')
+    return None if shard == DEFAULT_SHARD else shard
+
+
+@contextmanager
+def use_shard(name):
+    """
+    Send the queries on the bucketlists and items to a shard, within an app context
+    :param name:
+    :return:
+    """
+    previous = g.get('shard')
+    g.shard = name
+    try:
+        yield
+    finally:
+        g.shard = previous
+
+
+def touches_only_users(mapper, clause):
+    """
+    Check if a query is on the users, which are all in the default database
+    :param mapper:
+    :param clause:
+    :return: boolean
+    """
+    if mapper is not None:
+        return mapper.mapped_table.name == 'users'
+    table = getattr(clause, 'table', None)
+    if table is not None:
+        return getattr(table, 'name', None) == 'users'
+    froms = getattr(clause, 'froms', None)
+    return bool(froms) and all(getattr(from_, 'name', None) == 'users' for from_ in froms)
+
+
+class ShardDirectory(object):
+    """
+    Remembers the shard of each user for a while, to avoid reading it from the default database on every request
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.shards = {}
+
+    def lookup(self, user_id):
+        """
+        Get the shard of a user
+        :param user_id:
+        :return: name of the shard
+        """
+        from app.models import User
+
+        now = time.time()
+        with self.lock:
+            cached = self.shards.get(user_id)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        # read from the primary, a replica lagging behind a move would send the user back to their old shard
+        shard = shard_engine(DEFAULT_SHARD).execute(
+            select([User.shard]).where(User.id == user_id)).scalar() or DEFAULT_SHARD
+        with self.lock:
+            if len(self.shards) > 10000:
+                self.shards = {user: value for user, value in self.shards.items() if value[1] > now}
+            self.shards[user_id] = (shard, now + SHARD_CACHE_SECONDS)
+        return shard
+
+    def forget(self, user_id):
+        """Read the shard of a user again on their next request."""
+        with self.lock:
+            self.shards.pop(user_id, None)
+
+
+# the shards of the users seen by this process
+shard_directory = ShardDirectory()
+
+
+def init_sharding(app, db):
+    """
+    Send the queries of each request on the bucketlists and items to the shard of its user
+    :param app:
+    :param db:
+    :return:
+    """
+    if not is_sharded(app):
+        return
+    # fail on start rather than on the first request when a shard is misnamed
+    for name in shard_names(app):
+        shard_index(name)
+
+    @app.before_request
+    def route_to_shard():
+        from app.replica import request_user_id
+
+        user_id = request_user_id()
+        g.shard = shard_directory.lookup(user_id) if user_id is not None else DEFAULT_SHARD
+
+
+def copy_user_to_shard(user):
+    """
+    Copy a user to their shard, where the bucketlists reference them
+    :param user:
+    :return:
+    """
+    from app.models import User
+
+    if not user.shard:
+        return
+    with shard_engine(user.shard).begin() as connection:
+        connection.execute(insert(User.__table__).values(
+            id=user.id, email=user.email, password=user.password, shard=user.shard).on_conflict_do_nothing())
+
+
+def init_shards():
+    """
+    Create the tables of every shard and make the ids of their bucketlists, items and tombstones unique across them
+    The sequences of the shards continue from the largest id of all of them, each shard taking every
+    SHARD_ID_STRIDE-th id. It can be run again when adding a shard.
+    :return: the name of each shard with the next id of each table
+    """
+    from app.models import install_triggers
+    db = get_state(current_app).db
+
+    names = shard_names()
+    for name in names:
+        db.Model.metadata.create_all(bind=shard_engine(name))
+        with use_shard(name):
+            install_triggers()
+            db.session.commit()
+
+    report = {}
+    for table in SHARDED_TABLES:
+        largest = max(shard_engine(name).execute(text('SELECT COALESCE(MAX(id), 0) FROM {}'.format(table))).scalar()
+                      for name in names)
+        base = (largest // SHARD_ID_STRIDE + 1) * SHARD_ID_STRIDE
+        for name in names:
+            start = base + shard_index(name)
+            with shard_engine(name).begin() as connection:
+                connection.execute(text("ALTER SEQUENCE {}_id_seq INCREMENT BY {} RESTART WITH {}".format(
+                    table, SHARD_ID_STRIDE, start)))
+            report.setdefault(name, {})[table] = start
+    return report
+
+
+def copy_user_rows(user_id, source, target):
+    """
+    Copy the bucketlists and items of a user from a shard to another, keeping their ids
+    Rows already copied are updated. Rows of another user with the same ids, which only a misconfigured shard can
+    hold, are never overwritten: the copy is refused. The item counts are left to the triggers of the target. The
+    positions in the feed of changes name the shard, so the clients of the feed start again from the beginning on the
+    target.
+    :param user_id:
+    :param source: engine of the shard the user is on
+    :param target: engine of the shard the user moves to
+    :return: number of bucketlists and of items copied
+    """
+    from app.models import Bucketlist, BucketlistItem
+
+    bucketlists = Bucketlist.__table__
+    items = BucketlistItem.__table__
+    with source.connect() as connection:
+        bucketlist_rows = connection.execute(
+            select([bucketlists.c.id, bucketlists.c.name, bucketlists.c.date_created, bucketlists.c.date_modified,
+                    bucketlists.c.created_by]).where(bucketlists.c.created_by == user_id)).fetchall()
+        item_rows = connection.execute(
+            select([items.c.id, items.c.name, items.c.date_created, items.c.date_modified, items.c.done,
+                    items.c.belongs_to]).where(
+                items.c.belongs_to.in_(select([bucketlists.c.id]).where(bucketlists.c.created_by == user_id)))
+        ).fetchall()
+
+    with target.begin() as connection:
+        if bucketlist_rows:
+            taken = connection.execute(select([bucketlists.c.id]).where(and_(
+                bucketlists.c.id.in_([row.id for row in bucketlist_rows]),
+                bucketlists.c.created_by != user_id))).fetchall()
+            if taken:
+                raise ValueError('The bucketlists {} of the target shard belong to another user.'.format(
+                    ', '.join(str(row.id) for row in taken)))
+            statement = insert(bucketlists)
+            # the condition keeps the rows of other users even if one was written since the check
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=[bucketlists.c.id],
+                set_={'name': statement.excluded.name, 'date_modified': statement.excluded.date_modified},
+                where=bucketlists.c.created_by == statement.excluded.created_by),
+                [dict(row) for row in bucketlist_rows])
+        if item_rows:
+            taken = connection.execute(select([items.c.id]).where(and_(
+                items.c.id.in_([row.id for row in item_rows]),
+                items.c.belongs_to.notin_([row.id for row in bucketlist_rows])))).fetchall()
+            if taken:
+                raise ValueError('The items {} of the target shard belong to another user.'.format(
+                    ', '.join(str(row.id) for row in taken)))
+            statement = insert(items)
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=[items.c.id],
+                set_={'name': statement.excluded.name, 'date_modified': statement.excluded.date_modified,
+                      'done': statement.excluded.done},
+                where=items.c.belongs_to == statement.excluded.belongs_to),
+                [dict(row) for row in item_rows])
+    return len(bucketlist_rows), len(item_rows)
+
+
+def move_user(user, target, wait=SHARD_CACHE_SECONDS):
+    """
+    Move the bucketlists and items of a user to another shard
+    The rows are copied, the user is pointed to the new shard, then once every worker has forgotten the old shard
+    of the user the rows written there meanwhile are copied again and the old rows are deleted. Deletions made on the
+    old shard while waiting are lost, so users are best moved while they are idle.
+    :param user:
+    :param target: name of the shard
+    :param wait: seconds to wait for the workers to forget the old shard
+    :return: report of the move
+    """
+    from app.models import User, Bucketlist, Tombstone
+    db = get_state(current_app).db
+
+    source = user.shard or DEFAULT_SHARD
+    shard_index(target)
+    if target not in shard_names():
+        raise ValueError('There is no shard {}.'.format(target))
+    report = {'user': user.email, 'from': source, 'to': target, 'bucketlists': 0, 'items': 0}
+    if source == target:
+        return report
+
+    source_engine, target_engine = shard_engine(source), shard_engine(target)
+    if target != DEFAULT_SHARD:
+        with target_engine.begin() as connection:
+            connection.execute(insert(User.__table__).values(
+                id=user.id, email=user.email, password=user.password, shard=target).on_conflict_do_nothing())
+    copy_user_rows(user.id, source_engine, target_engine)
+
+    db.session.execute(User.__table__.update().where(User.id == user.id).values(
+        shard=None if target == DEFAULT_SHARD else target))
+    db.session.commit()
+    user.shard = None if target == DEFAULT_SHARD else target
+    shard_directory.forget(user.id)
+
+    time.sleep(wait)
+    report['bucketlists'], report['items'] = copy_user_rows(user.id, source_engine, target_engine)
+
+    with source_engine.begin() as connection:
+        # the items go with their bucketlists through ON DELETE CASCADE
+        connection.execute(Bucketlist.__table__.delete().where(Bucketlist.created_by == user.id))
+        connection.execute(Tombstone.__table__.delete().where(Tombstone.user_id == user.id))
+        if source != DEFAULT_SHARD:
+            connection.execute(User.__table__.delete().where(User.id == user.id))
+    return report
+
+
+def plan_rebalance(loads):
+    """
+    Plan the moves of users that even out the number of rows of the shards
+    The smallest users of the most loaded shard are moved to the least loaded one, as long as it brings them closer.
+    :param loads: dict of shard name to dict of user id to number of rows
+    :return: list of (user_id, source, target, rows)
+    """
+    loads = {name: dict(users) for name, users in loads.items()}
+    moves = []
+    while len(loads) > 1:
+        totals = {name: sum(users.values()) for name, users in loads.items()}
+        source = max(totals, key=lambda name: totals[name])
+        target = min(totals, key=lambda name: totals[name])
+        gap = totals[source] - totals[target]
+        candidates = sorted((rows, user_id) for user_id, rows in loads[source].items() if 0 < rows < gap)
+        if not candidates:
+            break
+        # the largest user that doesn't overshoot the middle, or else the smallest one
+        fitting = [candidate for candidate in candidates if candidate[0] <= gap / 2]
+        rows, user_id = fitting[-1] if fitting else candidates[0]
+        moves.append((user_id, source, target, rows))
+        loads[target][user_id] = loads[source].pop(user_id)
+    return moves
+
+
+def shard_loads():
+    """
+    Count the bucketlists and items of each user on each shard
+    :return: dict of shard name to dict of user id to number of rows
+    """
+    from app.models import User
+    db = get_state(current_app).db
+
+    loads = {name: {} for name in shard_names()}
+    for user_id, shard in db.session.query(User.id, User.shard).all():
+        loads.setdefault(shard or DEFAULT_SHARD, {})[user_id] = 0
+    for name in loads:
+        rows = shard_engine(name).execute(text(
+            "SELECT bucketlists.created_by, COUNT(DISTINCT bucketlists.id) + COUNT(bucketlist_items.id) "
+            "FROM bucketlists LEFT JOIN bucketlist_items ON bucketlist_items.belongs_to = bucketlists.id "
+            "GROUP BY bucketlists.created_by")).fetchall()
+        for user_id, count in rows:
+            if user_id in loads[name]:
+                loads[name][user_id] = count
+    return loads
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from flask import g, request
+from app.replica import request_user_id
+
+# keys of the bodies and query strings whose values are never recorded
+SENSITIVE_KEYS = ('password', 'token', 'access_token', 'secret', 'email')
+
+# content types of the bodies whose shape is recorded, the others are only counted in bytes
+SHAPED_CONTENT_TYPES = ('application/json', 'application/x-www-form-urlencoded', 'multipart/form-data')
+
+logger = logging.getLogger(__name__)
+
+
+def value_shape(value, key=None):
+    """
+    Describe a value of a body or a query string without its content
+    Strings become their length, lists their length and the shape of their first element, numbers and booleans
+    their type, and the values of the keys in SENSITIVE_KEYS are only said to be redacted
+    :param value:
+    :param key: key of the value in its object
+    :return: shape, which is json
+    """
+    if key is not None and key.lower() in SENSITIVE_KEYS:
+        return 'redacted'
+    if isinstance(value, dict):
+        return {str(item_key): value_shape(item, str(item_key)) for item_key, item in value.items()}
+    if isinstance(value, list):
+        return {'list': len(value), 'item': value_shape(value[0]) if value else None}
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, (int, float)):
+        return 'int' if isinstance(value, int) else 'float'
+    return 'str:{}'.format(len(str(value)))
+
+
+def query_shape(args):
+    """
+    Describe a query string, keeping the numbers like pages and limits, which say how deep clients read
+    :param args: query string as a MultiDict
+    :return: dict
+    """
+    query = {}
+    for key, value in args.items():
+        if key.lower() in SENSITIVE_KEYS:
+            query[key] = 'redacted'
+        elif value.isdigit():
+            query[key] = int(value)
+        else:
+            query[key] = value_shape(value)
+    return query
+
+
+def body_shape():
+    """
+    Describe the body of the current request
+    The body is only parsed when it is json or a form, for the others like the ndjson of the imports, which may be
+    streamed by the view, only its size is known
+    :return: shape, or None without a body
+    """
+    if not request.content_length:
+        return None
+    if request.mimetype not in SHAPED_CONTENT_TYPES:
+        return {'bytes': request.content_length}
+    data = request.data
+    if hasattr(data, 'to_dict'):
+        data = data.to_dict()
+    return value_shape(data)
+
+
+class TrafficRecorder(object):
+    """
+    Appends the requests of this process to a newline delimited json file
+    Each forked worker opens the file again, a {pid} in the path gives each worker its own file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+        self.pid = None
+
+    def record(self, entry):
+        """
+        Append a request
+        :param entry: dict
+        :return:
+        """
+        line = json.dumps(entry, sort_keys=True) + '\n'
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.file = open(self.path.format(pid=self.pid), 'a')
+            self.file.write(line)
+            self.file.flush()
+
+
+def init_traffic_capture(app):
+    """
+    Record the requests of an app to TRAFFIC_CAPTURE_PATH, when set, to replay them with benchmarks/replay.py
+    A share TRAFFIC_CAPTURE_SAMPLE of the requests is recorded with its route, query string, the shape of its body,
+    its status and duration. The tokens, passwords and emails are left out, and the users are only known by a hash.
+    :param app:
+    :return:
+    """
+    path = app.config.get('TRAFFIC_CAPTURE_PATH')
+    if not path:
+        return
+    recorder = TrafficRecorder(path)
+
+    @app.before_request
+    def start_capture():
+        if random.random() < app.config.get('TRAFFIC_CAPTURE_SAMPLE', 1):
+            g.capture_started = time.time()
+
+    @app.after_request
+    def capture_request(response):
+        if 'capture_started' not in g:
+            return response
+        try:
+            user_id = request_user_id()
+            recorder.record({
+                'time': round(g.capture_started, 6),
+                'duration_ms': round((time.time() - g.capture_started) * 1000, 3),
+                'method': request.method,
+                'route': request.url_rule.rule if request.url_rule is not None else None,
+                'path': request.path,
+                'query': query_shape(request.args),
+                'body': body_shape(),
+                'status': response.status_code,
+                'response_bytes': response.calculate_content_length(),
+                'user': hashlib.sha256('{}:{}'.format(app.config['SECRET'], user_id).encode()).hexdigest()[:12]
+                if user_id is not None else None,
+            })
+        except Exception:
+            # capturing must never fail a request
+            logger.exception('Could not capture the request')
+        return response
@@ -0,0 +1,162 @@
+"""
+Keep the reports of manage.py bench by git revision and compare two of them
+
+A report is saved as <revision>.json in the baseline directory. Comparing the report of a change with the one of the
+revision it is based on flags the routes which got slower, run more statements or send more bytes:
+
+    $ git checkout master && python manage.py bench --save
+    $ git checkout my-branch && python manage.py bench --save
+    $ python manage.py bench_compare --baseline master
+
+A route is slower when its median latency grew by more than the latency threshold and the samples of the two runs
+differ significantly by a one-sided Mann-Whitney U test, so that noise between two runs isn't flagged.
+"""
+import json
+import math
+import os
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# where the reports are kept, out of the repository
+BASELINE_DIR = os.getenv('BENCH_BASELINE_DIR', os.path.join(ROOT, '.benchmarks'))
+
+# default thresholds of a regression: relative growth of the median latency, with the significance level of the
+# test on the samples, statements added per request, and relative growth of the bytes of a response
+LATENCY_THRESHOLD = 0.10
+SIGNIFICANCE = 0.01
+QUERIES_THRESHOLD = 0
+BYTES_THRESHOLD = 0.05
+
+
+def git(*args):
+    """
+    Run a git command in the repository
+    :param args:
+    :return: its output, stripped
+    """
+    return subprocess.check_output(('git',) + args, cwd=ROOT).decode().strip()
+
+
+def resolve(revision):
+    """
+    Get the full hash of a revision, like HEAD, master or a short hash
+    :param revision:
+    :return: string
+    """
+    return git('rev-parse', '--verify', revision + '^{commit}')
+
+
+def current_revision():
+    """
+    Get the revision of the working tree, marked dirty when it has changes not committed
+    :return: string
+    """
+    revision = resolve('HEAD')
+    if git('status', '--porcelain', '--untracked-files=no'):
+        revision += '-dirty'
+    return revision
+
+
+def save(report, directory=BASELINE_DIR):
+    """
+    Save a report of manage.py bench under the revision of the working tree
+    :param report:
+    :param directory:
+    :return: path of the saved report
+    """
+    report = dict(report, revision=current_revision())
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    path = os.path.join(directory, report['revision'] + '.json')
+    with open(path, 'w') as report_file:
+        json.dump(report, report_file, indent=2, sort_keys=True)
+    return path
+
+
+def load(revision, directory=BASELINE_DIR):
+    """
+    Load the report saved for a revision, or from a file
+    :param revision: revision, like HEAD or master, or path of a report
+    :param directory:
+    :return: the report
+    """
+    if os.path.isfile(revision):
+        path = revision
+    else:
+        name = resolve(revision.replace('-dirty', '')) + ('-dirty' if revision.endswith('-dirty') else '')
+        path = os.path.join(directory, name + '.json')
+        if not os.path.isfile(path):
+            raise IOError('There is no benchmark saved for {}, run manage.py bench --save on it.'.format(revision))
+    with open(path) as report_file:
+        return json.load(report_file)
+
+
+def mann_whitney_u(baseline, current):
+    """
+    Test whether the current samples tend to be larger than the baseline ones, with a one-sided Mann-Whitney U test
+    The p-value comes from the normal approximation with the correction for ties, good from about 10 samples each
+    :param baseline: list of numbers
+    :param current: list of numbers
+    :return: the p-value, 1 when there aren't samples enough
+    """
+    n1, n2 = len(current), len(baseline)
+    if n1 < 2 or n2 < 2:
+        return 1.0
+    values = sorted([(value, 0) for value in current] + [(value, 1) for value in baseline])
+    # ranks with ties given their average rank
+    ranks = [0.0] * len(values)
+    ties = 0.0
+    start = 0
+    while start < len(values):
+        end = start
+        while end + 1 < len(values) and values[end + 1][0] == values[start][0]:
+            end += 1
+        for index in range(start, end + 1):
+            ranks[index] = (start + end) / 2.0 + 1
+        count = end - start + 1
+        ties += count ** 3 - count
+        start = end + 1
+    u = sum(rank for rank, (value, group) in zip(ranks, values) if group == 0) - n1 * (n1 + 1) / 2.0
+    n = n1 + n2
+    variance = n1 * n2 / 12.0 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2.0 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare(baseline, current, latency_threshold=LATENCY_THRESHOLD, significance=SIGNIFICANCE,
+            queries_threshold=QUERIES_THRESHOLD, bytes_threshold=BYTES_THRESHOLD):
+    """
+    Compare the routes of two reports of manage.py bench
+    :param baseline: report of the reference revision
+    :param current: report of the change
+    :param latency_threshold: relative growth of the median latency from which a route is slower
+    :param significance: p-value under which the latencies of the two runs differ
+    :param queries_threshold: statements added per request from which a route regressed
+    :param bytes_threshold: relative growth of the bytes of a response from which a route regressed
+    :return: dict of route to its changes, and the list of regressions as (route, metric, baseline, current)
+    """
+    changes = {}
+    regressions = []
+    for route in sorted(set(baseline['endpoints']) & set(current['endpoints'])):
+        before = baseline['endpoints'][route]
+        after = current['endpoints'][route]
+        p_value = mann_whitney_u(before.get('samples_ms', []), after.get('samples_ms', []))
+        changes[route] = {
+            'p50_ms': (before['p50_ms'], after['p50_ms']),
+            'p_value': round(p_value, 6),
+            'queries_per_request': (before['queries_per_request'], after['queries_per_request']),
+            'bytes_per_response': (before['bytes_per_response'], after['bytes_per_response']),
+        }
+        if before['p50_ms'] and after['p50_ms'] and after['p50_ms'] > before['p50_ms'] * (1 + latency_threshold) \
+                and p_value < significance:
+            regressions.append((route, 'p50_ms', before['p50_ms'], after['p50_ms']))
+        if after['queries_per_request'] > before['queries_per_request'] + queries_threshold:
+            regressions.append(
+                (route, 'queries_per_request', before['queries_per_request'], after['queries_per_request']))
+        if after['bytes_per_response'] > before['bytes_per_response'] * (1 + bytes_threshold):
+            regressions.append(
+                (route, 'bytes_per_response', before['bytes_per_response'], after['bytes_per_response']))
+    return changes, regressions
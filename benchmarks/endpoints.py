@@ -0,0 +1,277 @@
+"""
+Benchmark every route of the API in process, through the Flask test client, on a seeded dataset
+
+The tables of the database of the configuration are dropped and created again, then users with bucketlists and items
+are created and each route is called a number of times by the first user. For each route the report gives the
+latency percentiles, the throughput, the SQL statements and the bytes of a response, and the memory allocated while
+serving it, measured on a few more calls as tracing the allocations slows the requests down. Run it with:
+
+    $ python manage.py bench --config testing --users 3 --bucketlists 50 --items 10 --iterations 100
+"""
+import json
+import math
+import time
+import tracemalloc
+from app import create_app, db
+from app.models import User, Bucketlist, BucketlistItem
+from app.query_inspector import count_queries
+from app.sharding import copy_user_to_shard, init_shards, is_sharded, use_shard
+from instance.config import Config
+
+# password of the users of the benchmark
+PASSWORD = 'benchmark1234'
+
+PERCENTILES = (50, 95, 99)
+
+# calls of each route made with the allocations traced
+ALLOCATION_SAMPLES = 5
+
+# configurations whose database is meant to be thrown away, the others are only benchmarked when asked explicitly
+DISPOSABLE_CONFIGS = ('testing', 'development')
+
+
+def percentile(values, percent):
+    """
+    Get a percentile of values, by the nearest rank
+    :param values: sorted values
+    :param percent:
+    :return: the value, None when there are no values
+    """
+    if not values:
+        return None
+    return values[max(0, min(len(values) - 1, int(math.ceil(percent / 100.0 * len(values))) - 1))]
+
+
+class EndpointBench(object):
+    """
+    Seeds a dataset and measures the routes of the API against it
+    """
+
+    def __init__(self, app, users=3, bucketlists=50, items=10):
+        self.app = app
+        self.client = app.test_client()
+        # the routes on a bucketlist and on an item need the first user to have one of each
+        self.dataset = {'users': max(1, users), 'bucketlists': max(1, bucketlists), 'items': max(1, items)}
+        self.headers = {}
+        self.bucketlist_ids = []
+        self.item_ids = []
+        self.import_body = b''
+
+    def seed(self):
+        """
+        Create the tables again and fill them with the dataset, then log in the first user
+        :return:
+        """
+        with self.app.app_context():
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+            if is_sharded():
+                init_shards()
+            for number in range(self.dataset['users']):
+                user = User('bench-{}@example.com'.format(number), PASSWORD)
+                user.save()
+                copy_user_to_shard(user)
+                with use_shard(user.shard):
+                    bucketlists = Bucketlist.create_many(
+                        ['Bucketlist {}'.format(index) for index in range(self.dataset['bucketlists'])], user.id)
+                    for bucketlist in bucketlists:
+                        items = BucketlistItem.create_many(
+                            ['Item {}'.format(index) for index in range(self.dataset['items'])], bucketlist.id)
+                        if number == 0 and not self.item_ids:
+                            self.item_ids = [item.id for item in items]
+                    if number == 0:
+                        self.bucketlist_ids = [bucketlist.id for bucketlist in bucketlists]
+            db.session.remove()
+
+        result = self.client.post('/api/v1/auth/login', data={'email': 'bench-0@example.com', 'password': PASSWORD})
+        self.headers = {'Authorization': 'Bearer ' + json.loads(result.data.decode())['access_token']}
+        self.import_body = self.client.get('/api/v1/export', headers=self.headers).data
+
+    def create_bucketlist(self, name):
+        """
+        Create a bucketlist for the first user, out of the measures
+        :param name:
+        :return: its id
+        """
+        result = self.client.post('/api/v1/bucketlists/', headers=self.headers, data={'name': name})
+        return json.loads(result.data.decode())['id']
+
+    def create_item(self, bucketlist_id, name):
+        """
+        Create an item in a bucketlist, out of the measures
+        :param bucketlist_id:
+        :param name:
+        :return: its id
+        """
+        result = self.client.post('/api/v1/bucketlists/{}/items/'.format(bucketlist_id), headers=self.headers,
+                                  data={'name': name})
+        return json.loads(result.data.decode())['id']
+
+    def cases(self):
+        """
+        The calls to measure, each with a function giving the path and the arguments of its n-th call
+        The functions may create what the call needs, like a bucketlist to delete
+        :return: list of (name, method, function)
+        """
+        first = self.bucketlist_ids[0]
+        item = self.item_ids[0]
+        last_page = max(1, int(math.ceil(len(self.bucketlist_ids) / float(Config.DEFAULT_PAGINATION_LIMIT))))
+        return [
+            ('POST /auth/register', 'POST', lambda n: (
+                '/api/v1/auth/register', {'data': {'email': 'bench-new-{}@example.com'.format(n),
+                                                   'password': PASSWORD}})),
+            ('POST /auth/login', 'POST', lambda n: (
+                '/api/v1/auth/login', {'data': {'email': 'bench-0@example.com', 'password': PASSWORD}})),
+            ('GET /bucketlists', 'GET', lambda n: ('/api/v1/bucketlists/', {})),
+            ('GET /bucketlists?q', 'GET', lambda n: ('/api/v1/bucketlists/?q=list 1', {})),
+            ('GET /bucketlists?page', 'GET', lambda n: ('/api/v1/bucketlists/?page={}'.format(last_page), {})),
+            ('POST /bucketlists', 'POST', lambda n: (
+                '/api/v1/bucketlists/', {'data': {'name': 'Created {}'.format(n)}})),
+            ('POST /bucketlists/batch', 'POST', lambda n: (
+                '/api/v1/bucketlists/batch', {'data': json.dumps({'names': [
+                    'Batch {} {}'.format(n, index) for index in range(10)]}), 'content_type': 'application/json'})),
+            ('DELETE /bucketlists/batch', 'DELETE', lambda n: (
+                '/api/v1/bucketlists/batch', {'data': json.dumps({'ids': [
+                    self.create_bucketlist('Batch deleted {} {}'.format(n, index)) for index in range(3)]}),
+                    'content_type': 'application/json'})),
+            ('GET /bucketlists/<id>', 'GET', lambda n: ('/api/v1/bucketlists/{}'.format(first), {})),
+            ('PUT /bucketlists/<id>', 'PUT', lambda n: (
+                '/api/v1/bucketlists/{}'.format(first), {'data': {'name': 'Renamed {}'.format(n)}})),
+            ('DELETE /bucketlists/<id>', 'DELETE', lambda n: (
+                '/api/v1/bucketlists/{}'.format(self.create_bucketlist('Deleted {}'.format(n))), {})),
+            ('GET /bucketlists/<id>/items', 'GET', lambda n: ('/api/v1/bucketlists/{}/items/'.format(first), {})),
+            ('POST /bucketlists/<id>/items', 'POST', lambda n: (
+                '/api/v1/bucketlists/{}/items/'.format(first), {'data': {'name': 'Created item {}'.format(n)}})),
+            ('POST /bucketlists/<id>/items/batch', 'POST', lambda n: (
+                '/api/v1/bucketlists/{}/items/batch'.format(first), {'data': json.dumps({'names': [
+                    'Batch item {} {}'.format(n, index) for index in range(10)]}),
+                    'content_type': 'application/json'})),
+            ('GET /bucketlists/<id>/items/<item_id>', 'GET', lambda n: (
+                '/api/v1/bucketlists/{}/items/{}'.format(first, item), {})),
+            ('PUT /bucketlists/<id>/items/<item_id>', 'PUT', lambda n: (
+                '/api/v1/bucketlists/{}/items/{}'.format(first, item), {'data': {
+                    'name': 'Renamed item {}'.format(n), 'done': 'true' if n % 2 else 'false'}})),
+            ('DELETE /bucketlists/<id>/items/<item_id>', 'DELETE', lambda n: (
+                '/api/v1/bucketlists/{}/items/{}'.format(first, self.create_item(first, 'Deleted item {}'.format(n))),
+                {})),
+            ('GET /items', 'GET', lambda n: ('/api/v1/items?q=Item 1', {})),
+            ('GET /bucketlists/changes', 'GET', lambda n: ('/api/v1/bucketlists/changes?since=0', {})),
+            ('GET /export', 'GET', lambda n: ('/api/v1/export', {})),
+            ('POST /import', 'POST', lambda n: (
+                '/api/v1/import', {'data': self.import_body, 'content_type': 'application/x-ndjson'})),
+        ]
+
+    def call(self, method, path, options):
+        """
+        Call a route as the first user
+        :param method:
+        :param path:
+        :param options: arguments of the test client
+        :return: response
+        """
+        headers = {} if path.startswith('/api/v1/auth/') else self.headers
+        return self.client.open(path, method=method, headers=headers, **options)
+
+    def measure(self, method, function, iterations):
+        """
+        Measure the calls to a route
+        :param method:
+        :param function: function giving the path and the arguments of the n-th call
+        :param iterations:
+        :return: report of the route
+        """
+        latencies = []
+        queries = []
+        sizes = []
+        errors = 0
+        for n in range(iterations):
+            path, options = function(n)
+            with count_queries() as statements:
+                started = time.time()
+                response = self.call(method, path, options)
+                # the body of a streamed response is produced as it is read
+                body = response.data
+                latencies.append(time.time() - started)
+            queries.append(len(statements))
+            sizes.append(len(body))
+            if response.status_code >= 400:
+                errors += 1
+
+        allocations = []
+        for n in range(iterations, iterations + ALLOCATION_SAMPLES):
+            path, options = function(n)
+            tracemalloc.start()
+            try:
+                self.call(method, path, options).data
+                allocations.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+
+        report = {
+            'requests': iterations,
+            'errors': errors,
+            'requests_per_second': round(iterations / sum(latencies), 1) if sum(latencies) else None,
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+            'queries_per_request': round(sum(queries) / float(len(queries)), 2) if queries else None,
+            'bytes_per_response': round(sum(sizes) / float(len(sizes)), 1) if sizes else None,
+            'allocated_bytes': int(sum(allocations) / len(allocations)) if allocations else None,
+        }
+        # the samples let two runs be compared, see benchmarks.baseline
+        report['samples_ms'] = [round(latency * 1000, 3) for latency in latencies]
+        latencies.sort()
+        for percent in PERCENTILES:
+            value = percentile(latencies, percent)
+            report['p{}_ms'.format(percent)] = round(value * 1000, 3) if value is not None else None
+        return report
+
+    def run(self, iterations=50, only=None):
+        """
+        Seed the dataset and measure every route
+        :param iterations: calls of each route
+        :param only: names of the routes to measure, all of them by default
+        :return: report
+        """
+        self.seed()
+        endpoints = {}
+        for name, method, function in self.cases():
+            if only and name not in only:
+                continue
+            endpoints[name] = self.measure(method, function, iterations)
+        return {
+            'dataset': self.dataset,
+            'iterations': iterations,
+            'endpoints': endpoints,
+        }
+
+
+def check_disposable(config_name, drop_tables=False):
+    """
+    Refuse to benchmark on a database which is not meant to be thrown away, unless told the tables may be dropped
+    :param config_name:
+    :param drop_tables:
+    :return:
+    """
+    if config_name not in DISPOSABLE_CONFIGS and not drop_tables:
+        raise ValueError('The benchmark drops the tables of the {} database, it only runs on the {} databases unless '
+                         'told it may drop them.'.format(config_name, ' and '.join(DISPOSABLE_CONFIGS)))
+
+
+def run_benchmark(config_name='testing', users=3, bucketlists=50, items=10, iterations=50, only=None,
+                  drop_tables=False):
+    """
+    Benchmark the routes on the database of a configuration, whose tables are dropped first
+    :param config_name:
+    :param users:
+    :param bucketlists: bucketlists of each user
+    :param items: items of each bucketlist
+    :param iterations: calls of each route
+    :param only: names of the routes to measure, all of them by default
+    :param drop_tables: whether the tables may be dropped on another database than those of DISPOSABLE_CONFIGS
+    :return: report
+    """
+    check_disposable(config_name, drop_tables)
+    app = create_app(config_name=config_name)
+    report = EndpointBench(app, users, bucketlists, items).run(iterations, only)
+    report['config'] = config_name
+    return report
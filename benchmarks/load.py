@@ -0,0 +1,285 @@
+"""
+Load the API served by gunicorn with a mix of calls from several client processes, for a range of worker counts
+and connection pool sizes
+
+For each combination gunicorn is started with gunicorn_config.py on the database of APP_SETTINGS, then each client
+process registers its own user and calls the API in a loop for a while, picking each call from the mix. The report
+gives the throughput and the latency percentiles of every kind of call, which shows for instance the bcrypt of the
+logins slowing down the other calls sharing the workers. Run from the root of the repository:
+
+    $ python benchmarks/load.py --workers 1,2,4 --pool-sizes 2,5 --clients 8 --duration 30 \\
+        --mix register=1,login=4,list=50,create=20,update=15,delete=10
+"""
+import argparse
+import bisect
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# calls of the default mix with their weights
+DEFAULT_MIX = 'register=1,login=4,list=50,create=20,update=15,delete=10'
+
+# bucketlists each client creates before being measured, so that there is something to list, update and delete
+CLIENT_BUCKETLISTS = 20
+
+PASSWORD = 'load1234'
+
+
+def percentile(values, percent):
+    """
+    Get a percentile of values, by the nearest rank
+    :param values: sorted values
+    :param percent:
+    :return: the value in milliseconds, None when there are no values
+    """
+    if not values:
+        return None
+    return round(values[max(0, min(len(values) - 1, int(math.ceil(percent / 100.0 * len(values))) - 1))] * 1000, 1)
+
+
+def parse_mix(mix):
+    """
+    Read a mix of calls like register=1,list=50
+    :param mix:
+    :return: list of (call, weight)
+    """
+    calls = []
+    for part in mix.split(','):
+        call, weight = part.split('=')
+        if call.strip() not in CALLS:
+            raise ValueError('Unknown call {}, the calls are {}.'.format(call, ', '.join(sorted(CALLS))))
+        calls.append((call.strip(), float(weight)))
+    return calls
+
+
+def start_server(workers, pool_size, worker_class, port, metrics_dir):
+    """
+    Start gunicorn and wait until it answers
+    :param workers:
+    :param pool_size: connections of the pool of each worker
+    :param worker_class:
+    :param port:
+    :param metrics_dir:
+    :return: the gunicorn process
+    """
+    # run_async.py sizes the pool of the gevent workers with ASYNC_POOL_SIZE, so both are set to the swept size
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), DB_POOL_SIZE=str(pool_size),
+               ASYNC_POOL_SIZE=str(pool_size), PORT=str(port), GUNICORN_WORKER_CLASS=worker_class,
+               METRICS_DIR=metrics_dir)
+    app = 'run_async:app' if worker_class == 'gevent' else 'run:app'
+    process = subprocess.Popen(['gunicorn', '-c', 'gunicorn_config.py', app], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            requests.get('http://127.0.0.1:{}/api/v1/bucketlists'.format(port), timeout=5)
+            return process
+        except requests.RequestException:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start with {} workers'.format(workers))
+
+
+class Client(object):
+    """
+    A user calling the API in a loop, on one connection
+    """
+
+    def __init__(self, base_url, email, rng):
+        self.base_url = base_url
+        self.email = email
+        self.rng = rng
+        self.session = requests.Session()
+        self.headers = {}
+        self.bucketlist_ids = []
+        self.created = 0
+        self.registered = 0
+
+    def request(self, method, path, **options):
+        """
+        Call the API
+        :param method:
+        :param path:
+        :param options: arguments of requests
+        :return: response
+        """
+        return self.session.request(method, self.base_url + path, timeout=30, **options)
+
+    def start(self):
+        """Register and log in the user, and give them a few bucketlists."""
+        self.request('POST', '/auth/register', data={'email': self.email, 'password': PASSWORD})
+        self.login()
+        for _ in range(CLIENT_BUCKETLISTS):
+            self.create()
+
+    def register(self):
+        """Register another user."""
+        self.registered += 1
+        return self.request('POST', '/auth/register', data={
+            'email': '{}.{}'.format(self.registered, self.email), 'password': PASSWORD})
+
+    def login(self):
+        """Log the user in, the calls after it use the new token."""
+        response = self.request('POST', '/auth/login', data={'email': self.email, 'password': PASSWORD})
+        if response.status_code == 200:
+            self.headers = {'Authorization': 'Bearer ' + response.json()['access_token']}
+        return response
+
+    def list(self):
+        """Get a page of the bucketlists of the user."""
+        pages = max(1, int(math.ceil(len(self.bucketlist_ids) / 20.0)))
+        return self.request('GET', '/bucketlists?page={}'.format(self.rng.randint(1, pages)), headers=self.headers)
+
+    def create(self):
+        """Create a bucketlist."""
+        self.created += 1
+        response = self.request('POST', '/bucketlists', headers=self.headers,
+                                data={'name': 'Load {}'.format(self.created)})
+        if response.status_code == 201:
+            self.bucketlist_ids.append(response.json()['id'])
+        return response
+
+    def update(self):
+        """Rename a bucketlist of the user."""
+        if not self.bucketlist_ids:
+            return self.create()
+        self.created += 1
+        return self.request('PUT', '/bucketlists/{}'.format(self.rng.choice(self.bucketlist_ids)),
+                            headers=self.headers, data={'name': 'Load {}'.format(self.created)})
+
+    def delete(self):
+        """Delete a bucketlist of the user."""
+        if not self.bucketlist_ids:
+            return self.create()
+        bucketlist_id = self.bucketlist_ids.pop(self.rng.randrange(len(self.bucketlist_ids)))
+        return self.request('DELETE', '/bucketlists/{}'.format(bucketlist_id), headers=self.headers)
+
+
+# calls of a mix, as methods of Client
+CALLS = {'register': Client.register, 'login': Client.login, 'list': Client.list, 'create': Client.create,
+         'update': Client.update, 'delete': Client.delete}
+
+
+def client_process(arguments):
+    """
+    Call the API in a loop until the deadline, in a process of its own
+    :param arguments: base url, email of the user, mix, deadline and seed
+    :return: dict of call to its latencies and its number of errors
+    """
+    base_url, email, mix, start_at, deadline, seed = arguments
+    rng = random.Random(seed)
+    client = Client(base_url, email, rng)
+    client.start()
+    calls = [call for call, weight in mix]
+    cumulative = list(itertools.accumulate(weight for call, weight in mix))
+    results = {call: {'latencies': [], 'errors': 0} for call in calls}
+
+    # the clients start together, once all of them have their user
+    time.sleep(max(0, start_at - time.time()))
+    while time.time() < deadline:
+        call = calls[bisect.bisect_right(cumulative, rng.random() * cumulative[-1])]
+        started = time.time()
+        try:
+            response = CALLS[call](client)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        if ok:
+            results[call]['latencies'].append(time.time() - started)
+        else:
+            results[call]['errors'] += 1
+    return results
+
+
+def run(workers, pool_size, worker_class, clients, duration, mix, port, seed):
+    """
+    Load the API served with one worker count and pool size
+    :return: report of the run
+    """
+    metrics_dir = tempfile.mkdtemp(prefix='bucketlist-load-')
+    process = start_server(workers, pool_size, worker_class, port, metrics_dir)
+    try:
+        base_url = 'http://127.0.0.1:{}/api/v1'.format(port)
+        run_id = '{}-{}-{}'.format(int(time.time()), workers, pool_size)
+        # the users are created before the clients start, with bcrypt they take a while
+        start_at = time.time() + 5 + clients * 0.5
+        arguments = [(base_url, 'load-{}-{}@example.com'.format(run_id, number), mix, start_at,
+                      start_at + duration, seed + number) for number in range(clients)]
+        pool = multiprocessing.Pool(clients)
+        try:
+            results = pool.map(client_process, arguments)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        process.terminate()
+        process.wait()
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+    report = {'workers': workers, 'pool_size': pool_size, 'worker_class': worker_class, 'clients': clients,
+              'calls': {}}
+    everything = []
+    errors = 0
+    for call, weight in mix:
+        latencies = sorted(latency for result in results for latency in result[call]['latencies'])
+        call_errors = sum(result[call]['errors'] for result in results)
+        everything.extend(latencies)
+        errors += call_errors
+        report['calls'][call] = {
+            'requests': len(latencies),
+            'errors': call_errors,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+        }
+    everything.sort()
+    report.update({
+        'requests': len(everything),
+        'errors': errors,
+        'requests_per_second': round(len(everything) / duration, 1),
+        'p50_ms': percentile(everything, 50),
+        'p95_ms': percentile(everything, 95),
+        'p99_ms': percentile(everything, 99),
+    })
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load the API served by gunicorn with a mix of calls')
+    parser.add_argument('--workers', default='1,2,4', help='gunicorn worker counts to try, separated by commas')
+    parser.add_argument('--pool-sizes', default='5', help='connection pool sizes to try, separated by commas')
+    parser.add_argument('--worker-class', default='sync', help='sync, gthread or gevent')
+    parser.add_argument('--clients', type=int, default=8, help='client processes')
+    parser.add_argument('--duration', type=float, default=30, help='seconds each combination is loaded')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='calls with their weights')
+    parser.add_argument('--port', type=int, default=8124)
+    parser.add_argument('--seed', type=int, default=42, help='seed of the random choices of the clients')
+    parser.add_argument('--output', help='file the reports are written to as json')
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    reports = []
+    for workers, pool_size in itertools.product([int(value) for value in args.workers.split(',')],
+                                                [int(value) for value in args.pool_sizes.split(',')]):
+        reports.append(run(workers, pool_size, args.worker_class, args.clients, args.duration, mix, args.port,
+                           args.seed))
+        print(json.dumps(reports[-1]))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(reports, output, indent=2)
+    return reports
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,375 @@
+"""
+Replay the requests captured with TRAFFIC_CAPTURE_PATH against a local instance and compare their latencies
+
+The local instance should be seeded with manage.py seed, whose users all have the same password. Each captured user
+is replayed as one of the seeded users, who are logged in first. The ids of the captured paths and bodies are
+replaced by ids of bucketlists and items of that user, and the bodies are made up from their recorded shape. The
+requests are sent at their captured pace, sped up by --speed, or as fast as possible with --speed 0. The report gives
+for each route the captured and the replayed latency percentiles and their difference. Run from the root of the
+repository:
+
+    $ python manage.py seed --users 100
+    $ gunicorn -c gunicorn_config.py run:app
+    $ python benchmarks/replay.py capture.ndjson --url http://127.0.0.1:5000 --speed 10
+"""
+import argparse
+import json
+import math
+import random
+import re
+import string
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# routes which are not replayed, the event stream never ends
+SKIPPED_ROUTES = ('/api/v1/bucketlists/events',)
+
+# emails of the seeded users, numbered from 1, and their password, see benchmarks/seed.py
+SEEDED_EMAIL = 'user{}@seed.example.com'
+SEEDED_PASSWORD = 'seed1234'
+
+# placeholders of the ids in the routes
+ROUTE_ID = re.compile(r'<(?:int:)?(id|item_id)>')
+
+
+def percentile(values, percent):
+    """
+    Get a percentile of values, by the nearest rank
+    :param values: sorted values
+    :param percent:
+    :return: the value, None when there are no values
+    """
+    if not values:
+        return None
+    return round(values[max(0, min(len(values) - 1, int(math.ceil(percent / 100.0 * len(values))) - 1))], 1)
+
+
+def read_capture(paths):
+    """
+    Read the captured requests of one or more files, the workers may each have written their own
+    :param paths:
+    :return: the requests to replay, in the order they were received
+    """
+    entries = []
+    for path in paths:
+        with open(path) as capture:
+            for line in capture:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry.get('route') and entry['route'] not in SKIPPED_ROUTES:
+                    entries.append(entry)
+    entries.sort(key=lambda entry: entry['time'])
+    return entries
+
+
+class ReplayUser(object):
+    """
+    A seeded user the requests of a captured user are replayed as, with the ids of their bucketlists and items
+    """
+
+    def __init__(self, base_url, email):
+        self.base_url = base_url
+        self.email = email
+        self.headers = {}
+        self.lock = threading.Lock()
+        # ids of the bucketlists of the user, with the ids of the items of each
+        self.bucketlists = {}
+
+    def start(self):
+        """
+        Log the user in and read the ids of their first bucketlists and items
+        :return: whether the user could log in
+        """
+        response = requests.post(self.base_url + '/api/v1/auth/login',
+                                 data={'email': self.email, 'password': SEEDED_PASSWORD}, timeout=30)
+        if response.status_code != 200:
+            return False
+        self.headers = {'Authorization': 'Bearer ' + response.json()['access_token']}
+        response = requests.get(self.base_url + '/api/v1/bucketlists?limit=100', headers=self.headers, timeout=30)
+        for bucketlist in response.json().get('items', []):
+            self.bucketlists[bucketlist['id']] = [item['id'] for item in bucketlist['items']]
+        return True
+
+    def pick(self, rng, with_items=False, remove=None):
+        """
+        Pick a bucketlist of the user, and one of its items
+        :param rng:
+        :param with_items: only pick a bucketlist with items
+        :param remove: 'id' or 'item_id' to forget the bucketlist or the item picked, which is about to be deleted
+        :return: bucketlist id and item id, None when there is none
+        """
+        with self.lock:
+            candidates = [bucketlist_id for bucketlist_id, items in self.bucketlists.items()
+                          if items or not with_items]
+            if not candidates:
+                return None
+            bucketlist_id = rng.choice(sorted(candidates))
+            items = self.bucketlists[bucketlist_id]
+            item_id = rng.choice(items) if items else None
+            if remove == 'id':
+                del self.bucketlists[bucketlist_id]
+            elif remove == 'item_id' and item_id is not None:
+                items.remove(item_id)
+            return bucketlist_id, item_id
+
+    def forget(self, ids, items=False):
+        """
+        Forget bucketlists or items about to be deleted
+        :param ids:
+        :param items: whether the ids are of items
+        :return:
+        """
+        with self.lock:
+            for bucketlist_id in list(self.bucketlists):
+                if items:
+                    self.bucketlists[bucketlist_id] = [
+                        item_id for item_id in self.bucketlists[bucketlist_id] if item_id not in ids]
+                elif bucketlist_id in ids:
+                    del self.bucketlists[bucketlist_id]
+
+    def created(self, entry, response):
+        """
+        Remember the bucketlist or the item created by a replayed request
+        :param entry: the captured request
+        :param response:
+        :return:
+        """
+        if entry['method'] != 'POST' or response.status_code != 201:
+            return
+        try:
+            body = response.json()
+        except ValueError:
+            return
+        with self.lock:
+            if entry['route'] == '/api/v1/bucketlists':
+                self.bucketlists.setdefault(body['id'], [])
+            elif entry['route'] == '/api/v1/bucketlists/<int:id>/items/':
+                self.bucketlists.setdefault(body['belongs_to'], []).append(body['id'])
+
+
+class Replayer(object):
+    """
+    Turns the captured requests into requests to the local instance
+    """
+
+    def __init__(self, base_url, users, rng):
+        self.base_url = base_url
+        self.users = users
+        self.rng = rng
+        self.lock = threading.Lock()
+        # captured user hash to the seeded user replaying them
+        self.mapping = {}
+        self.registered = 0
+
+    def user_for(self, entry):
+        """
+        Get the seeded user replaying the user of a captured request, the requests without a user go to any of them
+        :param entry:
+        :return: ReplayUser
+        """
+        with self.lock:
+            if entry.get('user') is None:
+                return self.rng.choice(self.users)
+            if entry['user'] not in self.mapping:
+                self.mapping[entry['user']] = self.users[len(self.mapping) % len(self.users)]
+            return self.mapping[entry['user']]
+
+    def text(self, length):
+        """Make up a string of a length."""
+        with self.lock:
+            return ''.join(self.rng.choice(string.ascii_lowercase + ' ') for _ in range(max(1, length))).strip() \
+                or 'a'
+
+    def value(self, shape, key, user, bucketlist_id=None):
+        """
+        Make up a value from its shape
+        :param shape:
+        :param key: key of the value in its object
+        :param user:
+        :param bucketlist_id: bucketlist of the path of the request, whose items the ids are, if any
+        :return:
+        """
+        if isinstance(shape, dict) and 'list' in shape:
+            if key == 'ids':
+                # ids of items of the bucketlist, or of bucketlists of the user
+                with user.lock:
+                    ids = list(user.bucketlists.get(bucketlist_id, [])) if bucketlist_id is not None \
+                        else sorted(user.bucketlists)
+                return ids[:shape['list']]
+            return [self.value(shape['item'], None, user, bucketlist_id) for _ in range(shape['list'])]
+        if isinstance(shape, dict):
+            return {item_key: self.value(item, item_key, user, bucketlist_id) for item_key, item in shape.items()}
+        if shape == 'bool':
+            return self.rng.random() < 0.5
+        if shape in ('int', 'float'):
+            return self.rng.randint(1, 10)
+        if isinstance(shape, str) and shape.startswith('str:'):
+            return self.text(int(shape[4:]))
+        return None
+
+    def build(self, entry, user):
+        """
+        Make the request replaying a captured one
+        :param entry:
+        :param user:
+        :return: method, url and arguments of requests, None when the user has nothing for it to work on
+        """
+        route = entry['route']
+        path = route
+        bucketlist_id = None
+        names = ROUTE_ID.findall(route)
+        if names:
+            # a deleted bucketlist or item isn't picked again
+            remove = names[-1] if entry['method'] == 'DELETE' and route.endswith('<int:{}>'.format(names[-1])) \
+                else None
+            picked = user.pick(self.rng, with_items='item_id' in names, remove=remove)
+            if picked is None:
+                return None
+            bucketlist_id = picked[0]
+            path = route.replace('<int:id>', str(picked[0])).replace('<int:item_id>', str(picked[1]))
+
+        options = {'timeout': 60}
+        params = {}
+        for key, value in (entry.get('query') or {}).items():
+            if isinstance(value, int):
+                params[key] = value
+            elif value != 'redacted':
+                params[key] = self.value(value, key, user)
+        if params:
+            options['params'] = params
+
+        body = entry.get('body')
+        if route == '/api/v1/auth/register':
+            with self.lock:
+                self.registered += 1
+                number = self.registered
+            options['data'] = {'email': 'replay-{}-{}@example.com'.format(int(time.time()), number),
+                               'password': SEEDED_PASSWORD}
+        elif route == '/api/v1/auth/login':
+            options['data'] = {'email': user.email, 'password': SEEDED_PASSWORD}
+        elif isinstance(body, dict) and set(body) == {'bytes'}:
+            # an import, replayed with as many bytes of made up bucketlists
+            lines = []
+            size = 0
+            while size < body['bytes']:
+                lines.append(json.dumps({'type': 'bucketlist', 'id': len(lines) + 1, 'name': self.text(20)}))
+                size += len(lines[-1]) + 1
+            options['data'] = '\n'.join(lines).encode()
+            options['headers'] = {'Content-Type': 'application/x-ndjson'}
+        elif body is not None:
+            options['json'] = self.value(body, None, user, bucketlist_id)
+            if entry['method'] == 'DELETE' and isinstance(options['json'], dict):
+                user.forget(options['json'].get('ids') or [], items=bucketlist_id is not None)
+
+        if not route.startswith('/api/v1/auth/'):
+            options['headers'] = dict(options.get('headers', {}), **user.headers)
+        return entry['method'], self.base_url + path, options
+
+
+def replay(entries, base_url, users, speed=1.0, concurrency=16, seed=42):
+    """
+    Replay captured requests and compare their latencies by route
+    :param entries: captured requests, in the order they were received
+    :param base_url: url of the local instance
+    :param users: number of seeded users to replay the captured users as
+    :param speed: how many times faster than captured the requests are sent, 0 for as fast as possible
+    :param concurrency: requests in flight at most
+    :param seed: seed of the random choices
+    :return: report
+    """
+    replay_users = []
+    for number in range(1, users + 1):
+        user = ReplayUser(base_url, SEEDED_EMAIL.format(number))
+        if user.start():
+            replay_users.append(user)
+    if not replay_users:
+        raise RuntimeError('None of the seeded users could log in, seed the database with manage.py seed.')
+    replayer = Replayer(base_url, replay_users, random.Random(seed))
+
+    results = {}
+    results_lock = threading.Lock()
+
+    def send(entry, user, request):
+        key = '{} {}'.format(entry['method'], entry['route'])
+        started = time.time()
+        try:
+            response = requests.request(request[0], request[1], **request[2])
+            ok = response.status_code < 400
+            user.created(entry, response)
+        except requests.RequestException:
+            ok = False
+        latency = (time.time() - started) * 1000
+        with results_lock:
+            result = results.setdefault(key, {'replayed': [], 'errors': 0})
+            if ok:
+                result['replayed'].append(latency)
+            else:
+                result['errors'] += 1
+
+    skipped = 0
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for entry in entries:
+            if speed > 0:
+                time.sleep(max(0, started + (entry['time'] - entries[0]['time']) / speed - time.time()))
+            user = replayer.user_for(entry)
+            request = replayer.build(entry, user)
+            if request is None:
+                skipped += 1
+                continue
+            executor.submit(send, entry, user, request)
+    seconds = time.time() - started
+
+    captured = {}
+    for entry in entries:
+        captured.setdefault('{} {}'.format(entry['method'], entry['route']), []).append(entry['duration_ms'])
+
+    routes = {}
+    for key in sorted(captured):
+        before = sorted(captured[key])
+        result = results.get(key, {'replayed': [], 'errors': 0})
+        after = sorted(result['replayed'])
+        report = {'captured': len(before), 'replayed': len(after), 'errors': result['errors']}
+        for percent in (50, 95, 99):
+            was, now = percentile(before, percent), percentile(after, percent)
+            report['captured_p{}_ms'.format(percent)] = was
+            report['replayed_p{}_ms'.format(percent)] = now
+            report['delta_p{}_ms'.format(percent)] = round(now - was, 1) if was is not None and now is not None \
+                else None
+        routes[key] = report
+    return {
+        'requests': len(entries),
+        'skipped': skipped,
+        'seconds': round(seconds, 3),
+        'users': len(replay_users),
+        'routes': routes,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay captured requests against a local instance')
+    parser.add_argument('captures', nargs='+', help='files written with TRAFFIC_CAPTURE_PATH')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='url of the local instance')
+    parser.add_argument('--speed', type=float, default=1, help='speed up of the captured pace, 0 for no pauses')
+    parser.add_argument('--users', type=int, default=20, help='seeded users to replay the captured users as')
+    parser.add_argument('--concurrency', type=int, default=16, help='requests in flight at most')
+    parser.add_argument('--seed', type=int, default=42, help='seed of the random choices')
+    parser.add_argument('--output', help='file the report is written to as json')
+    args = parser.parse_args(argv)
+
+    report = replay(read_capture(args.captures), args.url.rstrip('/'), args.users, args.speed, args.concurrency,
+                    args.seed)
+    print(json.dumps(report, indent=2, sort_keys=True))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+    return report
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
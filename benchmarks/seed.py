@@ -0,0 +1,247 @@
+"""
+Fill a database with a large synthetic dataset, for load testing
+
+The users get a number of bucketlists and the bucketlists a number of items drawn from Zipf distributions, so that
+most have a few and some have very many, like real data. The same seed gives the same users, bucketlists and items.
+The rows are loaded with COPY on Postgres and with multi-row inserts on other databases, like a local SQLite file,
+batch_size rows at a time. Run it with:
+
+    $ python manage.py seed --users 100000 --max-bucketlists 200 --max-items 50
+    $ python manage.py seed --database sqlite:///seed.db --users 1000
+"""
+import bisect
+import random
+import time
+from datetime import datetime, timedelta
+from flask_bcrypt import Bcrypt
+from sqlalchemy import Column, func, select, text
+from sqlalchemy.schema import CreateTable
+from app import db
+from app.bulk_import import copy_buffer, csv_buffer
+from app.models import User, Bucketlist, BucketlistItem
+
+# emails of the seeded users, numbered from 1 across the seedings of a database, and the password of every one of
+# them, hashed once as bcrypt is slow on purpose. benchmarks/replay.py logs in as them
+EMAIL = 'user{}@seed.example.com'
+PASSWORD = 'seed1234'
+
+# rows loaded in each transaction
+SEED_BATCH_SIZE = 10000
+
+# share of the items which are done
+DONE_PROBABILITY = 0.3
+
+# the bucketlists are created over the last days
+SEED_DAYS = 365
+
+# words the names are made of, so that searches match some of them
+WORDS = ('visit', 'learn', 'climb', 'read', 'cook', 'travel', 'paris', 'tokyo', 'nairobi', 'lima', 'mountain',
+         'river', 'guitar', 'spanish', 'marathon', 'garden', 'painting', 'novel', 'beach', 'friends')
+
+
+class ZipfSampler(object):
+    """
+    Draws integers from 1 to maximum, k being drawn with a probability proportional to 1 / k ** skew
+    """
+
+    def __init__(self, maximum, skew, rng):
+        self.rng = rng
+        self.cumulative = []
+        total = 0.0
+        for k in range(1, max(1, maximum) + 1):
+            total += 1.0 / k ** skew
+            self.cumulative.append(total)
+
+    def sample(self):
+        """Draw an integer."""
+        return bisect.bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1]) + 1
+
+
+class CopyWriter(object):
+    """
+    Loads rows into Postgres with COPY
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def write(self, table, columns, rows):
+        """
+        Load rows into a table
+        :param table:
+        :param columns: names of the columns of the rows
+        :param rows: list of tuples
+        :return:
+        """
+        buffer, writer = csv_buffer()
+        writer.writerows(rows)
+        cursor = self.connection.connection.cursor()
+        try:
+            copy_buffer(cursor, table.name, buffer, columns)
+        finally:
+            cursor.close()
+
+
+class InsertWriter(object):
+    """
+    Loads rows into any database with multi-row inserts
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def write(self, table, columns, rows):
+        """
+        Load rows into a table
+        :param table:
+        :param columns: names of the columns of the rows
+        :param rows: list of tuples
+        :return:
+        """
+        if rows:
+            self.connection.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+
+
+class SequenceIds(object):
+    """
+    Hands out the ids of a Postgres table from its sequence, a block at a time
+    The ids follow the increment of the sequence, so those of a shard keep their residue, see app.sharding
+    """
+
+    def __init__(self, connection, table, block):
+        self.connection = connection
+        self.table = table
+        self.block = max(1, block)
+        self.ids = []
+
+    def next(self):
+        """Get the next id."""
+        if not self.ids:
+            with self.connection.begin():
+                self.ids = [row[0] for row in self.connection.execute(text(
+                    "SELECT nextval(pg_get_serial_sequence('{}', 'id')) FROM generate_series(1, :block)".format(
+                        self.table.name)), block=self.block)]
+            self.ids.reverse()
+        return self.ids.pop()
+
+
+class MaxIds(object):
+    """
+    Hands out the ids of a table after its largest one, on databases without sequences
+    """
+
+    def __init__(self, connection, table, block):
+        self.last = connection.scalar(select([func.coalesce(func.max(table.c.id), 0)]))
+
+    def next(self):
+        """Get the next id."""
+        self.last += 1
+        return self.last
+
+
+def name(rng, index):
+    """
+    Make up the name of a bucketlist or an item, the index keeps it unique in its bucketlist or for its user
+    :param rng:
+    :param index:
+    :return: string
+    """
+    return '{} {} {}'.format(rng.choice(WORDS).capitalize(), rng.choice(WORDS), index + 1)
+
+
+def create_tables(engine):
+    """
+    Create the tables of the app in a database, if they don't exist
+    Other databases than Postgres get no triggers and no indexes on expressions, like the full text index of the items
+    :param engine:
+    :return:
+    """
+    if engine.dialect.name == 'postgresql':
+        db.Model.metadata.create_all(engine)
+        return
+    with engine.begin() as connection:
+        for table in db.Model.metadata.sorted_tables:
+            if engine.dialect.has_table(connection, table.name):
+                continue
+            connection.execute(CreateTable(table))
+            for index in table.indexes:
+                if all(isinstance(expression, Column) for expression in index.expressions):
+                    index.create(connection)
+
+
+def seed(engine, users=1000, max_bucketlists=100, max_items=50, skew=1.1, seed=42, batch_size=SEED_BATCH_SIZE):
+    """
+    Add users with bucketlists and items to a database whose tables exist
+    On Postgres the item counts of the bucketlists are kept by the triggers, elsewhere they are inserted with them.
+    On Postgres the ids are taken from the sequences, which keeps them unique across the shards, elsewhere they
+    continue after the largest ones. The emails continue the numbering of the users seeded before.
+    :param engine:
+    :param users: users to add
+    :param max_bucketlists: bucketlists of a user at most
+    :param max_items: items of a bucketlist at most
+    :param skew: exponent of the Zipf distributions, higher gives fewer large users and bucketlists
+    :param seed: seed of the random numbers
+    :param batch_size: rows loaded in each transaction
+    :return: report of the seeding
+    """
+    started = time.time()
+    rng = random.Random(seed)
+    bucketlists_per_user = ZipfSampler(max_bucketlists, skew, rng)
+    items_per_bucketlist = ZipfSampler(max_items, skew, rng)
+    password = Bcrypt().generate_password_hash(PASSWORD).decode()
+    now = datetime.utcnow()
+    postgres = engine.dialect.name == 'postgresql'
+
+    tables = [
+        ('users', User.__table__, ('id', 'email', 'password', 'shard')),
+        ('bucketlists', Bucketlist.__table__, ('id', 'name', 'date_created', 'date_modified', 'created_by',
+                                               'item_count', 'done_count')),
+        ('items', BucketlistItem.__table__, ('id', 'name', 'date_created', 'date_modified', 'done', 'belongs_to')),
+    ]
+    report = {key: 0 for key, table, columns in tables}
+    batches = {key: [] for key, table, columns in tables}
+
+    with engine.connect() as connection:
+        writer = CopyWriter(connection) if postgres else InsertWriter(connection)
+
+        def flush():
+            # the rows of a user are in the same batch, which loads the users before their bucketlists and items
+            with connection.begin():
+                for key, table, columns in tables:
+                    writer.write(table, columns, batches[key])
+                    report[key] += len(batches[key])
+                    del batches[key][:]
+
+        ids = {key: (SequenceIds if postgres else MaxIds)(connection, table, min(batch_size, users) if
+                                                            key == 'users' else batch_size)
+               for key, table, columns in tables}
+        seeded = connection.scalar(select([func.count()]).where(User.__table__.c.email.like(EMAIL.format('%'))))
+        for number in range(seeded + 1, seeded + users + 1):
+            user_id = ids['users'].next()
+            # the users stay in the default database, rebalance_shards moves them
+            batches['users'].append((user_id, EMAIL.format(number), password, None))
+            for index in range(bucketlists_per_user.sample()):
+                bucketlist_id = ids['bucketlists'].next()
+                created = now - timedelta(seconds=rng.randint(0, SEED_DAYS * 24 * 3600))
+                done_count = 0
+                item_count = items_per_bucketlist.sample()
+                for item_index in range(item_count):
+                    item_id = ids['items'].next()
+                    done = rng.random() < DONE_PROBABILITY
+                    done_count += done
+                    modified = created + timedelta(seconds=rng.randint(0, int((now - created).total_seconds())))
+                    batches['items'].append(
+                        (item_id, name(rng, item_index), created, modified, done, bucketlist_id))
+                if postgres:
+                    item_count = done_count = 0
+                batches['bucketlists'].append(
+                    (bucketlist_id, name(rng, index), created, created, user_id, item_count, done_count))
+            if sum(len(rows) for rows in batches.values()) >= batch_size:
+                flush()
+        flush()
+
+    seconds = time.time() - started
+    rows = report['users'] + report['bucketlists'] + report['items']
+    report['seconds'] = round(seconds, 3)
+    report['rows_per_second'] = int(rows / seconds) if seconds > 0 else rows
+    return report
@@ -0,0 +1,148 @@
+"""
+Compare the throughput of the sync and the async serving modes under many concurrent connections
+
+Each mode is started with gunicorn on the database of APP_SETTINGS, then as many clients as connections fetch the
+bucketlists of a user in a loop for a while. Run from the root of the repository:
+
+    $ python benchmarks/serving.py --connections 1000 --duration 30
+"""
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import gevent
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# gunicorn command line of each serving mode, formatted with the number of workers and of connections
+MODES = {
+    'sync': 'gunicorn --workers {workers} --bind {bind} run:app',
+    'async': 'gunicorn --worker-class gevent --workers {workers} --worker-connections {connections} '
+             '--bind {bind} run_async:app',
+}
+
+
+def start_server(mode, workers, connections, port):
+    """
+    Start gunicorn in a serving mode and wait until it answers
+    :param mode: sync or async
+    :param workers:
+    :param connections:
+    :param port:
+    :return: the gunicorn process
+    """
+    command = MODES[mode].format(workers=workers, connections=connections, bind='127.0.0.1:{}'.format(port))
+    process = subprocess.Popen(command.split(), cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            requests.get('http://127.0.0.1:{}/api/v1/bucketlists'.format(port), timeout=5)
+            return process
+        except requests.RequestException:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start in {} mode'.format(mode))
+
+
+def login(base_url, email, password):
+    """
+    Register the user of the benchmark if needed, give them a few bucketlists and log them in
+    :param base_url:
+    :param email:
+    :param password:
+    :return: the access token
+    """
+    user_data = {'email': email, 'password': password}
+    requests.post(base_url + '/auth/register', data=user_data)
+    result = requests.post(base_url + '/auth/login', data=user_data)
+    access_token = json.loads(result.text)['access_token']
+    requests.post(base_url + '/bucketlists/batch', headers={'Authorization': 'Bearer ' + access_token},
+                  json={'names': ['Benchmark bucketlist {}'.format(number) for number in range(20)]})
+    return access_token
+
+
+def client(url, headers, deadline, latencies, errors):
+    """
+    Fetch a url in a loop until the deadline, on one connection
+    :param url:
+    :param headers:
+    :param deadline:
+    :param latencies: list the latency of each successful request is added to
+    :param errors: list the errors are added to
+    :return:
+    """
+    session = requests.Session()
+    while time.time() < deadline:
+        started = time.time()
+        try:
+            response = session.get(url, headers=headers, timeout=30)
+            if response.status_code == 200:
+                latencies.append(time.time() - started)
+            else:
+                errors.append(response.status_code)
+        except requests.RequestException as error:
+            errors.append(type(error).__name__)
+
+
+def run(mode, workers, connections, duration, port, access_token):
+    """
+    Run the benchmark against one serving mode
+    :return: report of the run
+    """
+    process = start_server(mode, workers, connections, port)
+    try:
+        url = 'http://127.0.0.1:{}/api/v1/bucketlists'.format(port)
+        headers = {'Authorization': 'Bearer ' + access_token}
+        latencies = []
+        errors = []
+        deadline = time.time() + duration
+        gevent.joinall([gevent.spawn(client, url, headers, deadline, latencies, errors)
+                        for _ in range(connections)])
+    finally:
+        process.terminate()
+        process.wait()
+
+    latencies.sort()
+    return {
+        'mode': mode,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_second': round(len(latencies) / duration, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+        'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 1) if latencies else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the sync and async serving modes')
+    parser.add_argument('--connections', type=int, default=1000, help='concurrent connections')
+    parser.add_argument('--duration', type=float, default=30, help='seconds each mode is loaded')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers of each mode')
+    parser.add_argument('--port', type=int, default=8123)
+    parser.add_argument('--modes', default='sync,async')
+    args = parser.parse_args(argv)
+
+    reports = []
+    for mode in args.modes.split(','):
+        # the user is created through the first server, the token works for the others
+        if not reports:
+            process = start_server(mode, 1, 1, args.port)
+            try:
+                access_token = login('http://127.0.0.1:{}/api/v1'.format(args.port),
+                                     'benchmark@test.com', 'benchmark1234')
+            finally:
+                process.terminate()
+                process.wait()
+        reports.append(run(mode, args.workers, args.connections, args.duration, args.port, access_token))
+        print(json.dumps(reports[-1]))
+    return reports
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,89 @@
+"""
+Gunicorn settings of the API, used by the Procfile
+
+    $ gunicorn -c gunicorn_config.py run:app
+    $ GUNICORN_WORKER_CLASS=gevent gunicorn -c gunicorn_config.py run_async:app
+
+Every setting can be tuned from the environment without editing this file.
+"""
+import multiprocessing
+import os
+import shutil
+
+# number of CPUs of the machine, the worker count is derived from it
+cpu_count = multiprocessing.cpu_count()
+
+bind = '0.0.0.0:{}'.format(os.getenv('PORT', '5000'))
+
+# sync, gthread or gevent, gevent needs run_async:app as the app so that it is patched before being loaded
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+
+if worker_class == 'gevent':
+    # one worker per CPU is enough when each of them serves many connections while they wait on the database
+    default_workers = cpu_count
+elif worker_class == 'gthread':
+    default_workers = cpu_count + 1
+else:
+    # sync workers block on the database, so there are more of them than CPUs
+    default_workers = cpu_count * 2 + 1
+workers = int(os.getenv('WEB_CONCURRENCY', default_workers))
+threads = int(os.getenv('GUNICORN_THREADS', '4' if worker_class == 'gthread' else '1'))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+
+# the app is loaded once in the master and shared by the forked workers, so they start faster and use less memory
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# workers are restarted after a number of requests, at different times thanks to the jitter, to bound leaks
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# the workers write their metrics to files in this directory, added up by the worker answering /metrics. It is set
+# before the app is loaded, as the metrics library reads it on import
+os.environ.setdefault('prometheus_multiproc_dir', os.getenv('METRICS_DIR', '/tmp/bucketlist-metrics'))
+
+loglevel = os.getenv('GUNICORN_LOGLEVEL', 'info')
+accesslog = os.getenv('GUNICORN_ACCESSLOG', '-')
+
+
+def post_fork(server, worker):
+    """
+    Drop the database connections a worker inherits from the master, on the default database and every bind
+    A connection opened while preloading the app would otherwise be shared by every worker and the master
+    :param server:
+    :param worker:
+    :return:
+    """
+    # imported here as the config is read before the app, which may have to be patched by gevent first
+    from app import db
+
+    app = server.app.wsgi()
+    with app.app_context():
+        db.engine.dispose()
+        for bind in app.config.get('SQLALCHEMY_BINDS') or {}:
+            db.get_engine(app, bind=bind).dispose()
+
+
+def on_starting(server):
+    """
+    Empty the directory of the metrics of the previous run
+    :param server:
+    :return:
+    """
+    shutil.rmtree(os.environ['prometheus_multiproc_dir'], ignore_errors=True)
+    os.makedirs(os.environ['prometheus_multiproc_dir'])
+
+
+def child_exit(server, worker):
+    """
+    Stop counting the metrics of a worker which is gone in the gauges of the live workers
+    :param server:
+    :param worker:
+    :return:
+    """
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,10 +1,17 @@
+import gzip
+import json
 import os
+import subprocess
 import unittest
 import coverage
 # class for handling a set of commands
 from flask_script import Manager
 from flask_migrate import Migrate, MigrateCommand
 from app import db, create_app
+from app.models import User, Bucketlist, install_triggers
+from app.bulk_import import import_ndjson, ImportDataError
+from app import sharding
+from app.sharding import shard_names, use_shard
 
 # initialize the app with all its configurations
 app = create_app(config_name=os.getenv('APP_SETTINGS'))
@@ -59,5 +66,164 @@ def drop_db():
     """Drops the db tables."""
     db.drop_all()
 
+
+@manager.command
+def repair_counts():
+    """Installs the database triggers and recounts the items of every bucketlist, on every shard."""
+    for name in shard_names():
+        with use_shard(name):
+            install_triggers()
+            updated = Bucketlist.repair_counts()
+        print('Recounted the items of {} bucketlists on {}.'.format(updated, name))
+
+
+@manager.command
+def init_shards():
+    """Creates the tables of every shard and spreads the ids of the bucketlists and items between them."""
+    report = sharding.init_shards()
+    for name, next_ids in report.items():
+        print('{}: next ids {}'.format(name, json.dumps(next_ids, sort_keys=True)))
+
+
+@manager.option('-u', '--user', dest='email', help='Email of the user to move')
+@manager.option('-s', '--shard', dest='shard', help='Shard to move them to, default or shard_<n>')
+@manager.option('-w', '--wait', dest='wait', type=int, default=sharding.SHARD_CACHE_SECONDS,
+                help='Seconds to wait for the workers to see the move before deleting the old rows')
+def move_user(email, shard, wait):
+    """Moves the bucketlists and items of a user to another shard."""
+    user = User.query.filter_by(email=email).first()
+    if not user:
+        print('There is no user with the email {}.'.format(email))
+        return 1
+    print(json.dumps(sharding.move_user(user, shard, wait=wait)))
+
+
+@manager.option('-n', '--dry-run', dest='dry_run', action='store_true', help='Only print the moves')
+@manager.option('-w', '--wait', dest='wait', type=int, default=sharding.SHARD_CACHE_SECONDS,
+                help='Seconds to wait for the workers to see each move before deleting the old rows')
+def rebalance_shards(dry_run, wait):
+    """Moves users between shards until the shards have about as many bucketlists and items."""
+    moves = sharding.plan_rebalance(sharding.shard_loads())
+    for user_id, source, target, rows in moves:
+        print('user {} with {} rows: {} -> {}'.format(user_id, rows, source, target))
+        if not dry_run:
+            sharding.move_user(User.query.get(user_id), target, wait=wait)
+    if not moves:
+        print('The shards are balanced.')
+
+
+@manager.option('-u', '--user', dest='email', help='Email of the user who gets the data')
+@manager.option('-f', '--file', dest='path', help='Newline delimited json file, it may be gzipped (.gz)')
+def import_data(path, email):
+    """Imports bucketlists and items for a user from an ndjson export."""
+    user = User.query.filter_by(email=email).first()
+    if not user:
+        print('There is no user with the email {}.'.format(email))
+        return 1
+
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as lines:
+        try:
+            report = import_ndjson(lines, user.id)
+        except ImportDataError as e:
+            print('Nothing was imported. {}'.format(e))
+            return 1
+    print(json.dumps(report, indent=2))
+    print('Imported {} rows from {} lines at {} rows/sec.'.format(
+        report['bucketlists']['created'] + report['items']['created'], report['lines'], report['rows_per_second']))
+
+
+@manager.option('-c', '--config', dest='config_name', default='testing',
+                help='Configuration whose database is used, its tables are dropped first')
+@manager.option('-u', '--users', dest='users', type=int, default=3, help='Users to create')
+@manager.option('-b', '--bucketlists', dest='bucketlists', type=int, default=50, help='Bucketlists of each user')
+@manager.option('-i', '--items', dest='items', type=int, default=10, help='Items of each bucketlist')
+@manager.option('-n', '--iterations', dest='iterations', type=int, default=50, help='Calls of each route')
+@manager.option('-r', '--routes', dest='routes', help='Routes to measure separated by commas, all by default')
+@manager.option('-o', '--output', dest='output', help='File the report is written to, printed by default')
+@manager.option('-s', '--save', dest='save', action='store_true',
+                help='Save the report as the benchmark of the current git revision')
+@manager.option('--i-know-this-drops-tables', dest='drop_tables', action='store_true',
+                help='Allow a configuration other than testing and development, whose tables are dropped')
+def bench(config_name, users, bucketlists, items, iterations, routes, output, save, drop_tables):
+    """Seeds a dataset and measures the latency, queries and allocations of every route."""
+    from benchmarks import baseline
+    from benchmarks.endpoints import check_disposable, run_benchmark
+
+    try:
+        check_disposable(config_name, drop_tables)
+    except ValueError as e:
+        print('{} Pass --i-know-this-drops-tables to run it anyway.'.format(e))
+        return 1
+    report = run_benchmark(config_name, users, bucketlists, items, iterations,
+                           routes.split(',') if routes else None, drop_tables)
+    if output:
+        with open(output, 'w') as report_file:
+            json.dump(report, report_file, indent=2, sort_keys=True)
+    elif not save:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    if save:
+        print('Saved the benchmark to {}.'.format(baseline.save(report)))
+
+
+@manager.option('-b', '--baseline', dest='reference', default='HEAD',
+                help='Revision or report file to compare with, HEAD by default')
+@manager.option('-c', '--current', dest='current',
+                help='Revision or report file to compare, the working tree by default')
+@manager.option('-l', '--latency', dest='latency', type=float, default=None,
+                help='Relative growth of the median latency flagged, 0.10 by default')
+@manager.option('-p', '--significance', dest='significance', type=float, default=None,
+                help='P-value under which latencies differ, 0.01 by default')
+@manager.option('-q', '--queries', dest='queries', type=float, default=None,
+                help='Statements added per request flagged, 0 by default')
+@manager.option('-y', '--bytes', dest='size', type=float, default=None,
+                help='Relative growth of the bytes of a response flagged, 0.05 by default')
+def bench_compare(reference, current, latency, significance, queries, size):
+    """Compares two saved benchmarks and fails when a route regressed."""
+    from benchmarks import baseline
+
+    try:
+        before = baseline.load(reference)
+        after = baseline.load(current or baseline.current_revision())
+    except (IOError, subprocess.CalledProcessError) as e:
+        print(str(e))
+        return 1
+    thresholds = {'latency_threshold': latency, 'significance': significance, 'queries_threshold': queries,
+                  'bytes_threshold': size}
+    changes, regressions = baseline.compare(
+        before, after, **{key: value for key, value in thresholds.items() if value is not None})
+
+    for route, change in changes.items():
+        print('{}: p50 {} -> {} ms (p={}), queries {} -> {}, bytes {} -> {}'.format(
+            route, change['p50_ms'][0], change['p50_ms'][1], change['p_value'], change['queries_per_request'][0],
+            change['queries_per_request'][1], change['bytes_per_response'][0], change['bytes_per_response'][1]))
+    for route, metric, was, now in regressions:
+        print('REGRESSION {} {}: {} -> {}'.format(route, metric, was, now))
+    if regressions:
+        return 1
+    print('No regression against {}.'.format(before.get('revision', reference)))
+
+
+@manager.option('-d', '--database', dest='database',
+                help='Url of the database to fill, the one of the app by default, its tables are created if needed')
+@manager.option('-u', '--users', dest='users', type=int, default=1000, help='Users to add')
+@manager.option('-b', '--max-bucketlists', dest='max_bucketlists', type=int, default=100,
+                help='Bucketlists of a user at most')
+@manager.option('-i', '--max-items', dest='max_items', type=int, default=50, help='Items of a bucketlist at most')
+@manager.option('-k', '--skew', dest='skew', type=float, default=1.1, help='Exponent of the Zipf distributions')
+@manager.option('-s', '--seed', dest='seed', type=int, default=42, help='Seed of the random numbers')
+def seed(database, users, max_bucketlists, max_items, skew, seed):
+    """Fills a database with users, bucketlists and items for load testing."""
+    from sqlalchemy import create_engine
+    from benchmarks import seed as seeding
+
+    engine = create_engine(database) if database else db.engine
+    seeding.create_tables(engine)
+    report = seeding.seed(engine, users, max_bucketlists, max_items, skew, seed)
+    print(json.dumps(report, indent=2))
+    print('Seeded {} users, {} bucketlists and {} items at {} rows/sec.'.format(
+        report['users'], report['bucketlists'], report['items'], report['rows_per_second']))
+
+
 if __name__ == '__main__':
     manager.run()
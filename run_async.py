@@ -0,0 +1,27 @@
+# the standard library and the database driver are made cooperative before anything else is imported,
+# so that a worker serves other requests while one waits on Postgres
+from gevent import monkey
+monkey.patch_all()
+from psycogreen.gevent import patch_psycopg
+patch_psycopg()
+
+import os
+
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+from app import create_app
+
+config_name = os.getenv('APP_SETTINGS')
+app = create_app(config_name)
+
+# every request of a worker waiting on the database at the same time holds a connection of its pool
+# so it is larger than the pool of a sync worker
+app.config['SQLALCHEMY_POOL_SIZE'] = int(os.getenv('ASYNC_POOL_SIZE', '20'))
+app.config['SQLALCHEMY_MAX_OVERFLOW'] = int(os.getenv('ASYNC_MAX_OVERFLOW', '10'))
+
+# number of connections a server accepts at the same time
+MAXIMUM_CONNECTIONS = int(os.getenv('ASYNC_MAXIMUM_CONNECTIONS', '1000'))
+
+if __name__ == '__main__':
+    server = WSGIServer(('0.0.0.0', int(os.getenv('PORT', '5000'))), app, spawn=Pool(MAXIMUM_CONNECTIONS))
+    server.serve_forever()
@@ -0,0 +1,91 @@
+import random
+import shutil
+import tempfile
+import unittest
+from benchmarks import baseline
+from benchmarks.endpoints import run_benchmark
+
+
+class BenchBaselineTestCase(unittest.TestCase):
+    """This class represents the comparison of benchmark reports test case"""
+
+    def setUp(self):
+        """
+        Initialize a directory for the saved reports
+        :return:
+        """
+        self.directory = tempfile.mkdtemp()
+        self.rng = random.Random(1)
+
+    def report(self, latency, queries=3.0, size=1000.0):
+        """
+        Helper method to make up the report of a benchmark of one route
+        :param latency: median latency in milliseconds, the samples are spread around it
+        :param queries:
+        :param size:
+        :return: report
+        """
+        samples = sorted(latency * self.rng.uniform(0.8, 1.2) for _ in range(50))
+        return {'endpoints': {'GET /bucketlists': {
+            'samples_ms': samples,
+            'p50_ms': samples[len(samples) // 2],
+            'queries_per_request': queries,
+            'bytes_per_response': size
+        }}}
+
+    def test_noise_is_not_a_regression(self):
+        """
+        Test if two runs of the same code, or a slowdown under the threshold, are not flagged
+        :return:
+        """
+        changes, regressions = baseline.compare(self.report(10), self.report(10))
+        self.assertEqual(regressions, [])
+        self.assertGreater(changes['GET /bucketlists']['p_value'], baseline.SIGNIFICANCE)
+        self.assertEqual(baseline.compare(self.report(10), self.report(10.5))[1], [])
+
+    def test_slower_route_is_a_regression(self):
+        """
+        Test if a route significantly slower, running more statements or sending more bytes is flagged
+        :return:
+        """
+        changes, regressions = baseline.compare(self.report(10), self.report(15, queries=4.0, size=1200.0))
+        self.assertEqual([(route, metric) for route, metric, was, now in regressions],
+                         [('GET /bucketlists', 'p50_ms'), ('GET /bucketlists', 'queries_per_request'),
+                          ('GET /bucketlists', 'bytes_per_response')])
+        self.assertLess(changes['GET /bucketlists']['p_value'], 0.001)
+
+        # a faster route is not flagged, and the thresholds can be raised
+        self.assertEqual(baseline.compare(self.report(15), self.report(10))[1], [])
+        self.assertEqual(baseline.compare(self.report(10), self.report(15, queries=4.0, size=1200.0),
+                                          latency_threshold=1, queries_threshold=1, bytes_threshold=0.5)[1], [])
+
+    def test_reports_are_saved_by_revision(self):
+        """
+        Test if a saved report is found again by its revision
+        :return:
+        """
+        report = self.report(10)
+        path = baseline.save(report, self.directory)
+        revision = baseline.current_revision()
+        self.assertTrue(path.endswith(revision + '.json'))
+        self.assertEqual(baseline.load(revision, self.directory)['revision'], revision)
+        self.assertEqual(baseline.load(path)['endpoints'], report['endpoints'])
+        with self.assertRaises(IOError):
+            baseline.load('HEAD~1' if not revision.endswith('-dirty') else 'HEAD', self.directory)
+
+    def test_benchmark_refuses_to_drop_other_databases(self):
+        """
+        Test if the benchmark refuses the configurations whose database is not disposable before touching it
+        :return:
+        """
+        for config_name in ('production', 'staging'):
+            with self.assertRaises(ValueError) as raised:
+                run_benchmark(config_name)
+            self.assertIn('drops the tables of the {} database'.format(config_name), str(raised.exception))
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        shutil.rmtree(self.directory)
+
+    if __name__ == "__main__":
+        unittest.main()
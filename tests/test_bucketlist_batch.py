@@ -0,0 +1,280 @@
+import unittest
+import json
+from unittest import mock
+from app import create_app, db
+from app.models import Bucketlist
+
+
+class BucketlistBatchTestCase(unittest.TestCase):
+    """This class represents the test case for creating and deleting bucketlists in batches"""
+
+    def setUp(self):
+        """
+        Initialize the app and its test client and our test database
+        :return:
+        """
+        self.app = create_app(config_name="testing")
+        self.client = self.app.test_client
+
+        # binds the app to the current context
+        with self.app.app_context():
+            # create all tables
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+
+    def register_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help register a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('/api/v1/auth/register', data=user_data)
+
+    def login_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help login a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('api/v1/auth/login', data=user_data)
+
+    def test_batch_create_bucketlists(self):
+        """Test if many bucketlists can be created in one request"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/batch',
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'names': ['Travel', 'Food', 'Sports']}),
+            content_type='application/json')
+        self.assertEqual(res.status_code, 200)
+        results = json.loads(res.data.decode())['items']
+        self.assertEqual([item['status'] for item in results], [201, 201, 201])
+        self.assertEqual([item['name'] for item in results], ['Travel', 'Food', 'Sports'])
+
+        # the created bucketlists can be retrieved
+        res = self.client().get(
+            '/api/v1/bucketlists/{}'.format(results[1]['id']),
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('Food', str(res.data))
+
+    def test_batch_create_reports_duplicates_and_empty_names(self):
+        """Test the status of each bucketlist when some of them can't be created"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Travel'})
+        self.assertEqual(res.status_code, 201)
+
+        res = self.client().post(
+            '/api/v1/bucketlists/batch',
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'names': ['Travel', 'Food', '', 'Food']}),
+            content_type='application/json')
+        self.assertEqual(res.status_code, 200)
+        results = json.loads(res.data.decode())['items']
+        self.assertEqual([item['status'] for item in results], [409, 201, 400, 409])
+
+        res = self.client().get(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(json.loads(res.data.decode())['total_items'], 2)
+
+    def test_batch_create_reports_names_too_long(self):
+        """Test that a name longer than the column fails on its own, the other bucketlists being created"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/batch',
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'names': ['Travel', 'a' * 300, 'b' * 255]}),
+            content_type='application/json')
+        self.assertEqual(res.status_code, 200)
+        results = json.loads(res.data.decode())['items']
+        self.assertEqual([item['status'] for item in results], [201, 400, 201])
+        self.assertIn('at most 255 characters', results[1]['message'])
+
+        res = self.client().get(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(json.loads(res.data.decode())['total_items'], 2)
+
+    def test_batch_create_with_no_names_list(self):
+        """Test what message is displayed when the names are not sent as a list"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/batch',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'names': 'Travel'})
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Parameter names should be a list.', str(res.data))
+
+    def test_batch_delete_bucketlists(self):
+        """Test if many bucketlists, with their items, can be deleted in one request"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/batch',
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'names': ['Travel', 'Food', 'Sports']}),
+            content_type='application/json')
+        ids = [item['id'] for item in json.loads(res.data.decode())['items']]
+
+        res = self.client().post(
+            '/api/v1/bucketlists/{}/items/'.format(ids[0]),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Visit Paris'})
+        self.assertEqual(res.status_code, 201)
+
+        res = self.client().delete(
+            '/api/v1/bucketlists/batch',
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'ids': [ids[0], ids[1], 12345]}),
+            content_type='application/json')
+        self.assertEqual(res.status_code, 200)
+        results = json.loads(res.data.decode())['items']
+        self.assertEqual([item['status'] for item in results], [200, 200, 404])
+
+        res = self.client().get(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token))
+        results = json.loads(res.data.decode())
+        self.assertEqual(results['total_items'], 1)
+        self.assertEqual(results['items'][0]['name'], 'Sports')
+
+    def test_batch_delete_bucketlists_of_other_users(self):
+        """Test that the bucketlists of other users are not deleted"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Travel'})
+        bucketlist_id = json.loads(res.data.decode())['id']
+
+        self.register_user(email="other@test.com")
+        result = self.login_user(email="other@test.com")
+        other_access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().delete(
+            '/api/v1/bucketlists/batch',
+            headers=dict(Authorization="Bearer " + other_access_token),
+            data=json.dumps({'ids': [bucketlist_id]}),
+            content_type='application/json')
+        self.assertEqual(json.loads(res.data.decode())['items'][0]['status'], 404)
+
+        res = self.client().get(
+            '/api/v1/bucketlists/{}'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+
+    def test_batch_delete_with_boolean_ids(self):
+        """Test that true in the ids is not taken for the id 1"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Travel'})
+        self.assertEqual(json.loads(res.data.decode())['id'], 1)
+
+        res = self.client().delete(
+            '/api/v1/bucketlists/batch',
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'ids': [True, 1]}),
+            content_type='application/json')
+        results = json.loads(res.data.decode())['items']
+        self.assertEqual([item['status'] for item in results], [404, 200])
+
+    def test_batch_create_racing_another_request(self):
+        """Test that names created by another request after they were looked for are reported as duplicates"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Travel'})
+
+        # the other request commits between the lookup of the names and the insert
+        with mock.patch.object(Bucketlist, 'existing_names', return_value=set()):
+            res = self.client().post(
+                '/api/v1/bucketlists/batch',
+                headers=dict(Authorization="Bearer " + access_token),
+                data=json.dumps({'names': ['Travel', 'Food']}),
+                content_type='application/json')
+        self.assertEqual(res.status_code, 200)
+        results = json.loads(res.data.decode())['items']
+        self.assertEqual([item['status'] for item in results], [409, 201])
+
+    def test_create_racing_another_request(self):
+        """Test that a name created by another request after it was looked for gives a 409, not a 500"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Travel'})
+
+        # the lookup of the name doesn't find the bucketlist the other request created
+        with self.app.app_context(), mock.patch.object(Bucketlist, 'query') as query:
+            query.filter_by.return_value.first.return_value = None
+            res = self.client().post(
+                '/api/v1/bucketlists/',
+                headers=dict(Authorization="Bearer " + access_token),
+                data={'name': 'Travel'})
+        self.assertEqual(res.status_code, 409)
+        self.assertIn('Bucketlist with this name already exists.', str(res.data))
+
+    def test_batch_with_no_header(self):
+        """Test what message is displayed when no header is provided"""
+        res = self.client().post(
+            '/api/v1/bucketlists/batch',
+            headers=dict(),
+            data=json.dumps({'names': ['Travel']}),
+            content_type='application/json')
+        self.assertEqual(res.status_code, 401)
+        self.assertIn('Header with key Authorization missing.', str(res.data))
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            # drop all tables
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+
+    if __name__ == "__main__":
+        unittest.main()
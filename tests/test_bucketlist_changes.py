@@ -0,0 +1,321 @@
+import unittest
+import json
+from app import create_app, db
+from app.models import User, Bucketlist
+
+
+class BucketlistChangesTestCase(unittest.TestCase):
+    """This class represents the feed of changes of the bucketlists test case"""
+
+    def setUp(self):
+        """
+        Initialize the app and its test client and our test database
+        :return:
+        """
+        self.app = create_app(config_name="testing")
+        self.client = self.app.test_client
+
+        # binds the app to the current context
+        with self.app.app_context():
+            # create all tables
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+
+    def register_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help register a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('/api/v1/auth/register', data=user_data)
+
+    def login_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help login a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('api/v1/auth/login', data=user_data)
+
+    def get_changes(self, access_token, since=None, limit=None):
+        """
+        Helper method to get the changes since a position in the feed
+        :param access_token:
+        :param since:
+        :param limit:
+        :return:
+        """
+        query_string = {}
+        if since is not None:
+            query_string['since'] = since
+        if limit is not None:
+            query_string['limit'] = limit
+        return self.client().get(
+            '/api/v1/bucketlists/changes',
+            headers=dict(Authorization="Bearer " + access_token),
+            query_string=query_string)
+
+    def test_changes_of_created_bucketlists_and_items(self):
+        """
+        Test if the bucketlists and items created are in the feed of changes, and nothing after next_since
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Visit the Grand canyon'})
+        bucketlist_id = json.loads(res.data.decode())['id']
+        self.client().post(
+            '/api/v1/bucketlists/{}/items/'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Go camping'})
+
+        res = self.get_changes(access_token)
+        self.assertEqual(res.status_code, 200)
+        results = json.loads(res.data.decode())
+        self.assertEqual([bucketlist['id'] for bucketlist in results['bucketlists']], [bucketlist_id])
+        # adding the item changed the item count of the bucketlist
+        self.assertEqual(results['bucketlists'][0]['item_count'], 1)
+        self.assertEqual([item['name'] for item in results['items']], ['Go camping'])
+        self.assertEqual(results['deleted'], [])
+        self.assertFalse(results['has_more'])
+
+        res = self.get_changes(access_token, since=results['next_since'])
+        results_after = json.loads(res.data.decode())
+        self.assertEqual(results_after['bucketlists'], [])
+        self.assertEqual(results_after['items'], [])
+        self.assertEqual(results_after['next_since'], results['next_since'])
+
+    def test_changes_of_edited_item(self):
+        """
+        Test if only an edited item is returned since the last position in the feed
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Visit the Grand canyon'})
+        bucketlist_id = json.loads(res.data.decode())['id']
+        for name in ('Go camping', 'Go hiking'):
+            res = self.client().post(
+                '/api/v1/bucketlists/{}/items/'.format(bucketlist_id),
+                headers=dict(Authorization="Bearer " + access_token),
+                data={'name': name})
+        item_id = json.loads(res.data.decode())['id']
+
+        since = json.loads(self.get_changes(access_token).data.decode())['next_since']
+
+        res = self.client().patch(
+            '/api/v1/bucketlists/{}/items/{}'.format(bucketlist_id, item_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Go hiking in the canyon'})
+        self.assertEqual(res.status_code, 200)
+
+        results = json.loads(self.get_changes(access_token, since=since).data.decode())
+        self.assertEqual([item['name'] for item in results['items']], ['Go hiking in the canyon'])
+        self.assertEqual(results['bucketlists'], [])
+        self.assertNotEqual(results['next_since'], since)
+        self.assertEqual(results['items'][0]['position'], results['next_since'])
+
+    def test_changes_of_deleted_bucketlist_and_item(self):
+        """
+        Test if deleted items and bucketlists are returned as tombstones, without one for each item of a bucketlist
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Visit the Grand canyon'})
+        bucketlist_id = json.loads(res.data.decode())['id']
+        item_ids = []
+        for name in ('Go camping', 'Go hiking'):
+            res = self.client().post(
+                '/api/v1/bucketlists/{}/items/'.format(bucketlist_id),
+                headers=dict(Authorization="Bearer " + access_token),
+                data={'name': name})
+            item_ids.append(json.loads(res.data.decode())['id'])
+
+        since = json.loads(self.get_changes(access_token).data.decode())['next_since']
+
+        res = self.client().delete(
+            '/api/v1/bucketlists/{}/items/{}'.format(bucketlist_id, item_ids[0]),
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+        res = self.client().delete(
+            '/api/v1/bucketlists/{}'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+
+        results = json.loads(self.get_changes(access_token, since=since).data.decode())
+        self.assertEqual([(deleted['type'], deleted['id']) for deleted in results['deleted']],
+                         [('item', item_ids[0]), ('bucketlist', bucketlist_id)])
+
+    def test_changes_are_paged(self):
+        """
+        Test if following next_since while has_more is true returns every change once
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        names = ['Bucketlist {}'.format(number) for number in range(5)]
+        res = self.client().post(
+            '/api/v1/bucketlists/batch',
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'names': names}),
+            content_type='application/json')
+        self.assertEqual(res.status_code, 200)
+
+        seen = []
+        since = 0
+        has_more = True
+        while has_more:
+            results = json.loads(self.get_changes(access_token, since=since, limit=2).data.decode())
+            self.assertLessEqual(len(results['bucketlists']), 2)
+            seen += [bucketlist['name'] for bucketlist in results['bucketlists']]
+            since = results['next_since']
+            has_more = results['has_more']
+        self.assertEqual(sorted(seen), sorted(names))
+
+    def test_changes_of_other_user_are_hidden(self):
+        """
+        Test that the changes of another user are not in the feed, even once the other user is deleted
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        self.register_user(email="other@test.com")
+        result = self.login_user(email="other@test.com")
+        other_access_token = json.loads(result.data.decode())['access_token']
+
+        self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + other_access_token),
+            data={'name': 'Visit the Grand canyon'})
+
+        results = json.loads(self.get_changes(access_token).data.decode())
+        self.assertEqual(results['bucketlists'], [])
+        self.assertEqual(results['next_since'], '0-0-0')
+
+        with self.app.app_context():
+            db.session.execute(User.__table__.delete().where(User.email == "other@test.com"))
+            db.session.commit()
+
+        results = json.loads(self.get_changes(access_token).data.decode())
+        self.assertEqual(results['deleted'], [])
+
+    def test_changes_committed_out_of_order(self):
+        """
+        Test that a change committed behind a transaction that started writing earlier is not skipped
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        with self.app.app_context():
+            user_id = User.query.filter_by(email="user@test.com").first().id
+            first, second = db.engine.connect(), db.engine.connect()
+            first_transaction = first.begin()
+            second_transaction = second.begin()
+            try:
+                # the first transaction writes, then the second one writes and commits before it
+                first.execute(Bucketlist.__table__.insert().values(name='First', created_by=user_id))
+                second.execute(Bucketlist.__table__.insert().values(name='Second', created_by=user_id))
+                second_transaction.commit()
+
+                # the committed change waits for the older transaction, a client can't move past the first one
+                results = json.loads(self.get_changes(access_token).data.decode())
+                self.assertEqual(results['bucketlists'], [])
+                since = results['next_since']
+
+                first_transaction.commit()
+            finally:
+                first.close()
+                second.close()
+
+        results = json.loads(self.get_changes(access_token, since=since).data.decode())
+        self.assertEqual([bucketlist['name'] for bucketlist in results['bucketlists']], ['First', 'Second'])
+
+    def test_changes_with_sequence_out_of_order(self):
+        """
+        Test that a change taking a lower change_seq than one already returned still comes in the feed
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        with self.app.app_context():
+            user_id = User.query.filter_by(email="user@test.com").first().id
+            first, second = db.engine.connect(), db.engine.connect()
+            first_transaction = first.begin()
+            second_transaction = second.begin()
+            try:
+                # the first transaction starts first but takes its change_seq after the second one
+                first.execute('SELECT txid_current()')
+                second.execute(Bucketlist.__table__.insert().values(name='Second', created_by=user_id))
+                first.execute(Bucketlist.__table__.insert().values(name='First', created_by=user_id))
+                first_transaction.commit()
+
+                results = json.loads(self.get_changes(access_token).data.decode())
+                self.assertEqual([bucketlist['name'] for bucketlist in results['bucketlists']], ['First'])
+                since = results['next_since']
+
+                second_transaction.commit()
+            finally:
+                first.close()
+                second.close()
+
+        results = json.loads(self.get_changes(access_token, since=since).data.decode())
+        self.assertEqual([bucketlist['name'] for bucketlist in results['bucketlists']], ['Second'])
+
+    def test_changes_with_invalid_since(self):
+        """
+        Test what is displayed when since is not a position in the feed
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.get_changes(access_token, since='yesterday')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Parameter since should be a position in the feed of changes.', str(res.data))
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            # drop all tables
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+
+    if __name__ == "__main__":
+        unittest.main()
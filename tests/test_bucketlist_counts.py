@@ -0,0 +1,219 @@
+import unittest
+import json
+from app import create_app, db
+from app.models import Bucketlist, install_triggers
+
+
+class BucketlistCountsTestCase(unittest.TestCase):
+    """This class represents the test case for the item counts of the bucketlists"""
+
+    def setUp(self):
+        """
+        Initialize the app and its test client and our test database
+        :return:
+        """
+        self.app = create_app(config_name="testing")
+        self.client = self.app.test_client
+
+        # binds the app to the current context
+        with self.app.app_context():
+            # create all tables
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+
+    def register_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help register a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('/api/v1/auth/register', data=user_data)
+
+    def login_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help login a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('api/v1/auth/login', data=user_data)
+
+    def get_counts(self, access_token, bucketlist_id):
+        """
+        Helper method to get the item counts of a bucketlist from its detail
+        :param access_token:
+        :param bucketlist_id:
+        :return: item_count and done_count
+        """
+        res = self.client().get(
+            '/api/v1/bucketlists/{}'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+        results = json.loads(res.data.decode())
+        return results['item_count'], results['done_count']
+
+    def test_counts_follow_item_changes(self):
+        """Test if the counts are updated when items are added, marked as done and deleted"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Travel'})
+        self.assertEqual(res.status_code, 201)
+        results = json.loads(res.data.decode())
+        self.assertEqual((results['item_count'], results['done_count']), (0, 0))
+        bucketlist_id = results['id']
+
+        # one item added on its own and two in a batch
+        res = self.client().post(
+            '/api/v1/bucketlists/{}/items/'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Visit Paris'})
+        item_id = json.loads(res.data.decode())['id']
+        self.client().post(
+            '/api/v1/bucketlists/{}/items/batch'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'names': ['Visit Rome', 'Visit Oslo']}),
+            content_type='application/json')
+        self.assertEqual(self.get_counts(access_token, bucketlist_id), (3, 0))
+
+        # mark one item as done, then all of them
+        self.client().patch(
+            '/api/v1/bucketlists/{}/items/{}'.format(bucketlist_id, item_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'done': 'true'})
+        self.assertEqual(self.get_counts(access_token, bucketlist_id), (3, 1))
+        self.client().put(
+            '/api/v1/bucketlists/{}/items/batch'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'all': True, 'done': True}),
+            content_type='application/json')
+        self.assertEqual(self.get_counts(access_token, bucketlist_id), (3, 3))
+
+        # renaming an item doesn't change the counts
+        self.client().patch(
+            '/api/v1/bucketlists/{}/items/{}'.format(bucketlist_id, item_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Visit Paris in spring'})
+        self.assertEqual(self.get_counts(access_token, bucketlist_id), (3, 3))
+
+        res = self.client().delete(
+            '/api/v1/bucketlists/{}/items/{}'.format(bucketlist_id, item_id),
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.get_counts(access_token, bucketlist_id), (2, 2))
+
+        # the counts are in the listing as well
+        res = self.client().get(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token))
+        results = json.loads(res.data.decode())['items'][0]
+        self.assertEqual((results['item_count'], results['done_count']), (2, 2))
+
+    def test_repair_counts(self):
+        """Test if the counts of every bucketlist can be recomputed from its items"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Travel'})
+        bucketlist_id = json.loads(res.data.decode())['id']
+        self.client().post(
+            '/api/v1/bucketlists/{}/items/batch'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'names': ['Visit Rome', 'Visit Oslo']}),
+            content_type='application/json')
+
+        with self.app.app_context():
+            # break the counts, as if the triggers had been missing
+            db.session.execute(Bucketlist.__table__.update().values(item_count=7, done_count=5))
+            db.session.commit()
+            self.assertEqual(Bucketlist.repair_counts(), 1)
+            # reinstalling the triggers keeps them working
+            install_triggers()
+            db.session.commit()
+
+        self.assertEqual(self.get_counts(access_token, bucketlist_id), (2, 0))
+
+    def test_install_triggers_upgrades_an_old_schema(self):
+        """Test if a database created before the counts, the feed of changes and the cascades is brought up to date"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Travel'})
+        bucketlist_id = json.loads(res.data.decode())['id']
+        self.client().post(
+            '/api/v1/bucketlists/{}/items/batch'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'names': ['Visit Rome', 'Visit Oslo']}),
+            content_type='application/json')
+
+        with self.app.app_context():
+            # the tables as they were first created
+            for statement in (
+                    "DROP TABLE tombstones",
+                    "ALTER TABLE bucketlist_items DROP COLUMN change_seq, DROP COLUMN change_txid, "
+                    "DROP CONSTRAINT uq_bucketlist_items_belongs_to_name, DROP CONSTRAINT bucketlist_items_belongs_to_fkey, "
+                    "ADD FOREIGN KEY (belongs_to) REFERENCES bucketlists (id)",
+                    "ALTER TABLE bucketlists DROP COLUMN change_seq, DROP COLUMN change_txid, DROP COLUMN item_count, "
+                    "DROP COLUMN done_count, DROP CONSTRAINT uq_bucketlists_created_by_name, "
+                    "DROP CONSTRAINT bucketlists_created_by_fkey, ADD FOREIGN KEY (created_by) REFERENCES users (id)"):
+                db.session.execute(statement)
+            db.session.commit()
+
+            install_triggers()
+            self.assertEqual(Bucketlist.repair_counts(), 1)
+            # running it again changes nothing
+            install_triggers()
+            db.session.commit()
+            self.assertEqual(db.session.execute(
+                "SELECT conname, confdeltype FROM pg_constraint WHERE contype = 'f' "
+                "AND conrelid IN ('bucketlists'::regclass, 'bucketlist_items'::regclass) ORDER BY conname").fetchall(),
+                [('bucketlist_items_belongs_to_fkey', 'c'), ('bucketlists_created_by_fkey', 'c')])
+            db.session.remove()
+
+        self.assertEqual(self.get_counts(access_token, bucketlist_id), (2, 0))
+        res = self.client().get(
+            '/api/v1/bucketlists/changes',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(len(json.loads(res.data.decode())['items']), 2)
+
+        # the items go with their bucketlist through the cascade, its tombstone covering them in the feed
+        res = self.client().delete(
+            '/api/v1/bucketlists/{}'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+        with self.app.app_context():
+            self.assertEqual(db.session.execute('SELECT count(*) FROM bucketlist_items').scalar(), 0)
+            self.assertEqual(db.session.execute('SELECT count(*) FROM tombstones').scalar(), 1)
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            # drop all tables
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+
+    if __name__ == "__main__":
+        unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 import json
+from sqlalchemy import event
 from app import create_app, db
 
 
@@ -65,6 +66,39 @@ class BucketlistCreationTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 201)
         self.assertIn('Go to Grand canyon', str(res.data))
 
+    def test_bucketlist_creation_does_not_reload_the_bucketlist(self):
+        """
+        Test that the created bucketlist is returned without querying it again after saving it
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        statements = []
+
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with self.app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', count_statement)
+        try:
+            res = self.client().post(
+                '/api/v1/bucketlists/',
+                headers=dict(Authorization="Bearer " + access_token),
+                data=self.bucketlist)
+        finally:
+            event.remove(engine, 'before_cursor_execute', count_statement)
+
+        self.assertEqual(res.status_code, 201)
+        results = json.loads(res.data.decode())
+        self.assertIsNotNone(results['date_created'])
+        self.assertIsNotNone(results['date_modified'])
+        # the duplicate name check and the insert, which returns the generated columns
+        self.assertEqual(len(statements), 2)
+        self.assertIn('RETURNING', statements[1])
+
     def test_bucketlist_creation_with_no_auth_header(self):
         """
         Test what message is displayed when no header is provided
@@ -1,6 +1,7 @@
 import unittest
 import json
 from app import create_app, db
+from app.models import User, Bucketlist, BucketlistItem
 
 
 class BucketlistDeletionTestCase(unittest.TestCase):
@@ -77,6 +78,67 @@ class BucketlistDeletionTestCase(unittest.TestCase):
             headers=dict(Authorization="Bearer " + access_token))
         self.assertEqual(result.status_code, 404)
 
+    def test_bucketlist_deletion_deletes_its_items(self):
+        """
+        Test if the items of a deleted bucketlist are deleted too
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Visit the Grand Canyon!'})
+        self.assertEqual(res.status_code, 201)
+        results = json.loads(res.data.decode())
+
+        res = self.client().post(
+            '/api/v1/bucketlists/{}/items/'.format(results['id']),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Go camping'})
+        self.assertEqual(res.status_code, 201)
+
+        res = self.client().delete(
+            '/api/v1/bucketlists/{}'.format(results['id']),
+            headers=dict(Authorization="Bearer " + access_token), )
+        self.assertEqual(res.status_code, 200)
+
+        # deleting it again should return a 404
+        res = self.client().delete(
+            '/api/v1/bucketlists/{}'.format(results['id']),
+            headers=dict(Authorization="Bearer " + access_token), )
+        self.assertEqual(res.status_code, 404)
+
+        with self.app.app_context():
+            self.assertEqual(BucketlistItem.query.count(), 0)
+
+    def test_user_deletion_cascades_in_the_database(self):
+        """
+        Test if deleting a user in the database deletes their bucketlists and items
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Visit the Grand Canyon!'})
+        results = json.loads(res.data.decode())
+        self.client().post(
+            '/api/v1/bucketlists/{}/items/'.format(results['id']),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Go camping'})
+
+        with self.app.app_context():
+            db.session.execute(User.__table__.delete())
+            db.session.commit()
+            self.assertEqual(Bucketlist.query.count(), 0)
+            self.assertEqual(BucketlistItem.query.count(), 0)
+
     def test_single_bucketlist_delete_with_no_auth_header(self):
         """
         Test what message is displayed when no header is provided
@@ -0,0 +1,275 @@
+import unittest
+import json
+import threading
+import time
+from app import create_app, db
+from app.models import User, Bucketlist
+from instance.config import Config
+
+
+class BucketlistEventsTestCase(unittest.TestCase):
+    """This class represents the server-sent events of the changes to the bucketlists test case"""
+
+    def setUp(self):
+        """
+        Initialize the app and its test client and our test database
+        :return:
+        """
+        self.app = create_app(config_name="testing")
+        self.client = self.app.test_client
+
+        # binds the app to the current context
+        with self.app.app_context():
+            # create all tables
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+
+    def register_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help register a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('/api/v1/auth/register', data=user_data)
+
+    def login_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help login a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('api/v1/auth/login', data=user_data)
+
+    def create_bucketlist(self, access_token, name='Visit the Grand canyon'):
+        """
+        Helper method to create a bucketlist
+        :param access_token:
+        :param name:
+        :return: the id of the bucketlist
+        """
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': name})
+        return json.loads(res.data.decode())['id']
+
+    def open_events(self, access_token, headers=None, since=None):
+        """
+        Helper method to open the stream of events
+        :param access_token:
+        :param headers:
+        :param since:
+        :return: the response and an iterator on its events
+        """
+        headers = dict(headers or {}, Authorization="Bearer " + access_token)
+        query_string = {'since': since} if since is not None else {}
+        res = self.client().get('/api/v1/bucketlists/events', headers=headers, query_string=query_string,
+                                buffered=False)
+        return res, iter(res.response)
+
+    def parse_event(self, chunk):
+        """
+        Helper method to read the fields of an event
+        :param chunk:
+        :return: dict of the fields
+        """
+        if isinstance(chunk, bytes):
+            chunk = chunk.decode()
+        fields = {}
+        for line in chunk.strip().split('\n'):
+            key, _, value = line.partition(':')
+            fields[key] = value.strip()
+        return fields
+
+    def test_events_of_existing_changes(self):
+        """
+        Test if the changes made before opening the stream are sent first, with their position in the feed as id
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        bucketlist_id = self.create_bucketlist(access_token)
+        self.client().post(
+            '/api/v1/bucketlists/{}/items/'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Go camping'})
+
+        res, events = self.open_events(access_token)
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('text/event-stream', res.headers['Content-Type'])
+        first = self.parse_event(next(events))
+        second = self.parse_event(next(events))
+        res.close()
+
+        self.assertEqual(first['event'], 'item')
+        self.assertEqual(json.loads(first['data'])['name'], 'Go camping')
+        # adding the item changed the item count of the bucketlist after the item was created
+        self.assertEqual(second['event'], 'bucketlist')
+        self.assertEqual(json.loads(second['data'])['item_count'], 1)
+        self.assertEqual(json.loads(second['data'])['position'], second['id'])
+        self.assertLess([int(part) for part in first['id'].split('-')], [int(part) for part in second['id'].split('-')])
+
+    def test_events_resume_from_last_event_id(self):
+        """
+        Test if a client reconnecting with Last-Event-ID only gets the changes after it
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        self.create_bucketlist(access_token)
+
+        res, events = self.open_events(access_token)
+        last_event_id = self.parse_event(next(events))['id']
+        res.close()
+
+        self.create_bucketlist(access_token, name='See the Mona Lisa')
+
+        res, events = self.open_events(access_token, headers={'Last-Event-ID': last_event_id})
+        event = self.parse_event(next(events))
+        res.close()
+        self.assertEqual(json.loads(event['data'])['name'], 'See the Mona Lisa')
+
+    def test_events_committed_out_of_order(self):
+        """
+        Test if a change committed behind an older transaction is sent once that transaction is over, even when it
+        doesn't notify the stream, and to a client reconnecting from a position taken meanwhile
+        :return:
+        """
+        self.register_user()
+        self.register_user(email="other@test.com")
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        with self.app.app_context():
+            user_id = User.query.filter_by(email="user@test.com").first().id
+            other_user_id = User.query.filter_by(email="other@test.com").first().id
+            first, second = db.engine.connect(), db.engine.connect()
+        first_transaction = first.begin()
+        second_transaction = second.begin()
+        try:
+            # the older transaction writes for another user, its commit wakes up no stream of this user
+            first.execute(Bucketlist.__table__.insert().values(name='First', created_by=other_user_id))
+            second.execute(Bucketlist.__table__.insert().values(name='Second', created_by=user_id))
+            second_transaction.commit()
+
+            res = self.client().get(
+                '/api/v1/bucketlists/changes',
+                headers=dict(Authorization="Bearer " + access_token))
+            since = json.loads(res.data.decode())['next_since']
+
+            res, events = self.open_events(access_token)
+
+            def commit_later():
+                time.sleep(0.5)
+                first_transaction.commit()
+
+            thread = threading.Thread(target=commit_later)
+            thread.start()
+            started = time.time()
+            event = self.parse_event(next(events))
+            waited = time.time() - started
+            thread.join()
+            res.close()
+        finally:
+            first.close()
+            second.close()
+
+        self.assertEqual(json.loads(event['data'])['name'], 'Second')
+        # the held back change is checked again soon, not after the poll interval
+        self.assertLess(waited, Config.CHANGE_EVENTS_POLL_INTERVAL)
+
+        # a client reconnecting from the position it had while the change was held back still gets it
+        res, events = self.open_events(access_token, headers={'Last-Event-ID': since})
+        event = self.parse_event(next(events))
+        res.close()
+        self.assertEqual(json.loads(event['data'])['name'], 'Second')
+
+    def test_events_are_pushed(self):
+        """
+        Test if a change committed while the stream is open is pushed to it
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res, events = self.open_events(access_token)
+
+        def create_later():
+            time.sleep(0.5)
+            self.create_bucketlist(access_token, name='See the Mona Lisa')
+
+        thread = threading.Thread(target=create_later)
+        thread.start()
+        event = self.parse_event(next(events))
+        thread.join()
+        res.close()
+        self.assertEqual(event['event'], 'bucketlist')
+        self.assertEqual(json.loads(event['data'])['name'], 'See the Mona Lisa')
+
+    def test_events_heartbeat(self):
+        """
+        Test if a heartbeat is sent while nothing changes
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        heartbeat = Config.CHANGE_EVENTS_HEARTBEAT
+        Config.CHANGE_EVENTS_HEARTBEAT = 0.1
+        try:
+            res, events = self.open_events(access_token)
+            chunk = next(events)
+            res.close()
+        finally:
+            Config.CHANGE_EVENTS_HEARTBEAT = heartbeat
+        self.assertIn(': heartbeat', chunk.decode() if isinstance(chunk, bytes) else chunk)
+
+    def test_events_with_invalid_last_event_id(self):
+        """
+        Test what is displayed when Last-Event-ID is not a position in the feed
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().get(
+            '/api/v1/bucketlists/events',
+            headers={'Authorization': "Bearer " + access_token, 'Last-Event-ID': 'abc'})
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Parameter since should be a position in the feed of changes.', str(res.data))
+
+    def test_events_with_no_auth_header(self):
+        """
+        Test what message is displayed when no header is provided
+        :return:
+        """
+        res = self.client().get('/api/v1/bucketlists/events')
+        self.assertEqual(res.status_code, 401)
+        self.assertIn('Header with key Authorization missing.', str(res.data))
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            # drop all tables
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+
+    if __name__ == "__main__":
+        unittest.main()
@@ -0,0 +1,237 @@
+import unittest
+import json
+from app import create_app, db
+
+
+class BucketlistItemBatchTestCase(unittest.TestCase):
+    """This class represents the test case for creating, updating and deleting bucketlist items in batches"""
+
+    def setUp(self):
+        """
+        Initialize the app and its test client and our test database
+        :return:
+        """
+        self.app = create_app(config_name="testing")
+        self.client = self.app.test_client
+
+        # binds the app to the current context
+        with self.app.app_context():
+            # create all tables
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+
+    def register_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help register a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('/api/v1/auth/register', data=user_data)
+
+    def login_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help login a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('api/v1/auth/login', data=user_data)
+
+    def create_bucketlist_with_items(self, access_token, name, item_names):
+        """
+        Helper method to create a bucketlist and add items to it
+        :param access_token:
+        :param name:
+        :param item_names:
+        :return: the id of the created bucketlist
+        """
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': name})
+        self.assertEqual(res.status_code, 201)
+        bucketlist_id = json.loads(res.data.decode())['id']
+
+        for item_name in item_names:
+            res = self.client().post(
+                '/api/v1/bucketlists/{}/items/'.format(bucketlist_id),
+                headers=dict(Authorization="Bearer " + access_token),
+                data={'name': item_name})
+            self.assertEqual(res.status_code, 201)
+        return bucketlist_id
+
+    def test_batch_create_bucketlist_items(self):
+        """Test if many items can be added to a bucketlist in one request"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        bucketlist_id = self.create_bucketlist_with_items(access_token, 'Travel', ['Visit Paris'])
+
+        res = self.client().post(
+            '/api/v1/bucketlists/{}/items/batch'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'names': ['Visit Rome', 'Visit Paris', '', 'Visit Oslo']}),
+            content_type='application/json')
+        self.assertEqual(res.status_code, 200)
+        results = json.loads(res.data.decode())['items']
+        self.assertEqual([item['status'] for item in results], [201, 409, 400, 201])
+        self.assertEqual(results[0]['belongs_to'], bucketlist_id)
+        self.assertFalse(results[3]['done'])
+
+        res = self.client().get(
+            '/api/v1/items',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(len(json.loads(res.data.decode())['items']), 3)
+
+    def test_batch_create_reports_item_names_too_long(self):
+        """Test that an item name longer than the column fails on its own, the other items being created"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        bucketlist_id = self.create_bucketlist_with_items(access_token, 'Travel', [])
+
+        res = self.client().post(
+            '/api/v1/bucketlists/{}/items/batch'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'names': ['a' * 300, 'Visit Rome']}),
+            content_type='application/json')
+        self.assertEqual(res.status_code, 200)
+        results = json.loads(res.data.decode())['items']
+        self.assertEqual([item['status'] for item in results], [400, 201])
+        self.assertIn('at most 255 characters', results[0]['message'])
+
+        res = self.client().get(
+            '/api/v1/items',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(len(json.loads(res.data.decode())['items']), 1)
+
+    def test_batch_mark_bucketlist_items_done(self):
+        """Test if a list of items of a bucketlist can be marked as done"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        bucketlist_id = self.create_bucketlist_with_items(access_token, 'Travel', ['Visit Paris', 'Visit Rome'])
+
+        res = self.client().get(
+            '/api/v1/items?q=Paris',
+            headers=dict(Authorization="Bearer " + access_token))
+        item_id = json.loads(res.data.decode())['items'][0]['id']
+
+        res = self.client().put(
+            '/api/v1/bucketlists/{}/items/batch'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'ids': [item_id, 12345], 'done': True}),
+            content_type='application/json')
+        self.assertEqual(res.status_code, 200)
+        results = json.loads(res.data.decode())['items']
+        self.assertEqual([item['status'] for item in results], [200, 404])
+
+        res = self.client().get(
+            '/api/v1/items?done=true',
+            headers=dict(Authorization="Bearer " + access_token))
+        results = json.loads(res.data.decode())['items']
+        self.assertEqual([item['name'] for item in results], ['Visit Paris'])
+
+    def test_batch_mark_all_bucketlist_items_done(self):
+        """Test if all the items of a bucketlist can be marked as done"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        bucketlist_id = self.create_bucketlist_with_items(access_token, 'Travel', ['Visit Paris', 'Visit Rome'])
+        self.create_bucketlist_with_items(access_token, 'Food', ['Eat crepes'])
+
+        res = self.client().put(
+            '/api/v1/bucketlists/{}/items/batch'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'all': True, 'done': True}),
+            content_type='application/json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(json.loads(res.data.decode())['items']), 2)
+
+        res = self.client().get(
+            '/api/v1/items?done=false',
+            headers=dict(Authorization="Bearer " + access_token))
+        results = json.loads(res.data.decode())['items']
+        self.assertEqual([item['name'] for item in results], ['Eat crepes'])
+
+    def test_batch_mark_done_with_no_done_parameter(self):
+        """Test what message is displayed when done is not provided"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        bucketlist_id = self.create_bucketlist_with_items(access_token, 'Travel', ['Visit Paris'])
+
+        res = self.client().put(
+            '/api/v1/bucketlists/{}/items/batch'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'all': True}),
+            content_type='application/json')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Parameter done should be true or false.', str(res.data))
+
+    def test_batch_delete_bucketlist_items(self):
+        """Test if many items of a bucketlist can be deleted in one request"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        bucketlist_id = self.create_bucketlist_with_items(
+            access_token, 'Travel', ['Visit Paris', 'Visit Rome', 'Visit Oslo'])
+
+        res = self.client().get(
+            '/api/v1/items',
+            headers=dict(Authorization="Bearer " + access_token))
+        ids = [item['id'] for item in json.loads(res.data.decode())['items']]
+
+        res = self.client().delete(
+            '/api/v1/bucketlists/{}/items/batch'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'ids': ids[:2] + ['abc']}),
+            content_type='application/json')
+        self.assertEqual(res.status_code, 200)
+        results = json.loads(res.data.decode())['items']
+        self.assertEqual([item['status'] for item in results], [200, 200, 404])
+
+        res = self.client().get(
+            '/api/v1/items',
+            headers=dict(Authorization="Bearer " + access_token))
+        results = json.loads(res.data.decode())['items']
+        self.assertEqual([item['name'] for item in results], ['Visit Oslo'])
+
+    def test_batch_items_in_bucketlist_of_other_user(self):
+        """Test that items can't be added in bulk to the bucketlist of another user"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        bucketlist_id = self.create_bucketlist_with_items(access_token, 'Travel', [])
+
+        self.register_user(email="other@test.com")
+        result = self.login_user(email="other@test.com")
+        other_access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/{}/items/batch'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + other_access_token),
+            data=json.dumps({'names': ['Visit Rome']}),
+            content_type='application/json')
+        self.assertEqual(res.status_code, 404)
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            # drop all tables
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+
+    if __name__ == "__main__":
+        unittest.main()
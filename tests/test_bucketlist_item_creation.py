@@ -73,6 +73,36 @@ class BucketlistItemCreationTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 201)
         self.assertIn('Eat fried', str(res.data))
 
+    def test_list_bucketlist_items(self):
+        """
+        Test if the items of a bucketlist are listed in the order they were created
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data=self.bucketlist)
+        self.assertEqual(res.status_code, 201)
+        results = json.loads(res.data.decode())
+
+        for name in ("Eat fried crabs", "Swim in the lake"):
+            res = self.client().post(
+                '/api/v1/bucketlists/{}/items/'.format(results['id']),
+                headers=dict(Authorization="Bearer " + access_token),
+                data={"name": name})
+            self.assertEqual(res.status_code, 201)
+
+        res = self.client().get(
+            '/api/v1/bucketlists/{}/items/'.format(results['id']),
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([item['name'] for item in json.loads(res.data.decode())],
+                         ["Eat fried crabs", "Swim in the lake"])
+
     def test_create_bucketlist_item_with_no_auth_header(self):
         """
         Test what message is displayed when no header is provided
@@ -325,6 +325,158 @@ class BucketlistTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 401)
         self.assertIn('Token not provided in the header with key Authorization.', str(res.data))
 
+    def create_bucketlist_with_item(self, access_token):
+        """
+        Helper method to create a bucketlist with one item
+        :param access_token:
+        :return: the json of the bucketlist and of the item
+        """
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data=self.bucketlist)
+        self.assertEqual(res.status_code, 201)
+        results = json.loads(res.data.decode())
+
+        res = self.client().post(
+            '/api/v1/bucketlists/{}/items/'.format(results['id']),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={
+                "name": "Eat fried crabs"
+            })
+        self.assertEqual(res.status_code, 201)
+        return results, json.loads(res.data.decode())
+
+    def test_patch_bucketlist_item(self):
+        """Test if the name and the done status of a bucketlist item can be edited with a PATCH request"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        results, res_item = self.create_bucketlist_with_item(access_token)
+
+        rv = self.client().patch(
+            '/api/v1/bucketlists/{}/items/{}'.format(results['id'], res_item['id']),
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({"done": True}),
+            content_type='application/json')
+        self.assertEqual(rv.status_code, 200)
+        patched = json.loads(rv.data.decode())
+        self.assertTrue(patched['done'])
+        self.assertEqual(patched['name'], 'Eat fried crabs')
+
+        # form data sends done as a string
+        rv = self.client().patch(
+            '/api/v1/bucketlists/{}/items/{}'.format(results['id'], res_item['id']),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={"name": "Eat fried crabs mixed with honey", "done": "false"})
+        self.assertEqual(rv.status_code, 200)
+
+        results = self.client().get(
+            '/api/v1/bucketlists/{}/items/{}'.format(results['id'], res_item['id']),
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertIn('mixed with honey', str(results.data))
+        self.assertFalse(json.loads(results.data.decode())['done'])
+
+    def test_patch_bucketlist_item_with_invalid_parameters(self):
+        """Test what is displayed when a PATCH request has nothing valid to edit"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        results, res_item = self.create_bucketlist_with_item(access_token)
+
+        rv = self.client().patch(
+            '/api/v1/bucketlists/{}/items/{}'.format(results['id'], res_item['id']),
+            headers=dict(Authorization="Bearer " + access_token),
+            data=dict())
+        self.assertEqual(rv.status_code, 400)
+        self.assertIn('Parameter name or done missing.', str(rv.data))
+
+        rv = self.client().patch(
+            '/api/v1/bucketlists/{}/items/{}'.format(results['id'], res_item['id']),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={"done": "maybe"})
+        self.assertEqual(rv.status_code, 400)
+        self.assertIn('Parameter done should be true or false.', str(rv.data))
+
+    def test_patch_bucketlist_item_with_duplicate_name(self):
+        """Test what is displayed when patching a bucketlist item with a name that already exists"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        results, res_item = self.create_bucketlist_with_item(access_token)
+
+        res = self.client().post(
+            '/api/v1/bucketlists/{}/items/'.format(results['id']),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={
+                "name": "Swim with dolphins"
+            })
+        self.assertEqual(res.status_code, 201)
+
+        rv = self.client().patch(
+            '/api/v1/bucketlists/{}/items/{}'.format(results['id'], res_item['id']),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={"name": "Swim with dolphins"})
+        self.assertEqual(rv.status_code, 409)
+        self.assertIn('Bucketlist item with this name already exists in this bucketlist.', str(rv.data))
+
+    def test_patch_bucketlist_item_of_other_user(self):
+        """Test that a bucketlist item of another user can't be patched"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        results, res_item = self.create_bucketlist_with_item(access_token)
+
+        self.register_user(email="other@test.com")
+        result = self.login_user(email="other@test.com")
+        other_access_token = json.loads(result.data.decode())['access_token']
+
+        rv = self.client().patch(
+            '/api/v1/bucketlists/{}/items/{}'.format(results['id'], res_item['id']),
+            headers=dict(Authorization="Bearer " + other_access_token),
+            data={"done": "true"})
+        self.assertEqual(rv.status_code, 404)
+
+    def test_bucketlist_item_of_other_user_not_found(self):
+        """Test that a bucketlist item can't be retrieved or edited by another user"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        results, res_item = self.create_bucketlist_with_item(access_token)
+
+        self.register_user(email="other@test.com")
+        result = self.login_user(email="other@test.com")
+        other_access_token = json.loads(result.data.decode())['access_token']
+
+        rv = self.client().get(
+            '/api/v1/bucketlists/{}/items/{}'.format(results['id'], res_item['id']),
+            headers=dict(Authorization="Bearer " + other_access_token))
+        self.assertEqual(rv.status_code, 404)
+
+        rv = self.client().put(
+            '/api/v1/bucketlists/{}/items/{}'.format(results['id'], res_item['id']),
+            headers=dict(Authorization="Bearer " + other_access_token),
+            data={"name": "Eat fried crabs mixed with honey"})
+        self.assertEqual(rv.status_code, 404)
+
+    def test_bucketlist_item_in_another_bucketlist_not_found(self):
+        """Test that a bucketlist item is not found under the id of another bucketlist of the same user"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        results, res_item = self.create_bucketlist_with_item(access_token)
+
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'See the Mona Lisa'})
+        other_bucketlist = json.loads(res.data.decode())
+
+        rv = self.client().get(
+            '/api/v1/bucketlists/{}/items/{}'.format(other_bucketlist['id'], res_item['id']),
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(rv.status_code, 404)
+
     def tearDown(self):
         """teardown all initialized variables."""
         with self.app.app_context():
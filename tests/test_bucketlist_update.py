@@ -266,6 +266,102 @@ class BucketlistUpdateTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 401)
         self.assertIn('Token not provided in the header with key Authorization.', str(res.data))
 
+    def test_bucketlist_can_be_patched(self):
+        """
+        Test if the name of a bucketlist can be edited with a PATCH request
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        # first, we create a bucketlist by making a POST request
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Visit the Grand canyon'})
+        self.assertEqual(res.status_code, 201)
+        # get the json with the bucketlist
+        results = json.loads(res.data.decode())
+
+        # then, we edit the created bucketlist by making a PATCH request
+        res = self.client().patch(
+            '/api/v1/bucketlists/{}'.format(results['id']),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={
+                "name": "Must visit the Grand Canyon!"
+            })
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data.decode())['name'], 'Must visit the Grand Canyon!')
+
+        # finally, we get the edited bucketlist to see if it is actually edited.
+        results = self.client().get(
+            '/api/v1/bucketlists/{}'.format(results['id']),
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertIn('Must visit the', str(results.data))
+
+    def test_bucketlist_patch_with_duplicate_name(self):
+        """
+        Test what is displayed when patching a bucketlist with a name that already exists
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        # create two bucketlists by making POST requests
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Visit the Grand canyon'})
+        self.assertEqual(res.status_code, 201)
+        res2 = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'See the Mona Lisa'})
+        self.assertEqual(res2.status_code, 201)
+        results2 = json.loads(res2.data.decode())
+
+        # then, we give the last created bucketlist the name of the first one
+        res = self.client().patch(
+            '/api/v1/bucketlists/{}'.format(results2['id']),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Visit the Grand canyon'})
+        self.assertEqual(res.status_code, 409)
+        self.assertIn('Bucketlist with this name already exists. Choose another name.', str(res.data))
+
+        # the request can still be made after the failed update
+        res = self.client().patch(
+            '/api/v1/bucketlists/{}'.format(results2['id']),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'See the Mona Lisa in Paris'})
+        self.assertEqual(res.status_code, 200)
+
+    def test_bucketlist_patch_of_other_user(self):
+        """
+        Test that a bucketlist of another user can't be patched
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Visit the Grand canyon'})
+        results = json.loads(res.data.decode())
+
+        self.register_user(email="other@test.com")
+        result = self.login_user(email="other@test.com")
+        other_access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().patch(
+            '/api/v1/bucketlists/{}'.format(results['id']),
+            headers=dict(Authorization="Bearer " + other_access_token),
+            data={'name': 'Must visit the Grand Canyon!'})
+        self.assertEqual(res.status_code, 404)
+
     def tearDown(self):
         """teardown all initialized variables."""
         with self.app.app_context():
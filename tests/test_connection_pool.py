@@ -0,0 +1,81 @@
+import unittest
+from sqlalchemy.pool import NullPool
+from app import create_app, db
+from app.pool import MeteredQueuePool, pool_metrics
+
+
+class ConnectionPoolTestCase(unittest.TestCase):
+    """This class represents the configuration of the connection pool test case"""
+
+    def setUp(self):
+        """
+        Initialize the app and our test database
+        :return:
+        """
+        self.app = create_app(config_name="testing")
+        pool_metrics.reset()
+
+    def test_pool_is_configured_by_the_app(self):
+        """
+        Test if the pool of the engine takes its settings from the config
+        :return:
+        """
+        with self.app.app_context():
+            self.assertIsInstance(db.engine.pool, MeteredQueuePool)
+            self.assertEqual(db.engine.pool.size(), self.app.config['SQLALCHEMY_POOL_SIZE'])
+
+    def test_checkouts_are_counted(self):
+        """
+        Test if taking connections from the pool is recorded in the metrics
+        :return:
+        """
+        with self.app.app_context():
+            db.session.execute('SELECT 1')
+            db.session.remove()
+            db.session.execute('SELECT 1')
+            db.session.remove()
+            metrics = pool_metrics.snapshot(db.engine)
+        self.assertEqual(metrics['checkouts'], 2)
+        self.assertEqual(metrics['timeouts'], 0)
+        self.assertEqual(metrics['checked_out'], 0)
+
+    def test_null_pool_for_pgbouncer(self):
+        """
+        Test if no connection is kept by the workers when the pooling is left to PgBouncer
+        :return:
+        """
+        self.app.config['SQLALCHEMY_POOL_CLASS'] = 'null'
+        with self.app.app_context():
+            self.assertIsInstance(db.engine.pool, NullPool)
+            self.assertEqual(db.session.execute('SELECT 1').scalar(), 1)
+            db.session.remove()
+
+    def test_closed_connection_is_replaced(self):
+        """
+        Test if a pooled connection closed by the database is replaced when it is checked on checkout
+        :return:
+        """
+        self.app.config['SQLALCHEMY_POOL_PRE_PING'] = True
+        with self.app.app_context():
+            backend_pid = db.session.execute('SELECT pg_backend_pid()').scalar()
+            db.session.remove()
+
+            # the database closes the connection while it waits in the pool
+            other_app = create_app(config_name="testing")
+            with other_app.app_context():
+                db.session.execute('SELECT pg_terminate_backend(:pid)', {'pid': backend_pid})
+                db.session.remove()
+                db.get_engine(other_app).dispose()
+
+            self.assertNotEqual(db.session.execute('SELECT pg_backend_pid()').scalar(), backend_pid)
+            db.session.remove()
+        self.assertEqual(pool_metrics.snapshot()['invalidations'], 1)
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+    if __name__ == "__main__":
+        unittest.main()
@@ -0,0 +1,176 @@
+import unittest
+import csv
+import gzip
+import io
+import json
+from app import create_app, db
+
+
+class ExportTestCase(unittest.TestCase):
+    """This class represents the test case for exporting the bucketlists and items of a user"""
+
+    def setUp(self):
+        """
+        Initialize the app and its test client and our test database
+        :return:
+        """
+        self.app = create_app(config_name="testing")
+        self.client = self.app.test_client
+
+        # binds the app to the current context
+        with self.app.app_context():
+            # create all tables
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+
+    def register_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help register a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('/api/v1/auth/register', data=user_data)
+
+    def login_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help login a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('api/v1/auth/login', data=user_data)
+
+    def create_bucketlist_with_items(self, access_token, name, item_names):
+        """
+        Helper method to create a bucketlist and add items to it
+        :param access_token:
+        :param name:
+        :param item_names:
+        :return: the id of the created bucketlist
+        """
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': name})
+        self.assertEqual(res.status_code, 201)
+        bucketlist_id = json.loads(res.data.decode())['id']
+
+        for item_name in item_names:
+            res = self.client().post(
+                '/api/v1/bucketlists/{}/items/'.format(bucketlist_id),
+                headers=dict(Authorization="Bearer " + access_token),
+                data={'name': item_name})
+            self.assertEqual(res.status_code, 201)
+        return bucketlist_id
+
+    def test_export_ndjson(self):
+        """Test if the bucketlists and items of a user are exported as newline delimited json"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        bucketlist_id = self.create_bucketlist_with_items(access_token, 'Travel', ['Visit Paris', 'Visit Rome'])
+        self.create_bucketlist_with_items(access_token, 'Food', [])
+
+        res = self.client().get(
+            '/api/v1/export?format=ndjson',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in res.data.decode().splitlines()]
+        self.assertEqual([line['type'] for line in lines], ['bucketlist', 'item', 'item', 'bucketlist'])
+        self.assertEqual(lines[0]['name'], 'Travel')
+        self.assertEqual(lines[2]['name'], 'Visit Rome')
+        self.assertEqual(lines[2]['belongs_to'], bucketlist_id)
+        self.assertEqual(lines[3]['name'], 'Food')
+
+    def test_export_csv(self):
+        """Test if the items of a user are exported as csv with the columns of their bucketlist"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        self.create_bucketlist_with_items(access_token, 'Travel', ['Visit Paris', 'Visit Rome'])
+
+        res = self.client().get(
+            '/api/v1/export?format=csv',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(res.data.decode())))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['bucketlist_name'], 'Travel')
+        self.assertEqual(rows[1]['item_name'], 'Visit Rome')
+        self.assertEqual(rows[1]['item_done'], 'False')
+
+    def test_export_gzip(self):
+        """Test if the export is compressed when the client accepts gzip"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        self.create_bucketlist_with_items(access_token, 'Travel', ['Visit Paris'])
+
+        res = self.client().get(
+            '/api/v1/export',
+            headers={'Authorization': "Bearer " + access_token, 'Accept-Encoding': 'gzip'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(res.data).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Visit Paris', lines[1])
+
+        # a client refusing gzip gets the plain export
+        res = self.client().get(
+            '/api/v1/export',
+            headers={'Authorization': "Bearer " + access_token, 'Accept-Encoding': 'gzip;q=0, identity'})
+        self.assertNotIn('Content-Encoding', res.headers)
+        self.assertEqual(res.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(len(res.data.decode().splitlines()), 2)
+
+    def test_export_only_contains_own_bucketlists(self):
+        """Test that the bucketlists of other users are not exported"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        self.create_bucketlist_with_items(access_token, 'Travel', ['Visit Paris'])
+
+        self.register_user(email="other@test.com")
+        result = self.login_user(email="other@test.com")
+        other_access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().get(
+            '/api/v1/export',
+            headers=dict(Authorization="Bearer " + other_access_token))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data, b'')
+
+    def test_export_with_invalid_format(self):
+        """Test what message is displayed when the export format is not supported"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().get(
+            '/api/v1/export?format=xml',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Parameter format should be ndjson or csv.', str(res.data))
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            # drop all tables
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+
+    if __name__ == "__main__":
+        unittest.main()
@@ -0,0 +1,260 @@
+import unittest
+import gzip
+import json
+from unittest import mock
+from app import create_app, db
+
+
+class ImportTestCase(unittest.TestCase):
+    """This class represents the test case for importing bucketlists and items"""
+
+    def setUp(self):
+        """
+        Initialize the app and its test client and our test database
+        :return:
+        """
+        self.app = create_app(config_name="testing")
+        self.client = self.app.test_client
+
+        # binds the app to the current context
+        with self.app.app_context():
+            # create all tables
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+
+    def register_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help register a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('/api/v1/auth/register', data=user_data)
+
+    def login_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help login a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('api/v1/auth/login', data=user_data)
+
+    def create_bucketlist_with_items(self, access_token, name, item_names):
+        """
+        Helper method to create a bucketlist and add items to it
+        :param access_token:
+        :param name:
+        :param item_names:
+        :return: the id of the created bucketlist
+        """
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': name})
+        self.assertEqual(res.status_code, 201)
+        bucketlist_id = json.loads(res.data.decode())['id']
+
+        for item_name in item_names:
+            res = self.client().post(
+                '/api/v1/bucketlists/{}/items/'.format(bucketlist_id),
+                headers=dict(Authorization="Bearer " + access_token),
+                data={'name': item_name})
+            self.assertEqual(res.status_code, 201)
+        return bucketlist_id
+
+    def ndjson(self, rows):
+        """
+        Helper method to write rows as newline delimited json
+        :param rows:
+        :return: the request body
+        """
+        return '\n'.join(json.dumps(row) for row in rows) + '\n'
+
+    def test_import_bucketlists_and_items(self):
+        """Test if bucketlists and items are imported from newline delimited json"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        body = self.ndjson([
+            {'type': 'bucketlist', 'id': 7, 'name': 'Travel'},
+            {'type': 'item', 'id': 1, 'name': 'Visit Paris', 'done': True, 'belongs_to': 7},
+            {'type': 'item', 'id': 2, 'name': 'Visit Rome', 'belongs_to': 7},
+            {'type': 'item', 'id': 3, 'name': 'Eat crepes', 'belongs_to': 8},
+            {'type': 'bucketlist', 'id': 8, 'name': 'Food'},
+            {'type': 'unknown', 'id': 9, 'name': 'Something'}
+        ])
+        # the import takes one second
+        with mock.patch('app.bulk_import.time') as clock:
+            clock.time.side_effect = [100.0, 101.0]
+            res = self.client().post(
+                '/api/v1/import',
+                headers=dict(Authorization="Bearer " + access_token),
+                data=body,
+                content_type='application/x-ndjson')
+        self.assertEqual(res.status_code, 200)
+        report = json.loads(res.data.decode())
+        self.assertEqual(report['lines'], 6)
+        self.assertEqual(report['bucketlists'], {'read': 2, 'created': 2})
+        self.assertEqual(report['items'], {'read': 3, 'created': 3})
+        self.assertEqual(report['skipped'], 1)
+        # the rate is the one of the rows inserted, not of the lines read
+        self.assertEqual(report['rows_per_second'], 5)
+
+        res = self.client().get(
+            '/api/v1/bucketlists/?q=Travel',
+            headers=dict(Authorization="Bearer " + access_token))
+        bucketlist = json.loads(res.data.decode())['items'][0]
+        self.assertEqual((bucketlist['item_count'], bucketlist['done_count']), (2, 1))
+
+    def test_import_merges_with_existing_bucketlists(self):
+        """Test that imported bucketlists and items with existing names are merged and not duplicated"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Travel'})
+        bucketlist_id = json.loads(res.data.decode())['id']
+        self.client().post(
+            '/api/v1/bucketlists/{}/items/'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Visit Paris'})
+
+        body = self.ndjson([
+            {'type': 'bucketlist', 'id': 1, 'name': 'Travel'},
+            {'type': 'item', 'id': 1, 'name': 'Visit Paris', 'belongs_to': 1},
+            {'type': 'item', 'id': 2, 'name': 'Visit Rome', 'belongs_to': 1}
+        ])
+        res = self.client().post(
+            '/api/v1/import',
+            headers=dict(Authorization="Bearer " + access_token),
+            data=body,
+            content_type='application/x-ndjson')
+        self.assertEqual(res.status_code, 200)
+        report = json.loads(res.data.decode())
+        self.assertEqual(report['bucketlists']['created'], 0)
+        self.assertEqual(report['items']['created'], 1)
+
+        res = self.client().get(
+            '/api/v1/bucketlists/{}'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(json.loads(res.data.decode())['item_count'], 2)
+
+    def test_import_export_round_trip(self):
+        """Test if an export of one user can be imported, gzipped, for another user"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        res = self.client().post(
+            '/api/v1/bucketlists/batch',
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'names': ['Travel', 'Food']}),
+            content_type='application/json')
+        bucketlist_id = json.loads(res.data.decode())['items'][0]['id']
+        self.client().post(
+            '/api/v1/bucketlists/{}/items/batch'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps({'names': ['Visit Paris', 'Visit Rome']}),
+            content_type='application/json')
+        export = self.client().get(
+            '/api/v1/export',
+            headers=dict(Authorization="Bearer " + access_token)).data
+
+        self.register_user(email="other@test.com")
+        result = self.login_user(email="other@test.com")
+        other_access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/import',
+            headers={'Authorization': "Bearer " + other_access_token, 'Content-Encoding': 'gzip'},
+            data=gzip.compress(export),
+            content_type='application/x-ndjson')
+        self.assertEqual(res.status_code, 200)
+
+        res = self.client().get(
+            '/api/v1/export',
+            headers=dict(Authorization="Bearer " + other_access_token))
+        names = [json.loads(line)['name'] for line in res.data.decode().splitlines()]
+        self.assertEqual(names, ['Travel', 'Visit Paris', 'Visit Rome', 'Food'])
+
+    def test_import_with_invalid_json(self):
+        """Test that nothing is imported when a line is not valid json"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        body = self.ndjson([{'type': 'bucketlist', 'id': 1, 'name': 'Travel'}]) + '{"type": \n'
+        res = self.client().post(
+            '/api/v1/import',
+            headers=dict(Authorization="Bearer " + access_token),
+            data=body,
+            content_type='application/x-ndjson')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Invalid json on line 2.', str(res.data))
+
+        res = self.client().get(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(json.loads(res.data.decode())['total_items'], 0)
+
+    def test_import_skips_values_the_database_refuses(self):
+        """Test that ids out of the range of the columns and names with NUL characters are skipped, not a 500"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        body = self.ndjson([
+            {'type': 'bucketlist', 'id': 1, 'name': 'Travel'},
+            {'type': 'bucketlist', 'id': 2 ** 31, 'name': 'Too big'},
+            {'type': 'bucketlist', 'id': -1, 'name': 'Negative'},
+            {'type': 'bucketlist', 'id': 3, 'name': 'Nul\x00name'},
+            {'type': 'bucketlist', 'id': 4, 'name': 'Lone \ud800 surrogate'},
+            {'type': 'item', 'id': 1, 'name': 'Visit Paris', 'belongs_to': 2 ** 40}
+        ])
+        res = self.client().post(
+            '/api/v1/import',
+            headers=dict(Authorization="Bearer " + access_token),
+            data=body,
+            content_type='application/x-ndjson')
+        self.assertEqual(res.status_code, 200)
+        report = json.loads(res.data.decode())
+        self.assertEqual(report['bucketlists'], {'read': 1, 'created': 1})
+        self.assertEqual(report['skipped'], 5)
+
+    def test_import_with_invalid_gzip(self):
+        """Test what message is displayed when the body is said to be gzipped but isn't"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().post(
+            '/api/v1/import',
+            headers={'Authorization': "Bearer " + access_token, 'Content-Encoding': 'gzip'},
+            data=self.ndjson([{'type': 'bucketlist', 'id': 1, 'name': 'Travel'}]),
+            content_type='application/x-ndjson')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Request body is not valid gzip.', str(res.data))
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            # drop all tables
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+
+    if __name__ == "__main__":
+        unittest.main()
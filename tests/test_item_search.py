@@ -0,0 +1,221 @@
+import unittest
+import json
+from app import create_app, db
+
+
+class ItemSearchTestCase(unittest.TestCase):
+    """This class represents the test case for searching items across bucketlists"""
+
+    def setUp(self):
+        """
+        Initialize the app and its test client and our test database
+        :return:
+        """
+        self.app = create_app(config_name="testing")
+        self.client = self.app.test_client
+
+        # binds the app to the current context
+        with self.app.app_context():
+            # create all tables
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+
+    def register_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help register a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('/api/v1/auth/register', data=user_data)
+
+    def login_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help login a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('api/v1/auth/login', data=user_data)
+
+    def create_bucketlist_with_items(self, access_token, name, item_names):
+        """
+        Helper method to create a bucketlist and add items to it
+        :param access_token:
+        :param name:
+        :param item_names:
+        :return: the id of the created bucketlist
+        """
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': name})
+        self.assertEqual(res.status_code, 201)
+        bucketlist_id = json.loads(res.data.decode())['id']
+
+        for item_name in item_names:
+            res = self.client().post(
+                '/api/v1/bucketlists/{}/items/'.format(bucketlist_id),
+                headers=dict(Authorization="Bearer " + access_token),
+                data={'name': item_name})
+            self.assertEqual(res.status_code, 201)
+        return bucketlist_id
+
+    def test_search_items_across_bucketlists(self):
+        """Test if items from all the bucketlists of a user are searched by name"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        self.create_bucketlist_with_items(access_token, 'Travel', ['Visit Paris in spring', 'Climb Kilimanjaro'])
+        self.create_bucketlist_with_items(access_token, 'Food', ['Eat crepes in paris', 'Eat fried crabs'])
+
+        res = self.client().get(
+            '/api/v1/items?q=Paris',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+        results = json.loads(res.data.decode())
+        self.assertEqual(len(results['items']), 2)
+        self.assertIn('Visit Paris in spring', str(res.data))
+        self.assertIn('Eat crepes in paris', str(res.data))
+        self.assertIsNone(results['next_page'])
+
+        # the last word is matched as a prefix
+        res = self.client().get(
+            '/api/v1/items?q=kilim',
+            headers=dict(Authorization="Bearer " + access_token))
+        results = json.loads(res.data.decode())
+        self.assertEqual(len(results['items']), 1)
+        self.assertIn('Climb Kilimanjaro', str(res.data))
+
+    def test_search_items_of_other_users_not_returned(self):
+        """Test that the items in the bucketlists of other users are not searched"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        self.create_bucketlist_with_items(access_token, 'Travel', ['Visit Paris in spring'])
+
+        self.register_user(email="other@test.com")
+        result = self.login_user(email="other@test.com")
+        other_access_token = json.loads(result.data.decode())['access_token']
+
+        res = self.client().get(
+            '/api/v1/items?q=Paris',
+            headers=dict(Authorization="Bearer " + other_access_token))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data.decode())['items'], [])
+
+    def test_search_items_by_done(self):
+        """Test if items can be filtered on whether they are done"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        self.create_bucketlist_with_items(access_token, 'Travel', ['Visit Paris in spring', 'Climb Kilimanjaro'])
+
+        res = self.client().get(
+            '/api/v1/items?done=false',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(json.loads(res.data.decode())['items']), 2)
+
+        res = self.client().get(
+            '/api/v1/items?done=true',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(json.loads(res.data.decode())['items'], [])
+
+        res = self.client().get(
+            '/api/v1/items?done=maybe',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Parameter done should be true or false.', str(res.data))
+
+    def test_search_items_since(self):
+        """Test if items can be filtered on the date they were last modified"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        self.create_bucketlist_with_items(access_token, 'Travel', ['Visit Paris in spring'])
+
+        res = self.client().get(
+            '/api/v1/items?since=2000-01-01T00:00:00',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(len(json.loads(res.data.decode())['items']), 1)
+
+        res = self.client().get(
+            '/api/v1/items?since=2999-01-01T00:00:00Z',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(json.loads(res.data.decode())['items'], [])
+
+        res = self.client().get(
+            '/api/v1/items?since=yesterday',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Parameter since should be a date.', str(res.data))
+
+    def test_search_items_pagination(self):
+        """Test if the search results are paged using the id of the last item"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        self.create_bucketlist_with_items(access_token, 'Travel', ['Item one', 'Item two', 'Item three'])
+
+        res = self.client().get(
+            '/api/v1/items?q=item&limit=2',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+        results = json.loads(res.data.decode())
+        self.assertEqual([item['name'] for item in results['items']], ['Item one', 'Item two'])
+        self.assertIn('after={}'.format(results['items'][-1]['id']), results['next_page'])
+
+        res = self.client().get(
+            results['next_page'],
+            headers=dict(Authorization="Bearer " + access_token))
+        results = json.loads(res.data.decode())
+        self.assertEqual([item['name'] for item in results['items']], ['Item three'])
+        self.assertIsNone(results['next_page'])
+
+    def test_search_items_with_no_words(self):
+        """Test that a search string without any word is refused instead of returning every item"""
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        self.create_bucketlist_with_items(access_token, 'Travel', ['Visit Paris in spring'])
+
+        res = self.client().get(
+            '/api/v1/items?q=%25%25%25',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Parameter q should contain at least one word.', str(res.data))
+
+        # an empty search string is no search at all
+        res = self.client().get(
+            '/api/v1/items?q=',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(json.loads(res.data.decode())['items']), 1)
+
+    def test_search_items_with_no_header(self):
+        """Test what message is displayed when no header is provided"""
+        res = self.client().get('/api/v1/items?q=Paris', headers=dict())
+        self.assertEqual(res.status_code, 401)
+        self.assertIn('Header with key Authorization missing.', str(res.data))
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            # drop all tables
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+
+    if __name__ == "__main__":
+        unittest.main()
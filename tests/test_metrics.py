@@ -0,0 +1,231 @@
+import unittest
+import json
+import re
+import time
+from unittest import mock
+from app import create_app, db
+from app.models import Bucketlist
+
+
+class MetricsTestCase(unittest.TestCase):
+    """This class represents the metrics of the requests test case"""
+
+    def setUp(self):
+        """
+        Initialize the app and its test client and our test database
+        :return:
+        """
+        self.app = create_app(config_name="testing")
+        self.client = self.app.test_client
+
+        # binds the app to the current context
+        with self.app.app_context():
+            # create all tables
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+
+    def register_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help register a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('/api/v1/auth/register', data=user_data)
+
+    def login_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help login a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('api/v1/auth/login', data=user_data)
+
+    def metric(self, name, **labels):
+        """
+        Helper method to read a sample from /metrics, the metrics add up over the tests
+        :param name:
+        :param labels:
+        :return: the value, 0 if there is no such sample
+        """
+        res = self.client().get('/metrics')
+        self.assertEqual(res.status_code, 200)
+        for line in res.data.decode().split('\n'):
+            match = re.match(r'^(\w+)(?:\{(.*)\})? (\S+)$', line)
+            if not match or match.group(1) != name:
+                continue
+            sample_labels = dict(re.findall(r'(\w+)="([^"]*)"', match.group(2) or ''))
+            if sample_labels == {key: str(value) for key, value in labels.items()}:
+                return float(match.group(3))
+        return 0
+
+    def test_requests_are_counted_by_route_and_status(self):
+        """
+        Test if the requests are counted by the view serving them and their status
+        :return:
+        """
+        before = self.metric('http_requests_total', method='POST', endpoint='buckets.bucketlists', status=201)
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        for name in ('Travel', 'Food'):
+            self.client().post(
+                '/api/v1/bucketlists/',
+                headers=dict(Authorization="Bearer " + access_token),
+                data={'name': name})
+
+        after = self.metric('http_requests_total', method='POST', endpoint='buckets.bucketlists', status=201)
+        self.assertEqual(after - before, 2)
+
+    def test_latency_and_sql_are_measured(self):
+        """
+        Test if the latency and the SQL statements of the requests are recorded in histograms
+        :return:
+        """
+        labels = {'method': 'POST', 'endpoint': 'auth.register_view'}
+        before = self.metric('http_request_duration_seconds_count', **labels)
+        statements_before = self.metric('http_request_sql_statements_sum', **labels)
+        self.register_user()
+
+        self.assertEqual(self.metric('http_request_duration_seconds_count', **labels) - before, 1)
+        self.assertGreater(self.metric('http_request_duration_seconds_bucket', le='+Inf', **labels), 0)
+        # checking the email and inserting the user
+        self.assertGreaterEqual(self.metric('http_request_sql_statements_sum', **labels) - statements_before, 2)
+        self.assertGreater(self.metric('http_request_sql_duration_seconds_sum', **labels), 0)
+
+    def test_failed_requests_are_counted(self):
+        """
+        Test if a request failing with an unhandled exception is counted and timed with the status 500
+        :return:
+        """
+        labels = {'method': 'POST', 'endpoint': 'buckets.bucketlists_batch'}
+        before = self.metric('http_requests_total', status=500, **labels)
+        latency_before = self.metric('http_request_duration_seconds_count', **labels)
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        # the error is answered with a 500 as in production instead of being raised in the test
+        self.app.config['PROPAGATE_EXCEPTIONS'] = False
+        with mock.patch.object(Bucketlist, 'create_many', side_effect=RuntimeError('the database is gone')):
+            res = self.client().post(
+                '/api/v1/bucketlists/batch',
+                headers=dict(Authorization="Bearer " + access_token),
+                data=json.dumps({'names': ['Travel']}),
+                content_type='application/json')
+        self.assertEqual(res.status_code, 500)
+
+        self.assertEqual(self.metric('http_requests_total', status=500, **labels) - before, 1)
+        self.assertEqual(self.metric('http_request_duration_seconds_count', **labels) - latency_before, 1)
+
+    def test_streamed_responses_are_timed_until_their_end(self):
+        """
+        Test if the latency of a streamed response includes the time spent sending its body
+        :return:
+        """
+        labels = {'method': 'GET', 'endpoint': 'buckets.export'}
+        before = self.metric('http_request_duration_seconds_sum', **labels)
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        def slow_chunks(rows):
+            yield '{}\n'
+            time.sleep(0.3)
+            yield '{}\n'
+
+        with mock.patch('app.bucketlists.bucketlists.export_ndjson', slow_chunks):
+            res = self.client().get(
+                '/api/v1/export',
+                headers={'Authorization': "Bearer " + access_token, 'Accept-Encoding': 'identity'})
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.data, b'{}\n{}\n')
+        self.assertGreaterEqual(self.metric('http_request_duration_seconds_sum', **labels) - before, 0.3)
+
+    def test_connection_pool_is_measured(self):
+        """
+        Test if the checkouts, the wait and the connections in use of the pool are exported
+        :return:
+        """
+        before = self.metric('db_pool_checkouts_total', bind='default')
+        waits_before = self.metric('db_pool_wait_seconds_count', bind='default')
+        self.register_user()
+
+        self.assertGreater(self.metric('db_pool_checkouts_total', bind='default') - before, 0)
+        self.assertGreater(self.metric('db_pool_wait_seconds_count', bind='default') - waits_before, 0)
+        # the connection of the request went back to the pool once it was served
+        self.assertEqual(self.metric('db_pool_checked_out_connections', bind='default'), 0)
+        self.assertEqual(self.metric('db_pool_overflow_connections', bind='default'), 0)
+        self.assertIn('# TYPE db_pool_timeouts_total counter', self.client().get('/metrics').data.decode())
+
+    def test_pools_of_the_same_database_are_told_apart_by_bind(self):
+        """
+        Test if the pool of a replica is measured apart from the pool of the primary, even on the same database
+        :return:
+        """
+        self.app.config['SQLALCHEMY_BINDS'] = {'replica': self.app.config['SQLALCHEMY_DATABASE_URI']}
+        with self.app.app_context():
+            default_before = self.metric('db_pool_checkouts_total', bind='default')
+            replica_before = self.metric('db_pool_checkouts_total', bind='replica')
+            db.get_engine(self.app, bind='replica').execute('SELECT 1')
+            self.assertEqual(self.metric('db_pool_checkouts_total', bind='replica') - replica_before, 1)
+            self.assertEqual(self.metric('db_pool_checkouts_total', bind='default'), default_before)
+            db.get_engine(self.app, bind='replica').dispose()
+
+    def test_metrics_are_only_served_locally_without_a_token(self):
+        """
+        Test if /metrics refuses the requests coming from another machine when there is no metrics token
+        :return:
+        """
+        res = self.client().get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.7'})
+        self.assertEqual(res.status_code, 403)
+        res = self.client().get('/metrics', environ_base={'REMOTE_ADDR': '::1'})
+        self.assertEqual(res.status_code, 200)
+
+    def test_metrics_token_is_required_when_set(self):
+        """
+        Test if /metrics requires the metrics token as a bearer token once it is set, from any machine
+        :return:
+        """
+        self.app.config['METRICS_TOKEN'] = 'scraper-token'
+        res = self.client().get('/metrics')
+        self.assertEqual(res.status_code, 401)
+        res = self.client().get('/metrics', headers=dict(Authorization="Bearer wrong-token"))
+        self.assertEqual(res.status_code, 401)
+        res = self.client().get(
+            '/metrics',
+            headers=dict(Authorization="Bearer scraper-token"),
+            environ_base={'REMOTE_ADDR': '203.0.113.7'})
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('http_requests_total', res.data.decode())
+
+    def test_metrics_content_type(self):
+        """
+        Test if the metrics are served in the Prometheus text format
+        :return:
+        """
+        res = self.client().get('/metrics')
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('text/plain', res.headers['Content-Type'])
+        self.assertIn('# TYPE http_requests_total counter', res.data.decode())
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            # drop all tables
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+
+    if __name__ == "__main__":
+        unittest.main()
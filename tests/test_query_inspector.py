@@ -0,0 +1,167 @@
+import unittest
+import json
+from flask import Response
+from app import create_app, db
+from app.models import Bucketlist
+from app.query_inspector import assert_max_queries, statement_shape
+
+
+class QueryInspectorTestCase(unittest.TestCase):
+    """This class represents the slow and repeated queries test case"""
+
+    def setUp(self):
+        """
+        Initialize the app and its test client and our test database
+        :return:
+        """
+        self.app = create_app(config_name="testing")
+        self.client = self.app.test_client
+
+        # binds the app to the current context
+        with self.app.app_context():
+            # create all tables
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+
+    def register_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help register a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('/api/v1/auth/register', data=user_data)
+
+    def login_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help login a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('api/v1/auth/login', data=user_data)
+
+    def create_bucketlists(self, access_token, numbers):
+        """
+        Helper method to create numbered bucketlists with an item each
+        :param access_token:
+        :param numbers:
+        :return:
+        """
+        for number in numbers:
+            res = self.client().post(
+                '/api/v1/bucketlists/',
+                headers=dict(Authorization="Bearer " + access_token),
+                data={'name': 'Bucketlist {}'.format(number)})
+            self.assertEqual(res.status_code, 201)
+            res = self.client().post(
+                '/api/v1/bucketlists/{}/items/'.format(json.loads(res.data.decode())['id']),
+                headers=dict(Authorization="Bearer " + access_token),
+                data={'name': 'Item {}'.format(number)})
+            self.assertEqual(res.status_code, 201)
+
+    def test_listing_bucketlists_runs_the_same_statements_whatever_their_number(self):
+        """
+        Test if the items of the listed bucketlists are not loaded one bucketlist at a time
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        self.create_bucketlists(access_token, range(1))
+
+        with assert_max_queries(10) as statements:
+            res = self.client().get('/api/v1/bucketlists/', headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+        one_bucketlist = len(statements)
+
+        self.create_bucketlists(access_token, range(1, 7))
+        with assert_max_queries(one_bucketlist):
+            res = self.client().get('/api/v1/bucketlists/', headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+        results = json.loads(res.data.decode())
+        self.assertEqual(len(results['items']), 7)
+        self.assertEqual([bucketlist['items'][0]['name'] for bucketlist in results['items']],
+                         ['Item {}'.format(number) for number in range(7)])
+
+    def test_assert_max_queries_fails_when_more_statements_run(self):
+        """
+        Test if assert_max_queries fails a block running more statements than allowed
+        :return:
+        """
+        with self.app.app_context():
+            with self.assertRaises(AssertionError) as raised:
+                with assert_max_queries(1):
+                    db.session.execute('SELECT 1')
+                    db.session.execute('SELECT 2')
+            self.assertIn('2 statements were run, expected at most 1', str(raised.exception))
+
+    def test_repeated_statements_of_a_request_are_logged(self):
+        """
+        Test if a request running the same statement with different values over and over is reported
+        :return:
+        """
+        self.assertEqual(statement_shape("SELECT * FROM users WHERE id = 1 AND email = 'a@b.c'"),
+                         statement_shape("SELECT * FROM users  WHERE id = 22 AND email = 'd@e.f'"))
+        with self.app.test_request_context('/api/v1/bucketlists/'):
+            self.app.preprocess_request()
+            for number in range(self.app.config['N_PLUS_ONE_THRESHOLD']):
+                db.session.execute('SELECT {}'.format(number))
+            with self.assertLogs('app.query_inspector', level='WARNING') as logs:
+                self.app.process_response(Response())
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('the same statement ran 5 times', logs.output[0])
+        self.assertIn('tests/test_query_inspector.py', logs.output[0])
+
+    def test_bound_in_lists_of_any_length_have_the_same_shape(self):
+        """
+        Test if statements binding IN lists of different lengths, as psycopg2 placeholders, are reported together
+        :return:
+        """
+        self.assertEqual(
+            statement_shape("SELECT * FROM users WHERE users.id IN (%(id_1)s, %(id_2)s) AND email = %(email_1)s"),
+            statement_shape("SELECT * FROM users WHERE users.id IN (%(id_1)s) AND email = %s"))
+        with self.app.test_request_context('/api/v1/bucketlists/'):
+            self.app.preprocess_request()
+            for number in range(1, self.app.config['N_PLUS_ONE_THRESHOLD'] + 1):
+                Bucketlist.query.filter(Bucketlist.id.in_(list(range(number)))).all()
+            with self.assertLogs('app.query_inspector', level='WARNING') as logs:
+                self.app.process_response(Response())
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('the same statement ran 5 times', logs.output[0])
+        self.assertIn('IN (?)', logs.output[0])
+
+    def test_slow_statements_are_logged_with_their_call_site(self):
+        """
+        Test if a statement slower than SLOW_QUERY_SECONDS is logged with the code which ran it
+        :return:
+        """
+        self.app.config['SLOW_QUERY_SECONDS'] = 0.05
+        with self.app.app_context():
+            with self.assertLogs('app.query_inspector', level='WARNING') as logs:
+                db.session.execute('SELECT pg_sleep(0.1)')
+                db.session.execute('SELECT 1')
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('Slow query', logs.output[0])
+        self.assertIn('tests/test_query_inspector.py', logs.output[0])
+        self.assertIn('pg_sleep', logs.output[0])
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            # drop all tables
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+
+    if __name__ == "__main__":
+        unittest.main()
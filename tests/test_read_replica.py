@@ -0,0 +1,167 @@
+import unittest
+import json
+from sqlalchemy import event
+from app import create_app, db
+from app.replica import recent_writes
+from instance.config import app_config, TestingConfig
+
+
+class ReadReplicaTestCase(unittest.TestCase):
+    """This class represents the routing of the reads to a replica test case"""
+
+    def setUp(self):
+        """
+        Initialize the app with a replica, its test client and our test database
+        The replica is the test database itself, the statements are told apart by the engine running them
+        :return:
+        """
+        app_config['testing_replica'] = type('TestingReplicaConfig', (TestingConfig,), {
+            'SQLALCHEMY_BINDS': {'replica': TestingConfig.SQLALCHEMY_DATABASE_URI},
+            'READ_YOUR_WRITES_SECONDS': 5,
+            # the writes are only those seen by this process
+            'CHANGE_EVENTS_LISTEN': False
+        })
+        self.app = create_app(config_name="testing_replica")
+        self.client = self.app.test_client
+
+        # binds the app to the current context
+        with self.app.app_context():
+            # create all tables
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+
+            self.statements = {'primary': 0, 'replica': 0}
+            for name, engine in (('primary', db.get_engine(self.app)),
+                                 ('replica', db.get_engine(self.app, bind='replica'))):
+                event.listen(engine, 'before_cursor_execute', self.counter(name))
+
+    def counter(self, name):
+        """
+        Helper method to count the statements run by an engine
+        :param name:
+        :return: listener of before_cursor_execute
+        """
+        def count(connection, cursor, statement, parameters, context, executemany):
+            self.statements[name] += 1
+        return count
+
+    def reset_counts(self):
+        """Helper method to start counting the statements again."""
+        self.statements['primary'] = 0
+        self.statements['replica'] = 0
+
+    def register_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help register a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('/api/v1/auth/register', data=user_data)
+
+    def login_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help login a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('api/v1/auth/login', data=user_data)
+
+    def create_bucketlist(self, access_token):
+        """
+        Helper method to create a bucketlist
+        :param access_token:
+        :return: the id of the bucketlist
+        """
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Visit the Grand canyon'})
+        self.assertEqual(res.status_code, 201)
+        return json.loads(res.data.decode())['id']
+
+    def test_reads_go_to_the_replica(self):
+        """
+        Test if the reads of a user who didn't write recently are served by the replica
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        bucketlist_id = self.create_bucketlist(access_token)
+        recent_writes.written_at.clear()
+
+        self.reset_counts()
+        res = self.client().get(
+            '/api/v1/bucketlists/{}'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+        self.assertGreater(self.statements['replica'], 0)
+        self.assertEqual(self.statements['primary'], 0)
+
+    def test_reads_after_a_write_go_to_the_primary(self):
+        """
+        Test if a user reads from the primary right after writing, so that they see what they wrote
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        bucketlist_id = self.create_bucketlist(access_token)
+
+        self.reset_counts()
+        res = self.client().get(
+            '/api/v1/bucketlists/{}'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+        self.assertGreater(self.statements['primary'], 0)
+        self.assertEqual(self.statements['replica'], 0)
+
+        # once the window is over the reads go to the replica again
+        self.app.config['READ_YOUR_WRITES_SECONDS'] = 0
+        self.reset_counts()
+        self.client().get(
+            '/api/v1/bucketlists/{}'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(self.statements['primary'], 0)
+
+    def test_writes_go_to_the_primary(self):
+        """
+        Test if the replica is never written to
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+
+        self.reset_counts()
+        bucketlist_id = self.create_bucketlist(access_token)
+        res = self.client().put(
+            '/api/v1/bucketlists/{}'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Must visit the Grand Canyon!'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.statements['replica'], 0)
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            # drop all tables
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+        del app_config['testing_replica']
+        recent_writes.written_at.clear()
+
+    if __name__ == "__main__":
+        unittest.main()
@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import unittest
+from sqlalchemy import create_engine
+from app import create_app, db
+from app.models import User, Bucketlist, BucketlistItem
+from benchmarks import replay
+from benchmarks.seed import EMAIL, PASSWORD, create_tables, seed
+
+
+class SeedTestCase(unittest.TestCase):
+    """This class represents the synthetic data generator test case"""
+
+    def setUp(self):
+        """
+        Initialize the app and our test database
+        :return:
+        """
+        self.app = create_app(config_name="testing")
+        self.directory = tempfile.mkdtemp()
+
+        # binds the app to the current context
+        with self.app.app_context():
+            # create all tables
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+
+    def test_seed_postgres(self):
+        """
+        Test if the seeded bucketlists and items are counted by the triggers and the ids continue after them
+        :return:
+        """
+        with self.app.app_context():
+            report = seed(db.engine, users=20, max_bucketlists=10, max_items=10, batch_size=50)
+            self.assertEqual(report['users'], 20)
+            self.assertEqual(Bucketlist.query.count(), report['bucketlists'])
+            self.assertEqual(BucketlistItem.query.count(), report['items'])
+            for bucketlist in Bucketlist.query.all():
+                self.assertLessEqual(bucketlist.item_count, 10)
+                self.assertEqual(bucketlist.item_count, BucketlistItem.query.filter_by(
+                    belongs_to=bucketlist.id).count())
+                self.assertEqual(bucketlist.done_count, BucketlistItem.query.filter_by(
+                    belongs_to=bucketlist.id, done=True).count())
+
+            bucketlists = Bucketlist.create_many(['Created after seeding'], 1)
+            self.assertGreater(bucketlists[0].id, report['bucketlists'])
+
+    def test_seed_sqlite_is_deterministic(self):
+        """
+        Test if seeding two SQLite files with the same seed gives the same data, as with Postgres
+        :return:
+        """
+        rows = []
+        for number in range(2):
+            engine = create_engine('sqlite:///' + os.path.join(self.directory, 'seed{}.db'.format(number)))
+            create_tables(engine)
+            report = seed(engine, users=20, max_bucketlists=10, max_items=10, seed=7)
+            rows.append(engine.execute(
+                'SELECT bucketlists.name, item_count, done_count, created_by FROM bucketlists ORDER BY id').fetchall())
+            self.assertEqual(len(rows[-1]), report['bucketlists'])
+            engine.dispose()
+        self.assertEqual(rows[0], rows[1])
+
+        with self.app.app_context():
+            seed(db.engine, users=20, max_bucketlists=10, max_items=10, seed=7)
+            self.assertEqual([(bucketlist.name, bucketlist.item_count, bucketlist.done_count, bucketlist.created_by)
+                              for bucketlist in Bucketlist.query.order_by(Bucketlist.id)],
+                             [tuple(row) for row in rows[0]])
+
+    def test_seed_takes_ids_from_the_sequences(self):
+        """
+        Test if the seeded ids follow the increment of the sequences, as on a shard, which are not reset after them
+        :return:
+        """
+        with self.app.app_context():
+            for table in ('bucketlists', 'bucketlist_items'):
+                db.engine.execute('ALTER SEQUENCE {}_id_seq INCREMENT BY 64 RESTART WITH 128'.format(table))
+            report = seed(db.engine, users=5, max_bucketlists=10, max_items=10, batch_size=7)
+            bucketlist_ids = [bucketlist.id for bucketlist in Bucketlist.query.all()]
+            item_ids = [item.id for item in BucketlistItem.query.all()]
+            self.assertEqual((len(bucketlist_ids), len(item_ids)), (report['bucketlists'], report['items']))
+            self.assertTrue(all(row_id % 64 == 0 for row_id in bucketlist_ids + item_ids))
+
+            bucketlists = Bucketlist.create_many(['Created after seeding'], 1)
+            self.assertEqual(bucketlists[0].id % 64, 0)
+            self.assertGreater(bucketlists[0].id, max(bucketlist_ids))
+
+    def test_seeded_emails_are_numbered_from_one(self):
+        """
+        Test if the seeded users are those benchmarks/replay.py logs in as, whatever the users registered before
+        :return:
+        """
+        with self.app.app_context():
+            User('someone@test.com', 'test1234').save()
+            seed(db.engine, users=3, max_bucketlists=2, max_items=2)
+            seed(db.engine, users=2, max_bucketlists=2, max_items=2)
+            emails = [user.email for user in User.query.filter(User.email != 'someone@test.com').order_by(User.id)]
+        self.assertEqual(emails, [replay.SEEDED_EMAIL.format(number) for number in range(1, 6)])
+        self.assertEqual((EMAIL, PASSWORD), (replay.SEEDED_EMAIL, replay.SEEDED_PASSWORD))
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        shutil.rmtree(self.directory)
+        with self.app.app_context():
+            # drop all tables
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+
+    if __name__ == "__main__":
+        unittest.main()
@@ -0,0 +1,234 @@
+import unittest
+import json
+import zlib
+from app import create_app, db
+from app import sharding
+from app.models import User, Bucketlist
+from instance.config import app_config, TestingConfig
+
+# the shard is a schema of the test database, which is enough for the queries to tell the databases apart
+SHARD_URL = TestingConfig.SQLALCHEMY_DATABASE_URI + '?options=-csearch_path%3Dshard_1'
+
+
+class ShardingTestCase(unittest.TestCase):
+    """This class represents the spreading of the bucketlists of the users over shards test case"""
+
+    def setUp(self):
+        """
+        Initialize the app with a second shard, its test client and our test database
+        :return:
+        """
+        app_config['testing_sharded'] = type('TestingShardedConfig', (TestingConfig,), {
+            'SQLALCHEMY_BINDS': {'shard_1': SHARD_URL},
+            'CHANGE_EVENTS_LISTEN': False
+        })
+        self.app = create_app(config_name="testing_sharded")
+        self.client = self.app.test_client
+
+        # binds the app to the current context
+        with self.app.app_context():
+            db.session.close()
+            db.engine.execute('DROP SCHEMA IF EXISTS shard_1 CASCADE')
+            db.engine.execute('CREATE SCHEMA shard_1')
+            db.drop_all()
+            db.create_all()
+            sharding.init_shards()
+
+    def email_on(self, shard):
+        """
+        Helper method to find an email registered on a shard
+        :param shard:
+        :return: email
+        """
+        names = ['default', 'shard_1']
+        number = 0
+        while names[zlib.crc32('user{}@test.com'.format(number).encode('utf-8')) % 2] != shard:
+            number += 1
+        return 'user{}@test.com'.format(number)
+
+    def register_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help register a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('/api/v1/auth/register', data=user_data)
+
+    def login_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help login a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('api/v1/auth/login', data=user_data)
+
+    def access_token(self, email):
+        """
+        Helper method to register and login a user
+        :param email:
+        :return: the access token
+        """
+        self.register_user(email=email)
+        result = self.login_user(email=email)
+        return json.loads(result.data.decode())['access_token']
+
+    def create_bucketlist(self, access_token, name='Visit the Grand canyon'):
+        """
+        Helper method to create a bucketlist with an item
+        :param access_token:
+        :param name:
+        :return: the id of the bucketlist
+        """
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': name})
+        self.assertEqual(res.status_code, 201)
+        bucketlist_id = json.loads(res.data.decode())['id']
+        res = self.client().post(
+            '/api/v1/bucketlists/{}/items/'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Go camping'})
+        self.assertEqual(res.status_code, 201)
+        return bucketlist_id
+
+    def count_bucketlists(self, shard):
+        """
+        Helper method to count the bucketlists on a shard
+        :param shard:
+        :return:
+        """
+        with self.app.app_context():
+            return sharding.shard_engine(shard).execute('SELECT COUNT(*) FROM bucketlists').scalar()
+
+    def test_bucketlists_are_stored_on_the_shard_of_their_user(self):
+        """
+        Test if the bucketlists of a user registered on a shard are stored and read there
+        :return:
+        """
+        access_token = self.access_token(self.email_on('shard_1'))
+        bucketlist_id = self.create_bucketlist(access_token)
+
+        self.assertEqual(self.count_bucketlists('shard_1'), 1)
+        self.assertEqual(self.count_bucketlists('default'), 0)
+
+        res = self.client().get(
+            '/api/v1/bucketlists/{}'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data.decode())['item_count'], 1)
+
+        # the users are all kept on the default database
+        with self.app.app_context():
+            self.assertEqual(User.query.count(), 1)
+
+    def test_ids_are_unique_across_shards(self):
+        """
+        Test if the ids of the bucketlists of two shards can't collide
+        :return:
+        """
+        default_id = self.create_bucketlist(self.access_token(self.email_on('default')))
+        shard_id = self.create_bucketlist(self.access_token(self.email_on('shard_1')))
+        self.assertEqual(default_id % sharding.SHARD_ID_STRIDE, 0)
+        self.assertEqual(shard_id % sharding.SHARD_ID_STRIDE, 1)
+
+    def test_user_can_be_moved_to_another_shard(self):
+        """
+        Test if a moved user keeps their bucketlists, their ids and their feed of changes
+        :return:
+        """
+        email = self.email_on('shard_1')
+        access_token = self.access_token(email)
+        bucketlist_id = self.create_bucketlist(access_token)
+        res = self.client().get(
+            '/api/v1/bucketlists/changes',
+            headers=dict(Authorization="Bearer " + access_token))
+        since = json.loads(res.data.decode())['next_since']
+
+        with self.app.test_request_context():
+            user = User.query.filter_by(email=email).first()
+            report = sharding.move_user(user, 'default', wait=0)
+            db.session.remove()
+        self.assertEqual((report['bucketlists'], report['items']), (1, 1))
+        self.assertEqual(self.count_bucketlists('shard_1'), 0)
+        self.assertEqual(self.count_bucketlists('default'), 1)
+        sharding.shard_directory.shards.clear()
+
+        res = self.client().get(
+            '/api/v1/bucketlists/{}'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data.decode())['item_count'], 1)
+
+        # the moved rows are changes the client gets again
+        res = self.client().get(
+            '/api/v1/bucketlists/changes?since={}'.format(since),
+            headers=dict(Authorization="Bearer " + access_token))
+        results = json.loads(res.data.decode())
+        self.assertEqual([bucketlist['id'] for bucketlist in results['bucketlists']], [bucketlist_id])
+
+    def test_move_never_overwrites_the_rows_of_another_user(self):
+        """
+        Test if a move is refused when the target shard has a bucketlist of another user with the same id
+        :return:
+        """
+        email = self.email_on('shard_1')
+        bucketlist_id = self.create_bucketlist(self.access_token(email))
+        other_email = self.email_on('default')
+        self.access_token(other_email)
+        with self.app.test_request_context():
+            other = User.query.filter_by(email=other_email).first()
+            sharding.shard_engine('default').execute(
+                "INSERT INTO bucketlists (id, name, created_by) VALUES (%s, 'Learn to fly', %s)",
+                bucketlist_id, other.id)
+
+            user = User.query.filter_by(email=email).first()
+            with self.assertRaises(ValueError):
+                sharding.move_user(user, 'default', wait=0)
+            db.session.remove()
+            self.assertEqual(User.query.filter_by(email=email).first().shard, 'shard_1')
+            rows = sharding.shard_engine('default').execute(
+                'SELECT name, created_by FROM bucketlists WHERE id = %s', bucketlist_id).fetchall()
+            self.assertEqual([tuple(row) for row in rows], [('Learn to fly', other.id)])
+        self.assertEqual(self.count_bucketlists('shard_1'), 1)
+
+    def test_plan_rebalance(self):
+        """
+        Test if the planned moves even out the rows of the shards
+        :return:
+        """
+        moves = sharding.plan_rebalance({
+            'default': {1: 50, 2: 40, 3: 10},
+            'shard_1': {4: 5},
+            'shard_2': {}
+        })
+        loads = {'default': 100, 'shard_1': 5, 'shard_2': 0}
+        for user_id, source, target, rows in moves:
+            loads[source] -= rows
+            loads[target] += rows
+        self.assertLessEqual(max(loads.values()) - min(loads.values()), 50)
+        self.assertEqual(sharding.plan_rebalance({'default': {1: 10}, 'shard_1': {2: 10}}), [])
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+            sharding.shard_engine('shard_1').dispose()
+            db.engine.execute('DROP SCHEMA IF EXISTS shard_1 CASCADE')
+        del app_config['testing_sharded']
+        sharding.shard_directory.shards.clear()
+
+    if __name__ == "__main__":
+        unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+from app import create_app, db
+from benchmarks.replay import read_capture
+from instance.config import app_config, TestingConfig
+
+
+class TrafficCaptureTestCase(unittest.TestCase):
+    """This class represents the capture of the requests test case"""
+
+    def setUp(self):
+        """
+        Initialize the app recording its requests to a temporary file, its test client and our test database
+        :return:
+        """
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'capture.ndjson')
+        app_config['testing_capture'] = type('TestingCaptureConfig', (TestingConfig,), {
+            'TRAFFIC_CAPTURE_PATH': self.path,
+            'TRAFFIC_CAPTURE_SAMPLE': 1
+        })
+        self.app = create_app(config_name="testing_capture")
+        self.client = self.app.test_client
+
+        # binds the app to the current context
+        with self.app.app_context():
+            # create all tables
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+
+    def register_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help register a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('/api/v1/auth/register', data=user_data)
+
+    def login_user(self, email="user@test.com", password="test1234"):
+        """
+        Helper method to help login a test user
+        :param email:
+        :param password:
+        :return:
+        """
+        user_data = {
+            'email': email,
+            'password': password
+        }
+        return self.client().post('api/v1/auth/login', data=user_data)
+
+    def captured(self):
+        """
+        Helper method to read the recorded requests
+        :return: list of the requests, and the raw file
+        """
+        with open(self.path) as capture:
+            raw = capture.read()
+        return [json.loads(line) for line in raw.splitlines()], raw
+
+    def test_requests_are_captured_without_secrets(self):
+        """
+        Test if the requests are recorded with the shape of their body, without tokens, passwords nor emails
+        :return:
+        """
+        self.register_user()
+        result = self.login_user()
+        access_token = json.loads(result.data.decode())['access_token']
+        res = self.client().post(
+            '/api/v1/bucketlists/',
+            headers=dict(Authorization="Bearer " + access_token),
+            data={'name': 'Visit the Grand canyon'})
+        bucketlist_id = json.loads(res.data.decode())['id']
+        self.client().get(
+            '/api/v1/bucketlists/{}?page=2&q=grand'.format(bucketlist_id),
+            headers=dict(Authorization="Bearer " + access_token))
+
+        entries, raw = self.captured()
+        self.assertEqual([(entry['method'], entry['route'], entry['status']) for entry in entries], [
+            ('POST', '/api/v1/auth/register', 201),
+            ('POST', '/api/v1/auth/login', 200),
+            ('POST', '/api/v1/bucketlists', 201),
+            ('GET', '/api/v1/bucketlists/<int:id>', 200)])
+        self.assertEqual(entries[0]['body'], {'email': 'redacted', 'password': 'redacted'})
+        self.assertEqual(entries[2]['body'], {'name': 'str:22'})
+        self.assertEqual(entries[3]['query'], {'page': 2, 'q': 'str:5'})
+        self.assertGreater(entries[3]['response_bytes'], 0)
+        self.assertIsNone(entries[0]['user'])
+        self.assertEqual(entries[2]['user'], entries[3]['user'])
+        for secret in (access_token, 'test1234', 'user@test.com', 'Grand canyon'):
+            self.assertNotIn(secret, raw)
+
+        # the capture is read back in order, for benchmarks/replay.py
+        self.assertEqual([entry['route'] for entry in read_capture([self.path])],
+                         [entry['route'] for entry in entries])
+
+    def test_requests_are_sampled(self):
+        """
+        Test if only a share of the requests is recorded
+        :return:
+        """
+        self.register_user()
+        self.app.config['TRAFFIC_CAPTURE_SAMPLE'] = 0
+        res = self.login_user()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([entry['route'] for entry in self.captured()[0]], ['/api/v1/auth/register'])
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            # drop all tables
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+        del app_config['testing_capture']
+        shutil.rmtree(self.directory)
+
+    if __name__ == "__main__":
+        unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Bucketlist, BucketlistItem, unit_of_work
+
+
+class UnitOfWorkTestCase(unittest.TestCase):
+    """This class represents the test case for batching model writes in one transaction"""
+
+    def setUp(self):
+        """
+        Initialize the app and our test database, and keep an app context for the model calls
+        :return:
+        """
+        self.app = create_app(config_name="testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+        # create all tables
+        db.session.close()
+        db.drop_all()
+        db.create_all()
+
+        self.user = User(email="user@test.com", password="test1234")
+        self.user.save()
+
+        self.commits = []
+        event.listen(db.engine, 'commit', self.count_commit)
+
+    def count_commit(self, conn):
+        """
+        Listener recording each commit sent to the database
+        :param conn:
+        :return:
+        """
+        self.commits.append(conn)
+
+    def test_unit_of_work_commits_once(self):
+        """Test that the writes in a unit of work are committed once, at its end"""
+        with unit_of_work():
+            for number in range(5):
+                bucketlist = Bucketlist(name='Bucketlist {}'.format(number), created_by=self.user.id)
+                bucketlist.save()
+            BucketlistItem.create_many(['Visit Paris', 'Visit Rome'], bucketlist.id)
+            self.assertEqual(len(self.commits), 0)
+
+        self.assertEqual(len(self.commits), 1)
+        self.assertEqual(Bucketlist.query.count(), 5)
+        self.assertEqual(BucketlistItem.query.count(), 2)
+        # the bucketlist was not flushed yet when its items were created in bulk
+        self.assertIsNotNone(bucketlist.id)
+        self.assertEqual([item.belongs_to for item in BucketlistItem.query.all()], [bucketlist.id] * 2)
+        # counted by the database, the bucketlist in the session doesn't see it
+        self.assertEqual(db.session.query(Bucketlist.item_count).filter_by(id=bucketlist.id).scalar(), 2)
+
+    def test_bulk_writes_see_the_objects_saved_before(self):
+        """Test that a write in bulk inside a unit of work runs after the pending objects are flushed"""
+        with unit_of_work():
+            bucketlist = Bucketlist(name='Travel', created_by=self.user.id)
+            bucketlist.save()
+            item = BucketlistItem(name='Visit Paris', belongs_to=bucketlist.id)
+            item.save()
+            self.assertEqual(BucketlistItem.set_done_many(True, bucketlist.id), {item.id})
+            self.assertEqual(BucketlistItem.delete_many([item.id], bucketlist.id), {item.id})
+            self.assertEqual(Bucketlist.delete_many([bucketlist.id], self.user.id), {bucketlist.id})
+
+        self.assertEqual(len(self.commits), 1)
+        self.assertEqual(Bucketlist.query.count(), 0)
+
+    def test_unit_of_work_flushes_in_batches(self):
+        """Test that a unit of work flushes the pending objects once there are enough of them"""
+        with unit_of_work(flush_size=2):
+            Bucketlist(name='Travel', created_by=self.user.id).save()
+            self.assertEqual(len(db.session.new), 1)
+            Bucketlist(name='Food', created_by=self.user.id).save()
+            self.assertEqual(len(db.session.new), 0)
+
+    def test_unit_of_work_rolls_back_on_error(self):
+        """Test that nothing is saved when the block of a unit of work raises"""
+        with self.assertRaises(ValueError):
+            with unit_of_work():
+                Bucketlist(name='Travel', created_by=self.user.id).save()
+                raise ValueError
+
+        self.assertEqual(len(self.commits), 0)
+        self.assertEqual(Bucketlist.query.count(), 0)
+
+    def test_nested_unit_of_work_joins_outer_one(self):
+        """Test that a unit of work inside another one doesn't commit on its own"""
+        with unit_of_work():
+            with unit_of_work():
+                Bucketlist(name='Travel', created_by=self.user.id).save()
+            self.assertEqual(len(self.commits), 0)
+            Bucketlist(name='Food', created_by=self.user.id).save()
+
+        self.assertEqual(len(self.commits), 1)
+        self.assertEqual(Bucketlist.query.count(), 2)
+
+    def test_save_without_commit(self):
+        """Test that a model write can leave the commit to the caller"""
+        Bucketlist(name='Travel', created_by=self.user.id).save(commit=False)
+        self.assertEqual(len(self.commits), 0)
+        db.session.commit()
+        self.assertEqual(len(self.commits), 1)
+        self.assertEqual(Bucketlist.query.count(), 1)
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        event.remove(db.engine, 'commit', self.count_commit)
+        # drop all tables
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        self.app_context.pop()
+
+    if __name__ == "__main__":
+        unittest.main()